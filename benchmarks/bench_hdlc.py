@@ -0,0 +1,146 @@
+"""Compare the bulk HDLC codec with the former byte by byte implementation.
+
+The codec benchmarks are also registered for `benchmarks.runner`.
+
+Usage:
+python -m benchmarks.bench_hdlc
+"""
+
+import random
+import timeit
+
+from benchmarks.runner import benchmark
+from marilib.serial_hdlc import (
+    HDLC_ESCAPE,
+    HDLC_ESCAPE_ESCAPED,
+    HDLC_FCS_INIT,
+    HDLC_FCS_OK,
+    HDLC_FLAG,
+    HDLC_FLAG_ESCAPED,
+    HDLCDecodeException,
+    HDLCHandler,
+    _fcs_update,
+    hdlc_decode,
+    hdlc_encode,
+)
+
+# Mari frames carry a 20 bytes header, 1 byte of stats and the application payload
+FRAME_SIZES = (20, 64, 128, 250)
+ITERATIONS = 2000
+
+
+def _to_byte(value):
+    return int(value).to_bytes(1, "little")
+
+
+def _escape_byte(byte) -> bytes:
+    result = bytearray()
+    if byte == HDLC_ESCAPE:
+        result += HDLC_ESCAPE
+        result += HDLC_ESCAPE_ESCAPED
+    elif byte == HDLC_FLAG:
+        result += HDLC_ESCAPE
+        result += HDLC_FLAG_ESCAPED
+    else:
+        result += byte
+    return result
+
+
+def legacy_hdlc_encode(payload: bytes) -> bytes:
+    """Byte by byte encoder, as implemented before the bulk codec."""
+    hdlc_frame = bytearray()
+    fcs = HDLC_FCS_INIT
+    hdlc_frame += HDLC_FLAG
+    for byte in payload:
+        fcs = _fcs_update(fcs, _to_byte(byte))
+        hdlc_frame += _escape_byte(_to_byte(byte))
+    fcs = 0xFFFF - fcs
+    hdlc_frame += _escape_byte(_to_byte(fcs & 0xFF))
+    hdlc_frame += _escape_byte(_to_byte((fcs & 0xFF00) >> 8))
+    hdlc_frame += HDLC_FLAG
+    return hdlc_frame
+
+
+def legacy_hdlc_decode(frame: bytes) -> bytes:
+    """Byte by byte decoder, as implemented before the bulk codec."""
+    output = bytearray()
+    fcs = HDLC_FCS_INIT
+    escape_byte = False
+    for byte in frame[1:-1]:
+        byte = _to_byte(byte)
+        if byte == HDLC_ESCAPE:
+            escape_byte = True
+        elif escape_byte is True:
+            if byte == HDLC_ESCAPE_ESCAPED:
+                output += HDLC_ESCAPE
+                fcs = _fcs_update(fcs, HDLC_ESCAPE)
+            elif byte == HDLC_FLAG_ESCAPED:
+                output += HDLC_FLAG
+                fcs = _fcs_update(fcs, HDLC_FLAG)
+            escape_byte = False
+        else:
+            output += byte
+            fcs = _fcs_update(fcs, byte)
+    if len(output) < 2:
+        raise HDLCDecodeException("Invalid payload")
+    if fcs != HDLC_FCS_OK:
+        raise HDLCDecodeException("Invalid FCS")
+    return output[:-2]
+
+
+def make_frames(size: int, count: int = 32, seed: int = 42) -> list[bytes]:
+    """Random payloads of a given size, including some bytes to escape."""
+    rng = random.Random(seed + size)
+    return [rng.randbytes(size) for _ in range(count)]
+
+
+@benchmark("hdlc_encode", FRAME_SIZES)
+def bench_hdlc_encode(size: int):
+    payload = make_frames(size, count=1)[0]
+    return lambda: hdlc_encode(payload)
+
+
+@benchmark("hdlc_decode", FRAME_SIZES)
+def bench_hdlc_decode(size: int):
+    frame = hdlc_encode(make_frames(size, count=1)[0])
+    return lambda: hdlc_decode(frame)
+
+
+@benchmark("hdlc_handler_feed", FRAME_SIZES)
+def bench_hdlc_handler_feed(size: int):
+    """32 frames received in a single chunk, as read from the serial port."""
+    handler = HDLCHandler()
+    chunk = b"".join(hdlc_encode(payload) for payload in make_frames(size))
+    return lambda: handler.feed(chunk)
+
+
+def _time_per_call_us(func, inputs, iterations=ITERATIONS) -> float:
+    def run():
+        for value in inputs:
+            func(value)
+
+    elapsed = min(timeit.repeat(run, number=max(1, iterations // len(inputs)), repeat=3))
+    return elapsed / (max(1, iterations // len(inputs)) * len(inputs)) * 1e6
+
+
+def main():
+    print(f"{'size':>6} {'op':>8} {'legacy (us)':>12} {'bulk (us)':>10} {'speedup':>8}")
+    for size in FRAME_SIZES:
+        payloads = make_frames(size)
+        encoded = [hdlc_encode(payload) for payload in payloads]
+        assert encoded == [legacy_hdlc_encode(payload) for payload in payloads]
+        assert [hdlc_decode(frame) for frame in encoded] == payloads
+        for op, legacy, bulk, inputs in (
+            ("encode", legacy_hdlc_encode, hdlc_encode, payloads),
+            ("decode", legacy_hdlc_decode, hdlc_decode, encoded),
+        ):
+            legacy_us = _time_per_call_us(legacy, inputs)
+            bulk_us = _time_per_call_us(bulk, inputs)
+            print(
+                f"{size:>6} {op:>8} {legacy_us:>12.2f} {bulk_us:>10.2f} "
+                f"{legacy_us / bulk_us:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
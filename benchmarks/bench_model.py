@@ -0,0 +1,79 @@
+"""Frame statistics and bookkeeping of the gateway, for networks of different sizes."""
+
+import itertools
+
+from benchmarks.runner import benchmark
+from marilib.mari_protocol import Frame, FrameView, Header, HeaderStats
+from marilib.model import MariGateway
+from marilib.snapshot import NetworkSnapshot
+
+NETWORK_SIZES = (10, 100, 1000)
+
+
+def make_gateway(nodes: int) -> MariGateway:
+    """A gateway with `nodes` nodes, each with some received frames."""
+    gateway = MariGateway()
+    for address in range(1, nodes + 1):
+        gateway.add_node(address)
+    for frame in itertools.islice(itertools.cycle(make_frames(nodes)), 10 * nodes):
+        gateway.register_received_frame(frame, is_test_packet=False)
+    return gateway
+
+
+def make_frames_bytes(nodes: int) -> list[bytes]:
+    """A frame received from each node."""
+    return [
+        bytes(
+            Frame(
+                Header(destination=0x10, source=address),
+                stats=HeaderStats(rssi=200),
+                payload=b"benchmark",
+            ).to_bytes()
+        )
+        for address in range(1, nodes + 1)
+    ]
+
+
+def make_frames(nodes: int) -> list[FrameView]:
+    return [FrameView(data) for data in make_frames_bytes(nodes)]
+
+
+@benchmark("frame_stats_add", NETWORK_SIZES)
+def bench_frame_stats_add(nodes: int):
+    """One received frame, from the next node in turn."""
+    gateway = make_gateway(nodes)
+    frames = itertools.cycle(make_frames(nodes))
+    return lambda: gateway.register_received_frame(next(frames), is_test_packet=False)
+
+
+@benchmark("frame_stats_windowed_queries", NETWORK_SIZES)
+def bench_frame_stats_windowed_queries(nodes: int):
+    """The windowed statistics of all nodes, as shown by the TUI."""
+    gateway = make_gateway(nodes)
+
+    def run():
+        for node in gateway.nodes:
+            node.stats.received_count(window_secs=1)
+            node.stats.success_rate(window_secs=30)
+            node.stats.received_rssi_dbm(window_secs=5)
+
+    return run
+
+
+@benchmark("gateway_update", NETWORK_SIZES)
+def bench_gateway_update(nodes: int):
+    """The periodic update, with all nodes alive."""
+    gateway = make_gateway(nodes)
+
+    def run():
+        for node in gateway.nodes:
+            node.touch()
+        gateway.update()
+
+    return run
+
+
+@benchmark("network_snapshot", NETWORK_SIZES)
+def bench_network_snapshot(nodes: int):
+    gateway = make_gateway(nodes)
+    return lambda: NetworkSnapshot.from_gateways([gateway])
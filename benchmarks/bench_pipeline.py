@@ -0,0 +1,117 @@
+"""The receive pipelines of MarilibEdge and MarilibCloud, the metrics logger and the TUI."""
+
+import io
+import itertools
+import tempfile
+
+from rich.console import Console
+
+from benchmarks.bench_model import NETWORK_SIZES, make_frames_bytes, make_gateway
+from benchmarks.runner import benchmark
+from marilib.communication_adapter import MQTTAdapterDummy, SerialAdapter
+from marilib.exporter import RuntimeStats, render_openmetrics
+from marilib.instrumentation import PipelineTracer
+from marilib.logger import MetricsLogger
+from marilib.marilib_cloud import MarilibCloud
+from marilib.marilib_edge import MarilibEdge
+from marilib.model import EdgeEvent, GatewayInfo, NodeInfoCloud, NodeInfoEdge
+from marilib.snapshot import NetworkSnapshot
+from marilib.tui_edge import MarilibTUIEdge
+
+GATEWAY_ADDRESS = 0x10
+
+
+class _StreamSerialAdapter(SerialAdapter):
+    """Serial adapter without a port, the benchmarks feed the edge directly."""
+
+    def __init__(self):
+        super().__init__("benchmark")
+
+    def init(self, on_data_received: callable):
+        self.on_data_received = on_data_received
+
+    def send_data(self, data) -> bool:
+        return True
+
+
+def _node_data_stream(nodes: int) -> list[bytes]:
+    prefix = EdgeEvent.to_bytes(EdgeEvent.NODE_DATA)
+    return [prefix + data for data in make_frames_bytes(nodes)]
+
+
+@benchmark("edge_handle_serial_data", NETWORK_SIZES)
+def bench_edge_handle_serial_data(nodes: int):
+    """NODE_DATA events received from each node in turn."""
+    mari = MarilibEdge(lambda event, data: None, _StreamSerialAdapter())
+    info = GatewayInfo(address=GATEWAY_ADDRESS, network_id=1)
+    mari.handle_serial_data(EdgeEvent.to_bytes(EdgeEvent.GATEWAY_INFO) + info.to_bytes())
+    for address in range(1, nodes + 1):
+        event = EdgeEvent.to_bytes(EdgeEvent.NODE_JOINED) + NodeInfoEdge(address=address).to_bytes()
+        mari.handle_serial_data(event)
+    stream = itertools.cycle(_node_data_stream(nodes))
+    return lambda: mari.handle_serial_data(next(stream))
+
+
+@benchmark("edge_on_serial_data_received", ("untraced", "traced", "sampled"))
+def bench_edge_on_serial_data_received(mode: str):
+    """The whole receive path of 100 nodes, to compare with the cost of tracing."""
+    tracer = None if mode == "untraced" else PipelineTracer(16 if mode == "sampled" else 1)
+    mari = MarilibEdge(lambda event, data: None, _StreamSerialAdapter(), tracer=tracer)
+    stream = itertools.cycle(_node_data_stream(100))
+
+    def run():
+        if tracer is not None:
+            tracer.begin()
+        mari.on_serial_data_received(next(stream))
+
+    return run
+
+
+@benchmark("cloud_handle_mqtt_data", NETWORK_SIZES)
+def bench_cloud_handle_mqtt_data(nodes: int):
+    """NODE_DATA events forwarded by an edge, from each node in turn."""
+    mari = MarilibCloud(lambda event, data: None, MQTTAdapterDummy(is_edge=False), network_id=1)
+    info = GatewayInfo(address=GATEWAY_ADDRESS, network_id=1)
+    mari.handle_mqtt_data(EdgeEvent.to_bytes(EdgeEvent.GATEWAY_INFO) + info.to_bytes())
+    for address in range(1, nodes + 1):
+        node_info = NodeInfoCloud(address=address, gateway_address=GATEWAY_ADDRESS)
+        mari.handle_mqtt_data(EdgeEvent.to_bytes(EdgeEvent.NODE_JOINED) + node_info.to_bytes())
+    stream = itertools.cycle(_node_data_stream(nodes))
+    return lambda: mari.handle_mqtt_data(next(stream))
+
+
+@benchmark("logger_metrics_rows", NETWORK_SIZES)
+def bench_logger_metrics_rows(nodes: int):
+    """The gateway row and the rows of all nodes, written at each log interval."""
+    snapshot = NetworkSnapshot.from_gateways([make_gateway(nodes)])
+    logger = MetricsLogger(log_dir_base=tempfile.mkdtemp(prefix="marilib-benchmark-"))
+
+    def run():
+        logger.log_gateway_metrics(snapshot.gateways[0])
+        logger.log_all_nodes_metrics(snapshot.gateways[0])
+
+    return run
+
+
+@benchmark("exporter_render", NETWORK_SIZES)
+def bench_exporter_render(nodes: int):
+    """The OpenMetrics text of a snapshot, rendered by the first scrape of a tick."""
+    snapshot = NetworkSnapshot.from_gateways([make_gateway(nodes)])
+    return lambda: render_openmetrics(snapshot, RuntimeStats())
+
+
+@benchmark("tui_nodes_table", NETWORK_SIZES)
+def bench_tui_nodes_table(nodes: int):
+    """The nodes table of the edge TUI, built and rendered to text."""
+    tui = MarilibTUIEdge()
+    tui.live.stop()
+    console = Console(file=io.StringIO(), width=200, height=60)
+    columns = NetworkSnapshot.from_gateways([make_gateway(nodes)]).gateways[0].nodes
+    rows = range(min(len(columns), tui.max_tables * 50))
+
+    def run():
+        console.file.seek(0)
+        console.file.truncate()
+        console.print(tui.create_nodes_table(columns, rows))
+
+    return run
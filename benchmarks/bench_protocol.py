@@ -0,0 +1,56 @@
+"""Parsing and serialization of the Mari frames and of each Packet subclass."""
+
+from benchmarks.runner import benchmark
+from marilib.mari_protocol import Frame, FrameView, Header, HeaderStats
+from marilib.model import GatewayInfo, NodeInfoCloud, NodeInfoEdge, NodeStatsReply
+
+PAYLOAD_SIZES = (0, 32, 200)
+
+PACKETS = {
+    "Header": Header(destination=0x1122334455667788, source=0x8877665544332211),
+    "HeaderStats": HeaderStats(rssi=200),
+    "GatewayInfo": GatewayInfo(address=0x1122334455667788, network_id=1),
+    "NodeInfoCloud": NodeInfoCloud(address=0x42, gateway_address=0x10),
+    "NodeInfoEdge": NodeInfoEdge(address=0x42),
+    "NodeStatsReply": NodeStatsReply(rx_app_packets=10, tx_app_packets=20),
+}
+
+
+def _frame(size: int) -> Frame:
+    return Frame(Header(destination=0x10, source=0x42), payload=bytes(range(size)))
+
+
+@benchmark("frame_from_bytes", PAYLOAD_SIZES)
+def bench_frame_from_bytes(size: int):
+    data = bytes(_frame(size).to_bytes())
+    return lambda: Frame().from_bytes(data)
+
+
+@benchmark("frame_to_bytes", PAYLOAD_SIZES)
+def bench_frame_to_bytes(size: int):
+    frame = _frame(size)
+    return frame.to_bytes
+
+
+@benchmark("frame_view_fields", PAYLOAD_SIZES)
+def bench_frame_view_fields(size: int):
+    """The fields read by the RX path, without decoding the whole frame."""
+    data = bytes(_frame(size).to_bytes())
+
+    def run():
+        view = FrameView(data)
+        return view.source, view.destination, view.rssi_dbm, view.payload
+
+    return run
+
+
+@benchmark("packet_from_bytes", PACKETS)
+def bench_packet_from_bytes(name: str):
+    packet = PACKETS[name]
+    data = bytes(packet.to_bytes())
+    return lambda: type(packet)().from_bytes(data)
+
+
+@benchmark("packet_to_bytes", PACKETS)
+def bench_packet_to_bytes(name: str):
+    return PACKETS[name].to_bytes
@@ -0,0 +1,196 @@
+"""Runs the benchmarks of the hot paths, saves and compares their results.
+
+Benchmarks are registered by the `bench_*` modules of this package with the
+`benchmark` decorator. A benchmark is a setup function, called once per
+parameter, returning the function to time.
+
+Usage:
+python -m benchmarks.runner --output before.json
+python -m benchmarks.runner --output after.json --compare before.json
+"""
+
+import importlib
+import json
+import pkgutil
+import platform
+import statistics
+import sys
+import time
+import timeit
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Callable, Iterable
+
+import click
+
+RESULTS_FORMAT_VERSION = 1
+DEFAULT_ROUNDS = 5
+DEFAULT_MIN_TIME = 0.05  # seconds per round, the number of calls is calibrated to it
+DEFAULT_THRESHOLD = 0.10  # relative slowdown of the median reported as a regression
+
+
+@dataclass
+class Benchmark:
+    name: str
+    setup: Callable[..., Callable[[], Any]]
+    param: Any = None
+
+    def __call__(self) -> Callable[[], Any]:
+        return self.setup() if self.param is None else self.setup(self.param)
+
+
+@dataclass
+class BenchmarkResult:
+    """Time per call of a benchmark, in microseconds."""
+
+    rounds: int
+    number: int
+    min_us: float
+    median_us: float
+    mean_us: float
+    stdev_us: float
+
+    @property
+    def ops_per_second(self) -> float:
+        return 1e6 / self.median_us if self.median_us else 0.0
+
+
+BENCHMARKS: list[Benchmark] = []
+
+
+def benchmark(name: str, params: Iterable | None = None):
+    """Registers a setup function, as `name[param]` for each of the `params`."""
+
+    def decorator(setup):
+        if params is None:
+            BENCHMARKS.append(Benchmark(name, setup))
+        else:
+            BENCHMARKS.extend(Benchmark(f"{name}[{param}]", setup, param) for param in params)
+        return setup
+
+    return decorator
+
+
+def load_benchmarks() -> list[Benchmark]:
+    """Imports the `bench_*` modules, which register their benchmarks."""
+    package = sys.modules[__package__]
+    for module in pkgutil.iter_modules(package.__path__):
+        if module.name.startswith("bench_"):
+            importlib.import_module(f"{__package__}.{module.name}")
+    # run with -m, this module is __main__ and the benchmarks are registered in its import
+    return importlib.import_module(f"{__package__}.runner").BENCHMARKS
+
+
+def run_benchmark(
+    bench: Benchmark, rounds: int = DEFAULT_ROUNDS, min_time: float = DEFAULT_MIN_TIME
+) -> BenchmarkResult:
+    timer = timeit.Timer(bench())
+    number = 1
+    while (elapsed := timer.timeit(number)) < min_time:
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+    times = [elapsed / number * 1e6]
+    times += [t / number * 1e6 for t in timer.repeat(rounds - 1, number)] if rounds > 1 else []
+    return BenchmarkResult(
+        rounds=len(times),
+        number=number,
+        min_us=min(times),
+        median_us=statistics.median(times),
+        mean_us=statistics.fmean(times),
+        stdev_us=statistics.stdev(times) if len(times) > 1 else 0.0,
+    )
+
+
+def run_benchmarks(
+    selection: str | None = None,
+    rounds: int = DEFAULT_ROUNDS,
+    min_time: float = DEFAULT_MIN_TIME,
+    on_result: Callable[[str, BenchmarkResult], None] | None = None,
+) -> dict:
+    """Runs the benchmarks whose name contains `selection`, returns the results document."""
+    results = {}
+    for bench in load_benchmarks():
+        if selection and selection not in bench.name:
+            continue
+        results[bench.name] = result = run_benchmark(bench, rounds, min_time)
+        if on_result is not None:
+            on_result(bench.name, result)
+    return {
+        "version": RESULTS_FORMAT_VERSION,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "machine": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(),
+        },
+        "benchmarks": {name: asdict(result) for name, result in results.items()},
+    }
+
+
+def compare(old: dict, new: dict, threshold: float = DEFAULT_THRESHOLD) -> list[tuple]:
+    """Returns (name, old median, new median, ratio, regression) for the common benchmarks."""
+    rows = []
+    for name, result in new["benchmarks"].items():
+        if name not in old["benchmarks"]:
+            continue
+        old_median = old["benchmarks"][name]["median_us"]
+        ratio = result["median_us"] / old_median if old_median else 1.0
+        rows.append((name, old_median, result["median_us"], ratio, ratio > 1 + threshold))
+    return rows
+
+
+@click.command()
+@click.option("--select", "-k", default=None, help="Only run benchmarks whose name contains it.")
+@click.option("--rounds", default=DEFAULT_ROUNDS, show_default=True, help="Rounds per benchmark.")
+@click.option("--min-time", default=DEFAULT_MIN_TIME, show_default=True, help="Seconds per round.")
+@click.option("--output", "-o", type=click.Path(), default=None, help="JSON file of the results.")
+@click.option(
+    "--compare",
+    "baseline",
+    type=click.Path(exists=True),
+    default=None,
+    help="JSON results of a previous run to compare with.",
+)
+@click.option(
+    "--threshold",
+    default=DEFAULT_THRESHOLD,
+    show_default=True,
+    help="Relative slowdown reported as a regression.",
+)
+def main(
+    select: str | None,
+    rounds: int,
+    min_time: float,
+    output: str | None,
+    baseline: str | None,
+    threshold: float,
+):
+    """Runs the benchmarks, exits with status 1 if a regression is found."""
+    print(f"{'benchmark':<48} {'median (us)':>12} {'stdev':>8} {'ops/s':>12}")
+
+    def on_result(name: str, result: BenchmarkResult):
+        print(
+            f"{name:<48} {result.median_us:>12.3f} {result.stdev_us:>8.3f} "
+            f"{result.ops_per_second:>12.0f}"
+        )
+
+    start = time.monotonic()
+    results = run_benchmarks(select, rounds, min_time, on_result)
+    print(f"{len(results['benchmarks'])} benchmarks in {time.monotonic() - start:.1f}s")
+    if output:
+        with open(output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    if not baseline:
+        return
+    with open(baseline, encoding="utf-8") as file:
+        rows = compare(json.load(file), results, threshold)
+    print(f"\n{'benchmark':<48} {'before (us)':>12} {'after (us)':>12} {'ratio':>7}")
+    for name, old_median, new_median, ratio, regression in rows:
+        flag = "  REGRESSION" if regression else ""
+        print(f"{name:<48} {old_median:>12.3f} {new_median:>12.3f} {ratio:>6.2f}x{flag}")
+    if any(row[4] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ from marilib.logger import MetricsLogger
 from marilib.mari_protocol import Frame, MARI_BROADCAST_ADDRESS
 from marilib.model import EdgeEvent, MariNode
 from marilib.communication_adapter import SerialAdapter, MQTTAdapter
+from marilib.exporter import MetricsExporter
 from marilib.serial_uart import get_default_port
 from marilib.tui_edge import MarilibTUIEdge
 from marilib.marilib_edge import MarilibEdge
@@ -41,18 +42,49 @@ def on_event(event: EdgeEvent, event_data: MariNode | Frame):
     help="Directory to save metric log files.",
     type=click.Path(),
 )
-def main(port: str | None, mqtt_url: str, log_dir: str):
+@click.option(
+    "--capture",
+    default=None,
+    help="File to capture the received frames to, for a later replay.",
+    type=click.Path(),
+)
+@click.option(
+    "--mqtt-batch-bytes",
+    default=0,
+    show_default=True,
+    help="Size of the MQTT messages the events are packed in (default: one message per event).",
+    type=int,
+)
+@click.option(
+    "--metrics-port",
+    default=None,
+    help="Port to serve the metrics on, in the OpenMetrics format (default: not served).",
+    type=int,
+)
+def main(
+    port: str | None,
+    mqtt_url: str,
+    log_dir: str,
+    capture: str | None,
+    mqtt_batch_bytes: int,
+    metrics_port: int | None,
+):
     """A basic example of using the MarilibEdge library."""
 
     mari = MarilibEdge(
         on_event,
-        serial_interface=SerialAdapter(port),
-        mqtt_interface=MQTTAdapter.from_url(mqtt_url, is_edge=True) if mqtt_url else None,
+        serial_interface=SerialAdapter(port, capture_file=capture),
+        mqtt_interface=(
+            MQTTAdapter.from_url(mqtt_url, is_edge=True, batch_max_bytes=mqtt_batch_bytes)
+            if mqtt_url
+            else None
+        ),
         logger=MetricsLogger(
             log_dir_base=log_dir, rotation_interval_minutes=1440, log_interval_seconds=1.0
         ),
         tui=MarilibTUIEdge(),
         main_file=__file__,
+        exporter=MetricsExporter(port=metrics_port) if metrics_port else None,
     )
 
     try:
@@ -67,6 +99,9 @@ def main(port: str | None, mqtt_url: str, log_dir: str):
     finally:
         mari.close_tui()
         mari.logger.close()
+        mari.serial_interface.close()
+        if mari.exporter:
+            mari.exporter.stop()
 
 
 if __name__ == "__main__":
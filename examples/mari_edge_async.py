@@ -0,0 +1,26 @@
+import asyncio
+import sys
+
+from marilib.aio import AsyncMarilibEdge, AsyncSerialAdapter
+from marilib.model import EdgeEvent
+from marilib.serial_uart import get_default_port
+
+
+async def run_gateway(port: str):
+    async with AsyncMarilibEdge(AsyncSerialAdapter(port)) as mari:
+        async for event, event_data in mari.events():
+            if event == EdgeEvent.NODE_DATA:
+                # echo the payload back to the node
+                await mari.send_frame(event_data.header.source, event_data.payload)
+            elif event in (EdgeEvent.NODE_JOINED, EdgeEvent.NODE_LEFT):
+                print(f"{port}: {event.name} 0x{event_data.address:016X}")
+
+
+async def main():
+    # all the gateways are handled by the same event loop
+    ports = sys.argv[1:] or [get_default_port()]
+    await asyncio.gather(*(run_gateway(port) for port in ports))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,11 +1,6 @@
 import time
 
-from marilib.serial_hdlc import (
-    HDLCDecodeException,
-    HDLCHandler,
-    HDLCState,
-    hdlc_encode,
-)
+from marilib.serial_hdlc import HDLCHandler, hdlc_encode
 from marilib.serial_uart import SerialInterface
 
 BAUDRATE = 1000000
@@ -14,18 +9,13 @@ BAUDRATE = 1000000
 hdlc_handler = HDLCHandler()
 
 
-def on_byte_received(byte):
-    # print(f"Received byte: {byte}")
-    hdlc_handler.handle_byte(byte)
-    if hdlc_handler.state == HDLCState.READY:
-        try:
-            payload = hdlc_handler.payload
-            print(f"Received payload: {payload.hex()}")
-        except HDLCDecodeException as e:
-            print(f"Error decoding payload: {e}")
+def on_bytes_received(chunk):
+    # print(f"Received bytes: {chunk}")
+    for payload in hdlc_handler.feed(chunk):
+        print(f"Received payload: {payload.hex()}")
 
 
-serial_interface = SerialInterface("/dev/ttyACM0", BAUDRATE, on_byte_received)
+serial_interface = SerialInterface("/dev/ttyACM0", BAUDRATE, on_bytes_received)
 
 
 while True:
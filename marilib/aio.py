@@ -0,0 +1,374 @@
+"""asyncio variants of the adapters and of MarilibEdge/MarilibCloud.
+
+Everything runs on the event loop: the serial port is read and written through
+pipe transports on its file descriptor, the MQTT client socket is watched by
+the loop and the bookkeeping of `update()` runs as a task. Several gateways can
+therefore be handled by a single loop, without a thread per port.
+
+Objects must be created from a coroutine, with the loop running. The frames
+and events coming from other threads, like the downlink scheduler or the
+dispatcher workers, are handed over to the loop with `call_soon_threadsafe`.
+
+
+    async with AsyncMarilibEdge(AsyncSerialAdapter("/dev/ttyACM0")) as mari:
+        async for event_type, event_data in mari.events():
+            ...
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, AsyncIterator, Callable
+
+import paho.mqtt.client as mqtt
+import serial
+from rich import print
+
+from marilib.communication_adapter import MQTTAdapter, SerialAdapter
+from marilib.marilib_cloud import MarilibCloud
+from marilib.marilib_edge import MarilibEdge
+from marilib.model import EdgeEvent
+from marilib.serial_hdlc import hdlc_encode
+from marilib.serial_uart import (
+    SERIAL_DEFAULT_BAUDRATE,
+    SERIAL_GATEWAY_RX_BUFFER_SIZE,
+    SERIAL_TX_QUEUE_SIZE,
+    SerialStats,
+    gateway_tx_bucket,
+)
+
+AIO_UPDATE_INTERVAL = 0.1  # seconds between two update() calls
+AIO_EVENTS_QUEUE_SIZE = 1024
+AIO_MQTT_MISC_INTERVAL = 1.0  # seconds between two paho loop_misc() calls
+AIO_MQTT_KEEPALIVE = 60  # seconds
+
+
+def _on_loop(loop: asyncio.AbstractEventLoop) -> bool:
+    """Whether the caller runs on `loop`, asyncio objects can't be used from other threads."""
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
+
+
+def _call_on_loop(loop: asyncio.AbstractEventLoop, callback: Callable, *args):
+    """Calls `callback` now if on `loop`, else schedules it there."""
+    if _on_loop(loop):
+        callback(*args)
+    else:
+        loop.call_soon_threadsafe(callback, *args)
+
+
+class _SerialProtocol(asyncio.Protocol):
+    def __init__(self, adapter: "AsyncSerialAdapter"):
+        self.adapter = adapter
+
+    def data_received(self, data: bytes):
+        self.adapter._stats.add_read(len(data))
+        self.adapter.on_chunk_received(data)
+
+    def connection_lost(self, exc: Exception | None):
+        print(f"[red]Serial port {self.adapter.port} disconnected[/]")
+
+
+class AsyncSerialAdapter(SerialAdapter):
+    """Serial adapter driven by the running event loop.
+
+    Writes are queued and paced like with `SerialWriter`. `wait_for_room` waits
+    for the TX queue to have room. `send_data` can be called from other
+    threads, the frame is then queued by the loop and a full queue is only
+    counted in `stats.write_drops`.
+    """
+
+    def __init__(
+        self,
+        port,
+        baudrate=SERIAL_DEFAULT_BAUDRATE,
+        tx_queue_size: int = SERIAL_TX_QUEUE_SIZE,
+        capture_file: str | None = None,
+    ):
+        super().__init__(port, baudrate, capture_file)
+        self.tx_queue_size = tx_queue_size
+        self._stats = SerialStats()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._tx_queue: asyncio.Queue | None = None
+        self._room: asyncio.Event | None = None
+        self._read_transport = None
+        self._write_transport = None
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def stats(self) -> SerialStats:
+        return self._stats
+
+    @property
+    def tx_queue_depth(self) -> int:
+        return self._tx_queue.qsize() if self._tx_queue else 0
+
+    def init(self, on_data_received: callable):
+        loop = self._loop = asyncio.get_running_loop()
+        self.on_data_received = on_data_received
+        self._open_capture()
+        self.serial = serial.Serial(self.port, self.baudrate, timeout=0)
+        self._tx_queue = asyncio.Queue(maxsize=self.tx_queue_size)
+        self._room = asyncio.Event()
+        self._room.set()
+        self._tasks = [loop.create_task(self._run())]
+        print(f"[yellow]Connected to serial port {self.port} at {self.baudrate} baud[/]")
+
+    async def wait_connected(self):
+        """Waits for the transports on the serial port to be open."""
+        while self._write_transport is None:
+            if self._tasks and self._tasks[0].done():
+                self._tasks[0].result()  # raises the error that stopped it
+            await asyncio.sleep(0)
+
+    def close(self):
+        print("[yellow]Disconnect from gateway...[/]")
+        for task in self._tasks:
+            task.cancel()
+        for transport in (self._read_transport, self._write_transport):
+            if transport is not None:
+                transport.close()
+        self._close_capture()
+
+    def send_data(self, data) -> bool:
+        """Queue data to be sent to the gateway, returns False if it was dropped."""
+        return self._put(hdlc_encode(data))
+
+    def send_data_batch(self, data_list: list[bytes]) -> bool:
+        """Queue several payloads to be sent to the gateway as a single write."""
+        return self._put(b"".join(hdlc_encode(data) for data in data_list))
+
+    async def wait_for_room(self):
+        """Waits until the TX queue can take a frame."""
+        while self._tx_queue.full():
+            self._room.clear()
+            await self._room.wait()
+
+    def _put(self, bytes_: bytes) -> bool:
+        item = (time.monotonic(), bytes(bytes_))
+        if _on_loop(self._loop):
+            return self._put_nowait(item)
+        self._loop.call_soon_threadsafe(self._put_nowait, item)
+        return True
+
+    def _put_nowait(self, item: tuple[float, bytes]) -> bool:
+        try:
+            self._tx_queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self._stats.write_drops += 1
+            return False
+        return True
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        fd = self.serial.fileno()
+        self._read_transport, _ = await loop.connect_read_pipe(
+            lambda: _SerialProtocol(self), self.serial
+        )
+        # a duplicate of the descriptor, so each transport can close its own
+        write_pipe = os.fdopen(os.dup(fd), "wb", buffering=0)
+        self._write_transport, _ = await loop.connect_write_pipe(asyncio.Protocol, write_pipe)
+        await self._write_loop()
+
+    async def _write_loop(self):
+        buffer_size = SERIAL_GATEWAY_RX_BUFFER_SIZE
+        bucket = gateway_tx_bucket(self.baudrate, buffer_size)
+        while True:
+            queued_ts, data = await self._tx_queue.get()
+            self._room.set()
+            queue_wait = time.monotonic() - queued_ts
+            for pos in range(0, len(data), buffer_size):
+                chunk = data[pos : pos + buffer_size]
+                if delay := bucket.reserve(len(chunk)):
+                    await asyncio.sleep(delay)
+                self._write_transport.write(chunk)
+            self._stats.add_write(len(data), queue_wait)
+
+
+class AsyncMQTTAdapter(MQTTAdapter):
+    """MQTT adapter whose client socket is handled by the running event loop.
+
+    paho's network loop is driven by reader/writer callbacks on the loop
+    instead of the `loop_start` thread, so messages are received on the loop.
+    The blocking connection to the broker runs in the default executor.
+    Batches are not supported, they would be published from the batcher thread.
+
+    `init` can be called from any thread, it is run on the loop running when
+    the adapter was created, or else on the one of its first call.
+    """
+
+    def __init__(
+        self, host, port, is_edge: bool, use_tls: bool = False, batch_max_bytes: int = 0, **kwargs
+    ):
+        if batch_max_bytes:
+            raise ValueError("AsyncMQTTAdapter doesn't support batches")
+        super().__init__(host, port, is_edge, use_tls, **kwargs)
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._loop = None  # created before the loop runs
+
+    def init(self):
+        if self.client:
+            # already initialized, do nothing
+            return
+        if self.network_id is None:
+            # network_id not set yet
+            return
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        elif not _on_loop(self._loop):
+            # with a dispatcher, the first GATEWAY_INFO is handled by a worker thread
+            self._loop.call_soon_threadsafe(self.init)
+            return
+
+        self.client = self._create_client()
+        self.client.on_socket_open = self._on_socket_open
+        self.client.on_socket_close = self._on_socket_close
+        self.client.on_socket_register_write = self._on_socket_register_write
+        self.client.on_socket_unregister_write = self._on_socket_unregister_write
+        self._connection_task = self._loop.create_task(self._connect())
+
+    async def _connect(self):
+        try:
+            await self._loop.run_in_executor(
+                None, self.client.connect, self.host, self.port, AIO_MQTT_KEEPALIVE
+            )
+        except OSError as exc:
+            print(f"[red]Failed to connect to MQTT broker on {self.host}:{self.port}: {exc}[/]")
+            return
+        print(f"[yellow]Connected to MQTT broker on {self.host}:{self.port}[/]")
+        await self._misc_loop()
+
+    def close(self):
+        if self.client is None:
+            return
+        self.client.disconnect()
+        self._connection_task.cancel()
+
+    async def _misc_loop(self):
+        """Keeps the connection alive, what the paho loop thread does otherwise."""
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(AIO_MQTT_MISC_INTERVAL)
+
+    # called from the executor while connecting, and from any thread that publishes
+    def _on_socket_open(self, client, userdata, sock):
+        _call_on_loop(self._loop, self._loop.add_reader, sock, client.loop_read)
+
+    def _on_socket_close(self, client, userdata, sock):
+        _call_on_loop(self._loop, self._loop.remove_reader, sock)
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        _call_on_loop(self._loop, self._loop.add_writer, sock, client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        _call_on_loop(self._loop, self._loop.remove_writer, sock)
+
+
+class _AsyncMarilib:
+    """Event stream and periodic bookkeeping shared by the asyncio wrappers."""
+
+    mari: MarilibEdge | MarilibCloud
+
+    def __init__(self, update_interval: float, events_queue_size: int):
+        self.update_interval = update_interval
+        self.events_dropped = 0
+        self._loop = asyncio.get_running_loop()
+        self._events = asyncio.Queue(maxsize=events_queue_size)
+        self._update_task: asyncio.Task | None = None
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def start(self):
+        """Starts calling `update()` periodically, as a task."""
+        if self._update_task is None:
+            self._update_task = self._loop.create_task(self._update_loop())
+
+    async def close(self):
+        if self._update_task is not None:
+            self._update_task.cancel()
+            self._update_task = None
+        self.mari.close_tui()
+
+    async def events(self) -> AsyncIterator[tuple[EdgeEvent, Any]]:
+        """Yields the (event type, event data) tuples, as they are received."""
+        while True:
+            yield await self._events.get()
+
+    def _on_event(self, event_type: EdgeEvent, event_data: Any):
+        # called by the threads of MarilibEdge/MarilibCloud too, like the dispatcher workers
+        _call_on_loop(self._loop, self._push_event, event_type, event_data)
+
+    def _push_event(self, event_type: EdgeEvent, event_data: Any):
+        if self._events.full():
+            # the application does not keep up, the oldest events are lost
+            self._events.get_nowait()
+            self.events_dropped += 1
+        self._events.put_nowait((event_type, event_data))
+
+    async def _update_loop(self):
+        while True:
+            self.mari.update()
+            self.mari.render_tui()
+            await asyncio.sleep(self.update_interval)
+
+
+class AsyncMarilibEdge(_AsyncMarilib):
+    """MarilibEdge running on the event loop.
+
+    Extra keyword arguments are passed to `MarilibEdge`, which is available as `mari`.
+    """
+
+    def __init__(
+        self,
+        serial_interface: AsyncSerialAdapter,
+        mqtt_interface: AsyncMQTTAdapter | None = None,
+        update_interval: float = AIO_UPDATE_INTERVAL,
+        events_queue_size: int = AIO_EVENTS_QUEUE_SIZE,
+        **kwargs,
+    ):
+        super().__init__(update_interval, events_queue_size)
+        self.mari = MarilibEdge(self._on_event, serial_interface, mqtt_interface, **kwargs)
+
+    async def send_frame(self, dst: int, payload: bytes):
+        """Sends a frame to the gateway, waits if the serial TX queue is full."""
+        await self.mari.serial_interface.wait_for_room()
+        self.mari.send_frame(dst, payload)
+
+    async def close(self):
+        await super().close()
+        self.mari.serial_interface.close()
+        self.mari.mqtt_interface.close()
+
+
+class AsyncMarilibCloud(_AsyncMarilib):
+    """MarilibCloud running on the event loop.
+
+    Extra keyword arguments are passed to `MarilibCloud`, which is available as `mari`.
+    """
+
+    def __init__(
+        self,
+        mqtt_interface: AsyncMQTTAdapter,
+        network_id: int,
+        update_interval: float = AIO_UPDATE_INTERVAL,
+        events_queue_size: int = AIO_EVENTS_QUEUE_SIZE,
+        **kwargs,
+    ):
+        super().__init__(update_interval, events_queue_size)
+        self.mari = MarilibCloud(self._on_event, mqtt_interface, network_id, **kwargs)
+
+    async def send_frame(self, dst: int, payload: bytes):
+        """Publishes a frame for the gateways, paho queues it without blocking."""
+        self.mari.send_frame(dst, payload)
+
+    async def close(self):
+        await super().close()
+        self.mari.mqtt_interface.close()
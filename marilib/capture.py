@@ -0,0 +1,131 @@
+"""Binary captures of the frames received from a gateway.
+
+A capture file starts with a header, magic and format version, followed by one
+record per frame: monotonic timestamp in ns, payload length and the payload of
+the HDLC frame, little endian. Records are only appended, the file can be read
+while it's written and is memory-mapped for reading.
+
+Each writer starts a session with a marker record, of length
+`CAPTURE_SESSION_MARKER` and without payload: the monotonic clock restarts with
+the host, so timestamps only compare within a session.
+"""
+
+import mmap
+import struct
+import threading
+import time
+from typing import Iterator
+
+CAPTURE_MAGIC = b"MCAP"
+CAPTURE_VERSION = 2  # version 1 has no session markers
+CAPTURE_SESSION_MARKER = 0xFFFFFFFF
+CAPTURE_FLUSH_INTERVAL = 1.0  # seconds, at most, before a record is flushed to the file
+
+_FILE_HEADER = struct.Struct("<4sB3x")
+_RECORD_HEADER = struct.Struct("<QI")
+
+
+class CaptureFormatError(Exception):
+    """Raised when a file is not a capture, or of an unsupported version."""
+
+
+class CaptureWriter:
+    """Appends the received frames to a capture file, in a new session.
+
+    Records are on disk `flush_interval` seconds after they are written at the
+    latest, or right away with 0: a timer flushes the ones left in the buffer
+    when no other record comes.
+    """
+
+    def __init__(self, path: str, flush_interval: float = CAPTURE_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.records = 0
+        self._lock = threading.Lock()
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(_FILE_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION))
+        else:
+            with open(path, "rb") as file:
+                if _check_header(file.read(_FILE_HEADER.size)) != CAPTURE_VERSION:
+                    self._file.close()
+                    raise CaptureFormatError("Can't append to an older capture version")
+        self._file.write(_RECORD_HEADER.pack(time.monotonic_ns(), CAPTURE_SESSION_MARKER))
+        self._file.flush()
+        self._flush_ts = time.monotonic()
+        self._timer: threading.Timer | None = None
+
+    def write(self, payload: bytes, timestamp_ns: int | None = None):
+        if timestamp_ns is None:
+            timestamp_ns = time.monotonic_ns()
+        with self._lock:
+            self._file.write(_RECORD_HEADER.pack(timestamp_ns, len(payload)))
+            self._file.write(payload)
+            self.records += 1
+            if (now := time.monotonic()) - self._flush_ts >= self.flush_interval:
+                self._flush(now)
+            elif self._timer is None:
+                self._timer = threading.Timer(
+                    self._flush_ts + self.flush_interval - now, self.flush
+                )
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            if not self._file.closed:
+                self._flush(time.monotonic())
+
+    def close(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._file.close()
+
+    def _flush(self, now: float):
+        """Flushes the file, with the lock held."""
+        self._file.flush()
+        self._flush_ts = now
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+
+def _check_header(header: bytes) -> int:
+    """Returns the version of a capture file header."""
+    if len(header) < _FILE_HEADER.size:
+        raise CaptureFormatError("Capture file too short")
+    magic, version = _FILE_HEADER.unpack_from(header)
+    if magic != CAPTURE_MAGIC:
+        raise CaptureFormatError("Not a capture file")
+    if not 1 <= version <= CAPTURE_VERSION:
+        raise CaptureFormatError(f"Unsupported capture version {version}")
+    return version
+
+
+def read_capture(path: str, sessions: bool = False) -> Iterator[tuple[int, bytes | None]]:
+    """Yields the (timestamp in ns, payload) records of a capture file.
+
+    With `sessions`, the start of each session is yielded too, as
+    (timestamp in ns, None). A record truncated at the end of the file, still
+    being written, is ignored.
+    """
+    with open(path, "rb") as file:
+        _check_header(file.read(_FILE_HEADER.size))
+        if file.seek(0, 2) == _FILE_HEADER.size:
+            return  # no record, an empty file can't be mapped
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            pos = _FILE_HEADER.size
+            end = len(buffer)
+            while pos + _RECORD_HEADER.size <= end:
+                timestamp_ns, length = _RECORD_HEADER.unpack_from(buffer, pos)
+                pos += _RECORD_HEADER.size
+                if length == CAPTURE_SESSION_MARKER:
+                    if sessions:
+                        yield timestamp_ns, None
+                    continue
+                if pos + length > end:
+                    return
+                yield timestamp_ns, buffer[pos : pos + length]
+                pos += length
@@ -1,17 +1,25 @@
 import base64
+import multiprocessing
+import threading
+import time
+from dataclasses import dataclass, field
+from multiprocessing.connection import Connection
 from urllib.parse import urlparse
 import paho.mqtt.client as mqtt
 
 from abc import ABC, abstractmethod
 from rich import print
 
-from marilib.serial_hdlc import (
-    HDLCDecodeException,
-    HDLCHandler,
-    HDLCState,
-    hdlc_encode,
+from marilib.capture import CaptureWriter, read_capture
+from marilib.instrumentation import PipelineTracer
+from marilib.mqtt_batch import MQTT_BATCH_LINGER, MQTTBatcher
+from marilib.serial_hdlc import HDLCHandler, hdlc_encode
+from marilib.serial_uart import (
+    SerialInterface,
+    SerialStats,
+    SERIAL_DEFAULT_BAUDRATE,
+    SERIAL_STATS_INTERVAL,
 )
-from marilib.serial_uart import SerialInterface, SERIAL_DEFAULT_BAUDRATE
 
 
 class CommunicationAdapterBase(ABC):
@@ -27,41 +35,318 @@ class CommunicationAdapterBase(ABC):
 
 
 class SerialAdapter(CommunicationAdapterBase):
-    """Class used to interface with the serial port."""
+    """Class used to interface with the serial port.
 
-    def __init__(self, port, baudrate=SERIAL_DEFAULT_BAUDRATE):
+    With `capture_file`, every received frame is appended to that capture file,
+    which `ReplaySerialAdapter` can replay.
+
+    With a `tracer`, the trace of each received frame starts when its bytes are read.
+    """
+
+    def __init__(self, port, baudrate=SERIAL_DEFAULT_BAUDRATE, capture_file: str | None = None):
         self.port = port
         self.baudrate = baudrate
+        self.capture_file = capture_file
+        self.capture: CaptureWriter | None = None
+        self.tracer: PipelineTracer | None = None
         self.hdlc_handler = HDLCHandler()
 
-    def on_byte_received(self, byte):
-        self.hdlc_handler.handle_byte(byte)
-        if self.hdlc_handler.state == HDLCState.READY:
+    @property
+    def stats(self) -> SerialStats | None:
+        return self.serial.stats if getattr(self, "serial", None) else None
+
+    def on_chunk_received(self, chunk: bytes):
+        if (tracer := self.tracer) is not None:
+            read_ns = time.perf_counter_ns()
+        payloads = self.hdlc_handler.feed(chunk)
+        if tracer is not None and payloads:
+            # the chunk is decoded at once, each frame gets its share
+            decode_ns = (time.perf_counter_ns() - read_ns) // len(payloads)
+        for payload in payloads:
+            # print(f"Received payload: {payload.hex()}")
+            if self.capture is not None:
+                self.capture.write(payload)
+            if tracer is not None:
+                tracer.begin(read_ns)
+                tracer.record("hdlc_decode", decode_ns)
+            self.on_data_received(payload)
+
+    def init(self, on_data_received: callable):
+        self.on_data_received = on_data_received
+        self._open_capture()
+        self.serial = SerialInterface(self.port, self.baudrate, self.on_chunk_received)
+        print(f"[yellow]Connected to serial port {self.port} at {self.baudrate} baud[/]")
+
+    def close(self):
+        print("[yellow]Disconnect from gateway...[/]")
+        self._close_capture()
+
+    def _open_capture(self):
+        if self.capture_file and self.capture is None:
+            self.capture = CaptureWriter(self.capture_file)
+            print(f"[yellow]Capturing received frames to {self.capture_file}[/]")
+
+    def _close_capture(self):
+        if self.capture is not None:
+            self.capture.close()
+            self.capture = None
+
+    @property
+    def tx_queue_depth(self) -> int:
+        return self.serial.tx_queue_depth if getattr(self, "serial", None) else 0
+
+    def send_data(self, data) -> bool:
+        """Queue data to be sent to the gateway, returns False if it was dropped."""
+        return self.serial.write(hdlc_encode(data))
+
+    def send_data_batch(self, data_list: list[bytes]) -> bool:
+        """Queue several payloads to be sent to the gateway as a single write."""
+        buffer = bytearray()
+        for data in data_list:
+            buffer += hdlc_encode(data)
+        return self.serial.write(bytes(buffer))
+
+
+@dataclass
+class _ReaderStats:
+    """Statistics of the reader process of a ProcessSerialAdapter, sent periodically."""
+
+    serial: SerialStats = field(default_factory=SerialStats)
+    tx_queue_depth: int = 0
+    hdlc_decoded: int = 0
+    hdlc_invalid_fcs: int = 0
+    hdlc_invalid_payload: int = 0
+
+
+def _serial_reader_process(port: str, baudrate: int, conn: Connection):
+    """Runs in the reader process of a ProcessSerialAdapter."""
+    hdlc_handler = HDLCHandler()
+    send_lock = threading.Lock()
+    stopped = threading.Event()
+
+    def on_chunk_received(chunk: bytes):
+        if payloads := hdlc_handler.feed(chunk):
+            with send_lock:
+                conn.send(payloads)
+
+    def send_stats():
+        while not stopped.wait(SERIAL_STATS_INTERVAL):
+            stats = _ReaderStats(
+                serial.stats,
+                serial.tx_queue_depth,
+                hdlc_handler.decoded,
+                hdlc_handler.invalid_fcs,
+                hdlc_handler.invalid_payload,
+            )
             try:
-                payload = self.hdlc_handler.payload
-                # print(f"Received payload: {payload.hex()}")
-                self.on_data_received(payload)
-            except HDLCDecodeException as e:
-                print(f"Error decoding payload: {e}")
+                with send_lock:
+                    conn.send(stats)
+            except OSError:
+                return
+
+    serial = SerialInterface(port, baudrate, on_chunk_received)
+    with send_lock:
+        conn.send([])  # the port is open
+    threading.Thread(target=send_stats, daemon=True).start()
+    while True:
+        try:
+            data = conn.recv()
+        except (EOFError, OSError):
+            break
+        if data is None:
+            break
+        serial.write(data)
+    stopped.set()
+    serial.stop()
+
+
+class ProcessSerialAdapter(SerialAdapter):
+    """Serial adapter reading the port and decoding HDLC frames in a separate process.
+
+    Each adapter gets its own process, so several gateways use several cores.
+    The decoded payloads are received in batches by a thread of this process.
+    `stats`, `tx_queue_depth` and the counters of `hdlc_handler` are those of
+    the reader process, received every `SERIAL_STATS_INTERVAL` seconds.
+    """
+
+    def __init__(self, port, baudrate=SERIAL_DEFAULT_BAUDRATE, capture_file: str | None = None):
+        super().__init__(port, baudrate, capture_file)
+        self._reader_stats = _ReaderStats()
+        self._send_lock = threading.Lock()
+        self._connected = threading.Event()
+        self.process = None
+
+    @property
+    def stats(self) -> SerialStats:
+        return self._reader_stats.serial
+
+    @property
+    def tx_queue_depth(self) -> int:
+        return self._reader_stats.tx_queue_depth
 
     def init(self, on_data_received: callable):
         self.on_data_received = on_data_received
-        self.serial = SerialInterface(self.port, self.baudrate, self.on_byte_received)
+        self._open_capture()
+        context = multiprocessing.get_context("spawn")
+        self._conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_serial_reader_process,
+            args=(self.port, self.baudrate, child_conn),
+            name=f"marilib-serial-{self.port}",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self._receiver = threading.Thread(target=self._receive, daemon=True)
+        self._receiver.start()
         print(f"[yellow]Connected to serial port {self.port} at {self.baudrate} baud[/]")
 
+    def wait_connected(self, timeout: float | None = None) -> bool:
+        """Waits for the reader process to have opened the port."""
+        return self._connected.wait(timeout)
+
     def close(self):
         print("[yellow]Disconnect from gateway...[/]")
+        if self.process is None:
+            return
+        self._send(None)
+        self.process.join()
+        self._conn.close()
+        self._close_capture()
 
-    def send_data(self, data):
-        self.serial.serial.flush()
-        encoded = hdlc_encode(data)
-        self.serial.write(encoded)
+    def send_data(self, data) -> bool:
+        """Send data to the reader process, which queues it for the gateway."""
+        return self._send(bytes(hdlc_encode(data)))
 
+    def send_data_batch(self, data_list: list[bytes]) -> bool:
+        """Send several payloads to the reader process, written as a single write."""
+        return self._send(b"".join(hdlc_encode(data) for data in data_list))
 
-class MQTTAdapter(CommunicationAdapterBase):
-    """Class used to interface with MQTT."""
+    def _send(self, data: bytes | None) -> bool:
+        try:
+            with self._send_lock:
+                self._conn.send(data)
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def _receive(self):
+        while True:
+            try:
+                payloads = self._conn.recv()
+            except (EOFError, OSError):
+                print(f"[red]Serial reader process of {self.port} stopped[/]")
+                break
+            self._connected.set()
+            if isinstance(payloads, _ReaderStats):
+                self._update_reader_stats(payloads)
+                continue
+            for payload in payloads:
+                if self.capture is not None:
+                    self.capture.write(payload)
+                if self.tracer is not None:
+                    self.tracer.begin()  # decoded in the reader process
+                self.on_data_received(payload)
+
+    def _update_reader_stats(self, stats: _ReaderStats):
+        self._reader_stats = stats
+        # the frames are decoded in the reader process, its handler is mirrored here
+        self.hdlc_handler.decoded = stats.hdlc_decoded
+        self.hdlc_handler.invalid_fcs = stats.hdlc_invalid_fcs
+        self.hdlc_handler.invalid_payload = stats.hdlc_invalid_payload
+
+
+class ReplaySerialAdapter(SerialAdapter):
+    """Serial adapter feeding the frames of a capture file, instead of a gateway.
+
+    Frames are replayed with their original timing divided by `speed`, or as
+    fast as possible if `speed` is None. The sessions of a capture are replayed
+    one after the other. Sent data is discarded.
+    """
+
+    def __init__(self, capture_file: str, speed: float | None = 1.0):
+        super().__init__(capture_file)
+        self.speed = speed
+        self.replayed = 0
+        self.done = threading.Event()
+        self._stats = SerialStats()
+        self._running = False
+        self._thread = None
+
+    @property
+    def stats(self) -> SerialStats:
+        return self._stats
 
-    def __init__(self, host, port, is_edge: bool, use_tls: bool = False):
+    @property
+    def tx_queue_depth(self) -> int:
+        return 0
+
+    def init(self, on_data_received: callable):
+        self.on_data_received = on_data_received
+        self._running = True
+        self._thread = threading.Thread(target=self._replay, name="marilib-replay", daemon=True)
+        self._thread.start()
+        print(f"[yellow]Replaying {self.port} at speed {self.speed or 'max'}[/]")
+
+    def wait_done(self, timeout: float | None = None) -> bool:
+        """Waits for the whole capture to be replayed."""
+        return self.done.wait(timeout)
+
+    def close(self):
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def send_data(self, data) -> bool:
+        self._stats.add_write(len(hdlc_encode(data)), 0)
+        return True
+
+    def send_data_batch(self, data_list: list[bytes]) -> bool:
+        return all([self.send_data(data) for data in data_list])
+
+    def _replay(self):
+        start = first_ns = None
+        for timestamp_ns, payload in read_capture(self.port, sessions=True):
+            if not self._running:
+                break
+            if payload is None:
+                # a new session, with timestamps from another boot
+                first_ns = None
+                continue
+            if self.speed:
+                if first_ns is None:
+                    first_ns = timestamp_ns
+                    start = time.perf_counter()
+                delay = (timestamp_ns - first_ns) / 1e9 / self.speed
+                if (wait := start + delay - time.perf_counter()) > 0:
+                    time.sleep(wait)
+            self._stats.add_read(len(payload))
+            if self.tracer is not None:
+                self.tracer.begin()
+            self.on_data_received(payload)
+            self.replayed += 1
+        self.done.set()
+
+
+class MQTTAdapter(CommunicationAdapterBase):
+    """Class used to interface with MQTT.
+
+    With `batch_max_bytes`, the events sent to the cloud are packed in batches
+    of up to that size, published `batch_linger` seconds after their first
+    event at the latest. MarilibCloud receives both batches and single events.
+    Batches are published from the thread of the batcher, AsyncMQTTAdapter
+    doesn't support them.
+    """
+
+    def __init__(
+        self,
+        host,
+        port,
+        is_edge: bool,
+        use_tls: bool = False,
+        batch_max_bytes: int = 0,
+        batch_linger: float = MQTT_BATCH_LINGER,
+    ):
         self.host = host
         self.port = port
         self.is_edge = is_edge
@@ -72,15 +357,18 @@ class MQTTAdapter(CommunicationAdapterBase):
         # optimize qos for throughput
         # 0 = no delivery guarantee, 1 = at least once, 2 = exactly once
         self.qos = 0
+        self.batcher: MQTTBatcher | None = None
+        if batch_max_bytes:
+            self.batcher = MQTTBatcher(self._publish_to_cloud, batch_max_bytes, batch_linger)
 
     @classmethod
-    def from_url(cls, url: str, is_edge: bool):
+    def from_url(cls, url: str, is_edge: bool, **kwargs):
         url = urlparse(url)
         host, port = url.netloc.split(":")
         if url.scheme == "mqtt":
-            return cls(host, int(port), is_edge, use_tls=False)
+            return cls(host, int(port), is_edge, use_tls=False, **kwargs)
         elif url.scheme == "mqtts":
-            return cls(host, int(port), is_edge, use_tls=True)
+            return cls(host, int(port), is_edge, use_tls=True, **kwargs)
         else:
             raise ValueError(f"Invalid MQTT URL: {url} (must start with mqtt:// or mqtts://)")
 
@@ -118,20 +406,14 @@ class MQTTAdapter(CommunicationAdapterBase):
             # network_id not set yet
             return
 
-        self.client = mqtt.Client(
-            mqtt.CallbackAPIVersion.VERSION2,
-            protocol=mqtt.MQTTProtocolVersion.MQTTv5,
-        )
-        if self.use_tls:
-            self.client.tls_set_context(context=None)
-        self.client.on_log = self._on_log
-        self.client.on_connect = self._on_connect_edge if self.is_edge else self._on_connect_cloud
-        self.client.on_message = self._on_message_edge if self.is_edge else self._on_message_cloud
+        self.client = self._create_client()
         self.client.connect(self.host, self.port, 60)
         print(f"[yellow]Connected to MQTT broker on {self.host}:{self.port}[/]")
         self.client.loop_start()
 
     def close(self):
+        if self.batcher is not None:
+            self.batcher.close()
         self.client.disconnect()
         self.client.loop_stop()
 
@@ -145,6 +427,16 @@ class MQTTAdapter(CommunicationAdapterBase):
         )
 
     def send_data_to_cloud(self, data):
+        if not self.is_ready():
+            return
+        if self.batcher is not None:
+            self.batcher.add(data)
+            return
+        self._publish_to_cloud(data)
+
+    # ==== private methods ====
+
+    def _publish_to_cloud(self, data: bytes):
         if not self.is_ready():
             return
         self.client.publish(
@@ -153,7 +445,17 @@ class MQTTAdapter(CommunicationAdapterBase):
             qos=self.qos,
         )
 
-    # ==== private methods ====
+    def _create_client(self) -> mqtt.Client:
+        client = mqtt.Client(
+            mqtt.CallbackAPIVersion.VERSION2,
+            protocol=mqtt.MQTTProtocolVersion.MQTTv5,
+        )
+        if self.use_tls:
+            client.tls_set_context(context=None)
+        client.on_log = self._on_log
+        client.on_connect = self._on_connect_edge if self.is_edge else self._on_connect_cloud
+        client.on_message = self._on_message_edge if self.is_edge else self._on_message_cloud
+        return client
 
     # TODO: de-duplicate the _on_message_* functions? decide as the integration evolves
     def _on_message_edge(self, client, userdata, message):
@@ -0,0 +1,154 @@
+"""Dispatch of events to the application callback, out of the I/O threads."""
+
+import logging
+import threading
+import time
+from collections import deque
+from enum import Enum
+from typing import Any, Callable, Hashable
+
+from marilib.histogram import Histogram
+
+DISPATCHER_QUEUE_SIZE = 1024  # events, per worker
+
+
+class OverflowPolicy(Enum):
+    """What to do with a new event when the queue of its worker is full."""
+
+    BLOCK = "block"  # wait for room, the I/O thread is slowed down
+    DROP_OLDEST = "drop_oldest"  # discard the oldest queued event
+    DROP_NEWEST = "drop_newest"  # discard the new event
+
+
+class _Worker(threading.Thread):
+    """Runs the callbacks of one shard of the events, in order."""
+
+    def __init__(self, dispatcher: "EventDispatcher", index: int):
+        self.dispatcher = dispatcher
+        self.events = deque()
+        self.condition = threading.Condition()
+        self.dropped = 0
+        self.processed = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.callback_ns = Histogram()
+        self.queue_wait_ns = Histogram()
+        super().__init__(name=f"marilib-dispatcher-{index}", daemon=True)
+
+    def run(self):
+        events = self.events
+        while True:
+            with self.condition:
+                while not events and self.dispatcher.running:
+                    self.condition.wait()
+                if not events:
+                    return  # stopped and drained
+                queued_ns, callback, args = events.popleft()
+                self.condition.notify_all()
+            start_ns = time.perf_counter_ns()
+            try:
+                callback(*args)
+            except Exception:
+                self.errors += 1
+                self.dispatcher._logger.exception("Event callback failed")
+            self.processed += 1
+            self.callback_ns.record(time.perf_counter_ns() - start_ns)
+            self.queue_wait_ns.record(start_ns - queued_ns)
+
+
+class EventDispatcher:
+    """Runs callbacks on a pool of worker threads, fed by bounded queues.
+
+    Events are sharded by key: the events submitted with the same key are
+    handled by the same worker, in submission order. When the queue of a worker
+    holds `queue_size` events, `policy` decides whether `submit` waits or an
+    event is dropped.
+    """
+
+    def __init__(
+        self,
+        workers: int = 1,
+        queue_size: int = DISPATCHER_QUEUE_SIZE,
+        policy: OverflowPolicy | str = OverflowPolicy.BLOCK,
+    ):
+        if workers < 1 or queue_size < 1:
+            raise ValueError("workers and queue_size must be at least 1")
+        self.queue_size = queue_size
+        self.policy = OverflowPolicy(policy)
+        self.running = True
+        self._logger = logging.getLogger(__name__)
+        self._workers = [_Worker(self, index) for index in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, key: Hashable, callback: Callable[..., Any], *args) -> bool:
+        """Queues `callback(*args)`, returns False if the event was dropped."""
+        worker = self._workers[hash(key) % len(self._workers)]
+        with worker.condition:
+            if len(worker.events) >= self.queue_size:
+                if self.policy is OverflowPolicy.DROP_NEWEST:
+                    worker.dropped += 1
+                    return False
+                elif self.policy is OverflowPolicy.DROP_OLDEST:
+                    worker.events.popleft()
+                    worker.dropped += 1
+                else:
+                    while len(worker.events) >= self.queue_size and self.running:
+                        worker.condition.wait()
+            if not self.running:
+                return False
+            worker.events.append((time.perf_counter_ns(), callback, args))
+            worker.max_depth = max(worker.max_depth, len(worker.events))
+            worker.condition.notify_all()
+        return True
+
+    def stop(self):
+        """Stops accepting events, waits for the queued ones to be handled."""
+        self.running = False
+        for worker in self._workers:
+            with worker.condition:
+                worker.condition.notify_all()
+        for worker in self._workers:
+            if worker is not threading.current_thread():
+                worker.join()
+
+    @property
+    def workers(self) -> int:
+        return len(self._workers)
+
+    @property
+    def depth(self) -> int:
+        """Number of events waiting in the queues."""
+        return sum(len(worker.events) for worker in self._workers)
+
+    @property
+    def max_depth(self) -> int:
+        """Largest number of events seen waiting in a single queue."""
+        return max(worker.max_depth for worker in self._workers)
+
+    @property
+    def dropped(self) -> int:
+        return sum(worker.dropped for worker in self._workers)
+
+    @property
+    def processed(self) -> int:
+        return sum(worker.processed for worker in self._workers)
+
+    @property
+    def errors(self) -> int:
+        """Number of callbacks that raised an exception."""
+        return sum(worker.errors for worker in self._workers)
+
+    def callback_latency_ns(self) -> Histogram:
+        """Returns the time spent in the callbacks, all workers merged."""
+        return self._merged("callback_ns")
+
+    def queue_wait_ns(self) -> Histogram:
+        """Returns the time the events waited in the queues, all workers merged."""
+        return self._merged("queue_wait_ns")
+
+    def _merged(self, name: str) -> Histogram:
+        histogram = Histogram()
+        for worker in self._workers:
+            histogram.merge(getattr(worker, name))
+        return histogram
@@ -0,0 +1,167 @@
+"""Pacing of the downlink frames to the capacity of the gateway schedule."""
+
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable
+
+from marilib.histogram import Histogram
+from marilib.serial_uart import TokenBucket
+
+DOWNLINK_QUEUE_SIZE = 16  # frames per destination
+DOWNLINK_PRIORITY_QUEUE_SIZE = 64  # frames
+DOWNLINK_SCHEDULE_POLL_INTERVAL = 0.1  # seconds, while the schedule is unknown
+
+
+class DownlinkQueueFull(Exception):
+    """Raised when a frame can't be queued because the queue of its destination is full."""
+
+
+def downlink_capacity(schedule: dict | None) -> tuple[float, int]:
+    """Returns the downlink frames per second of a schedule, and its D slots per superframe."""
+    if not schedule or not schedule["sf_duration"]:
+        return 0.0, 0
+    return schedule["d_down"] / (schedule["sf_duration"] / 1000.0), schedule["d_down"]
+
+
+@dataclass
+class DownlinkStats:
+    """Downlink frames of a destination, with the time they waited in the scheduler."""
+
+    queued: int = 0
+    sent: int = 0
+    dropped: int = 0
+    delay_us: Histogram = field(default_factory=Histogram, repr=False)
+
+    @property
+    def delay_avg_ms(self) -> float:
+        return self.delay_us.mean / 1000
+
+    @property
+    def delay_p99_ms(self) -> float:
+        return self.delay_us.percentile(99) / 1000
+
+
+class DownlinkScheduler:
+    """Sends queued frames at the rate the D slots of the schedule can carry.
+
+    Each destination has its own FIFO queue, the destinations with frames
+    waiting are served in turn so a busy node doesn't delay the others.
+    Priority frames, for control traffic, have their own queue which is always
+    served first. Frames wait while the schedule is unknown.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = DOWNLINK_QUEUE_SIZE,
+        priority_queue_size: int = DOWNLINK_PRIORITY_QUEUE_SIZE,
+    ):
+        self.queue_size = queue_size
+        self.priority_queue_size = priority_queue_size
+        self.stats: dict[int, DownlinkStats] = {}
+        self._queues: dict[int, deque] = {}
+        self._round_robin: deque[int] = deque()  # destinations with frames waiting
+        self._priority: deque = deque()
+        self._condition = threading.Condition()
+        self._bucket: TokenBucket | None = None
+        self._running = False
+        self._thread: threading.Thread | None = None
+
+    def start(self, send: Callable[[int, bytes], None], schedule: Callable[[], dict | None]):
+        """Starts sending with `send(dst, payload)`, paced by the `schedule()` in use."""
+        self._send = send
+        self._schedule = schedule
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="marilib-downlink", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    @property
+    def depth(self) -> int:
+        """Number of frames waiting, priority frames included."""
+        return sum(len(queue) for queue in list(self._queues.values())) + len(self._priority)
+
+    @property
+    def dropped(self) -> int:
+        """Number of frames refused because their queue was full."""
+        return sum(stats.dropped for stats in list(self.stats.values()))
+
+    def has_room(self, dst: int, priority: bool = False) -> bool:
+        """Whether `put` would accept a frame for `dst` now."""
+        with self._condition:
+            if priority:
+                return len(self._priority) < self.priority_queue_size
+            return len(self._queues.get(dst, ())) < self.queue_size
+
+    def put(self, dst: int, payload: bytes, priority: bool = False):
+        """Queues a frame, raises DownlinkQueueFull if its queue is full."""
+        with self._condition:
+            stats = self.stats.get(dst)
+            if stats is None:
+                stats = self.stats[dst] = DownlinkStats()
+            if priority:
+                queue = self._priority
+                full = len(queue) >= self.priority_queue_size
+            else:
+                queue = self._queues.get(dst)
+                full = queue is not None and len(queue) >= self.queue_size
+            if full:
+                stats.dropped += 1
+                raise DownlinkQueueFull(f"Downlink queue full for 0x{dst:016X}")
+            if queue is None:
+                queue = self._queues[dst] = deque()
+                self._round_robin.append(dst)
+            queue.append((time.monotonic(), dst, payload))
+            stats.queued += 1
+            self._condition.notify()
+
+    def _next_frame(self) -> tuple[float, int, bytes]:
+        """Takes the next frame to send, with the condition held."""
+        if self._priority:
+            return self._priority.popleft()
+        dst = self._round_robin.popleft()
+        queue = self._queues[dst]
+        frame = queue.popleft()
+        if queue:
+            self._round_robin.append(dst)
+        else:
+            del self._queues[dst]
+        return frame
+
+    def _wait_for_capacity(self) -> bool:
+        """Waits for a downlink slot to be available, returns False when stopped."""
+        while self._running:
+            rate, burst = downlink_capacity(self._schedule())
+            if not rate:
+                with self._condition:
+                    self._condition.wait(DOWNLINK_SCHEDULE_POLL_INTERVAL)
+                continue
+            if self._bucket is None or (self._bucket.rate, self._bucket.capacity) != (rate, burst):
+                self._bucket = TokenBucket(rate, burst)
+            if delay := self._bucket.reserve(1):
+                with self._condition:
+                    self._condition.wait_for(lambda: not self._running, delay)
+            return self._running
+        return False
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._priority or self._round_robin or not self._running
+                )
+            if not self._wait_for_capacity():
+                return
+            with self._condition:
+                queued_ts, dst, payload = self._next_frame()
+                stats = self.stats[dst]
+                stats.sent += 1
+                stats.delay_us.record((time.monotonic() - queued_ts) * 1_000_000)
+            self._send(dst, payload)
@@ -0,0 +1,345 @@
+"""OpenMetrics exporter of the gateway and node statistics, served over HTTP."""
+
+import threading
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterable
+
+from rich import print
+
+from marilib.instrumentation import StageStats
+from marilib.model import SCHEDULES
+from marilib.snapshot import GatewaySnapshot, LatencySnapshot, NetworkSnapshot
+
+EXPORTER_DEFAULT_HOST = "127.0.0.1"
+EXPORTER_DEFAULT_PORT = 9464
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+LATENCY_QUANTILES = (("0.5", "p50_ms"), ("0.95", "p95_ms"), ("0.99", "p99_ms"))
+STAGE_QUANTILES = (("0.5", "p50_us"), ("0.99", "p99_us"))
+
+
+@dataclass(frozen=True)
+class RuntimeStats:
+    """Queue depths and error counters of a Marilib instance, as of an update() tick."""
+
+    dispatcher_depth: int = 0
+    dispatcher_dropped: int = 0
+    downlink_depth: int = 0
+    downlink_dropped: int = 0
+    serial_tx_depth: int = 0
+    hdlc_decoded: int = 0
+    hdlc_invalid_fcs: int = 0
+    hdlc_invalid_payload: int = 0
+    stages: dict[str, StageStats] = field(default_factory=dict)
+
+    @classmethod
+    def from_marilib(cls, mari: Any) -> "RuntimeStats":
+        """Reads the counters of a MarilibEdge or a MarilibCloud, without taking its lock."""
+        stats = {}
+        if dispatcher := mari.dispatcher:
+            stats.update(dispatcher_depth=dispatcher.depth, dispatcher_dropped=dispatcher.dropped)
+        if downlink := getattr(mari, "downlink_scheduler", None):
+            stats.update(downlink_depth=downlink.depth, downlink_dropped=downlink.dropped)
+        if serial := getattr(mari, "serial_interface", None):
+            hdlc = serial.hdlc_handler
+            stats.update(
+                serial_tx_depth=serial.tx_queue_depth,
+                hdlc_decoded=hdlc.decoded,
+                hdlc_invalid_fcs=hdlc.invalid_fcs,
+                hdlc_invalid_payload=hdlc.invalid_payload,
+            )
+        if mari.tracer is not None:
+            stats["stages"] = mari.tracer.stats()
+        return cls(**stats)
+
+
+class MetricsExporter:
+    """Serves the statistics of the last update() tick at /metrics, in the OpenMetrics format.
+
+    `update()` only keeps the snapshot of the tick. It is rendered by the first
+    scrape that follows, and the text is reused until the next tick, so
+    scrapes never take the lock of the network and cost little whatever the
+    number of nodes.
+    """
+
+    def __init__(self, host: str = EXPORTER_DEFAULT_HOST, port: int = EXPORTER_DEFAULT_PORT):
+        self.host = host
+        self.port = port
+        self.scrapes = 0
+        self._state = (NetworkSnapshot(), RuntimeStats())
+        self._rendered_state: tuple | None = None
+        self._body = b""
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        """Starts serving from a thread, `port` 0 picks a free port."""
+        if self._server is not None:
+            return
+        self._server = ThreadingHTTPServer((self.host, self.port), _MetricsHandler)
+        self._server.exporter = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="marilib-exporter", daemon=True
+        )
+        self._thread.start()
+        print(f"[yellow]Serving metrics on http://{self.host}:{self.port}/metrics[/]")
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+
+    def update(self, snapshot: NetworkSnapshot, runtime: RuntimeStats | None = None):
+        """Publishes the statistics of a tick, they are rendered when scraped."""
+        self._state = (snapshot, runtime or RuntimeStats())
+
+    def render(self) -> bytes:
+        """Returns the metrics of the last tick, rendered at most once per tick."""
+        with self._lock:
+            state = self._state
+            if state is not self._rendered_state:
+                self._body = render_openmetrics(*state).encode()
+                self._rendered_state = state
+            self.scrapes += 1
+            return self._body
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.exporter.render()
+        self.send_response(200)
+        self.send_header("Content-Type", OPENMETRICS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # a line per scrape would clutter the console and the TUI
+
+
+def render_openmetrics(snapshot: NetworkSnapshot, runtime: RuntimeStats) -> str:
+    """Renders the statistics of a snapshot in the OpenMetrics text format."""
+    lines = []
+    gateways = snapshot.gateways
+    gateway_labels = [f'{{gateway="0x{gateway.address:016X}"}}' for gateway in gateways]
+
+    _header(lines, "marilib_gateway", "info", "Gateway and its schedule.")
+    for gateway in gateways:
+        info = gateway.info
+        lines.append(
+            f'marilib_gateway_info{{gateway="0x{info.address:016X}",'
+            f'network_id="{info.network_id_str}",schedule_id="{info.schedule_id}",'
+            f'schedule_name="{info.schedule_name}"}} 1'
+        )
+    for name, kind, help_text, value in _GATEWAY_METRICS:
+        _header(lines, name, kind, help_text)
+        _samples(lines, name, kind, gateway_labels, map(value, gateways))
+    _latency(
+        lines,
+        "marilib_gateway_latency_seconds",
+        "Round trip time of the latency probes of all nodes, over the last minute.",
+        gateway_labels,
+        [gateway.latency for gateway in gateways],
+    )
+
+    node_labels = [_node_labels(gateway) for gateway in gateways]
+    for name, kind, help_text, column in _NODE_METRICS:
+        _header(lines, name, kind, help_text)
+        for gateway, labels in zip(gateways, node_labels):
+            _samples(lines, name, kind, labels, getattr(gateway.nodes, column))
+    _latency(
+        lines,
+        "marilib_node_latency_seconds",
+        "Round trip time of the latency probes of a node, over the last minute.",
+        [label for labels in node_labels for label in labels],
+        [gateway.nodes.latency(i) for gateway in gateways for i in range(len(gateway.nodes))],
+    )
+
+    for name, kind, help_text, attribute in _RUNTIME_METRICS:
+        _header(lines, name, kind, help_text)
+        _samples(lines, name, kind, [""], [getattr(runtime, attribute)])
+    _header(lines, "marilib_hdlc_errors", "counter", "HDLC frames dropped, by reason.")
+    lines.append(f'marilib_hdlc_errors_total{{reason="fcs"}} {runtime.hdlc_invalid_fcs}')
+    lines.append(f'marilib_hdlc_errors_total{{reason="payload"}} {runtime.hdlc_invalid_payload}')
+    if runtime.stages:
+        _stages(lines, runtime.stages)
+
+    lines.append("# EOF\n")
+    return "\n".join(lines)
+
+
+_GATEWAY_METRICS = (
+    (
+        "marilib_gateway_nodes",
+        "gauge",
+        "Nodes joined to the gateway.",
+        lambda gateway: len(gateway.nodes),
+    ),
+    (
+        "marilib_gateway_tx_frames",
+        "counter",
+        "Frames sent to the nodes, test frames excluded.",
+        lambda gateway: gateway.tx_total,
+    ),
+    (
+        "marilib_gateway_rx_frames",
+        "counter",
+        "Frames received from the nodes, test frames excluded.",
+        lambda gateway: gateway.rx_total,
+    ),
+    (
+        "marilib_gateway_tx_rate",
+        "gauge",
+        "Frames sent during the last second.",
+        lambda gateway: gateway.tx_rate,
+    ),
+    (
+        "marilib_gateway_rx_rate",
+        "gauge",
+        "Frames received during the last second.",
+        lambda gateway: gateway.rx_rate,
+    ),
+    (
+        "marilib_gateway_schedule_utilization_ratio",
+        "gauge",
+        "Fraction of the cells of the schedule used, as reported by the gateway.",
+        lambda gateway: gateway.info.schedule_utilization,
+    ),
+    (
+        "marilib_gateway_schedule_occupancy_ratio",
+        "gauge",
+        "Fraction of the uplink cells of the schedule assigned to a node.",
+        lambda gateway: _occupancy(gateway),
+    ),
+)
+
+_NODE_METRICS = (
+    ("marilib_node_alive", "gauge", "1 if the node was heard from recently.", "alive"),
+    (
+        "marilib_node_tx_frames",
+        "counter",
+        "Frames sent to the node, test frames excluded.",
+        "tx_total",
+    ),
+    (
+        "marilib_node_rx_frames",
+        "counter",
+        "Frames received from the node, test frames excluded.",
+        "rx_total",
+    ),
+    ("marilib_node_tx_rate", "gauge", "Frames sent during the last second.", "tx_rate"),
+    ("marilib_node_rx_rate", "gauge", "Frames received during the last second.", "rx_rate"),
+    (
+        "marilib_node_success_ratio",
+        "gauge",
+        "Frames received over frames sent, last 30 seconds.",
+        "success_rate_30s",
+    ),
+    ("marilib_node_pdr_downlink_ratio", "gauge", "Downlink packet delivery ratio.", "pdr_downlink"),
+    ("marilib_node_pdr_uplink_ratio", "gauge", "Uplink packet delivery ratio.", "pdr_uplink"),
+    (
+        "marilib_node_rssi_dbm",
+        "gauge",
+        "Mean RSSI of the frames received during the last 5 seconds.",
+        "rssi_dbm",
+    ),
+)
+
+_RUNTIME_METRICS = (
+    (
+        "marilib_dispatcher_queue_depth",
+        "gauge",
+        "Events waiting in the dispatcher queues.",
+        "dispatcher_depth",
+    ),
+    (
+        "marilib_dispatcher_dropped_events",
+        "counter",
+        "Events dropped by the dispatcher.",
+        "dispatcher_dropped",
+    ),
+    (
+        "marilib_downlink_queue_depth",
+        "gauge",
+        "Frames waiting in the downlink scheduler.",
+        "downlink_depth",
+    ),
+    (
+        "marilib_downlink_dropped_frames",
+        "counter",
+        "Frames refused by the downlink scheduler.",
+        "downlink_dropped",
+    ),
+    (
+        "marilib_serial_tx_queue_depth",
+        "gauge",
+        "Writes waiting to be sent to the gateway.",
+        "serial_tx_depth",
+    ),
+    ("marilib_hdlc_frames", "counter", "HDLC frames received from the gateway.", "hdlc_decoded"),
+)
+
+
+def _header(lines: list[str], name: str, kind: str, help_text: str, unit: str = ""):
+    lines.append(f"# TYPE {name} {kind}")
+    if unit:
+        lines.append(f"# UNIT {name} {unit}")
+    lines.append(f"# HELP {name} {help_text}")
+
+
+def _samples(lines: list[str], name: str, kind: str, labels: list[str], values: Iterable):
+    name = f"{name}_total" if kind == "counter" else name
+    lines.extend(f"{name}{label} {_value(value)}" for label, value in zip(labels, values))
+
+
+def _latency(
+    lines: list[str],
+    name: str,
+    help_text: str,
+    labels: list[str],
+    latencies: list[LatencySnapshot],
+):
+    """Renders a summary per label, without quantiles when there was no probe."""
+    _header(lines, name, "summary", help_text, "seconds")
+    for label, latency in zip(labels, latencies):
+        if latency.count:
+            lines.extend(
+                f'{name}{label[:-1]},quantile="{quantile}"}} '
+                f"{_value(getattr(latency, attribute) / 1000)}"
+                for quantile, attribute in LATENCY_QUANTILES
+            )
+        lines.append(f"{name}_count{label} {latency.count}")
+        lines.append(f"{name}_sum{label} {_value(latency.avg_ms * latency.count / 1000)}")
+
+
+def _stages(lines: list[str], stages: dict[str, StageStats]):
+    name = "marilib_pipeline_stage_seconds"
+    _header(lines, name, "summary", "Time spent by the traced frames in each stage.", "seconds")
+    for stage, stats in stages.items():
+        for quantile, attribute in STAGE_QUANTILES:
+            value = getattr(stats, attribute) / 1_000_000
+            lines.append(f'{name}{{stage="{stage}",quantile="{quantile}"}} {_value(value)}')
+        lines.append(f'{name}_count{{stage="{stage}"}} {stats.count}')
+        lines.append(f'{name}_sum{{stage="{stage}"}} {_value(stats.mean_us * stats.count / 1e6)}')
+
+
+def _node_labels(gateway: GatewaySnapshot) -> list[str]:
+    prefix = f'{{gateway="0x{gateway.address:016X}",node="0x'
+    return [f'{prefix}{address:016X}"}}' for address in gateway.nodes.address]
+
+
+def _occupancy(gateway: GatewaySnapshot) -> float:
+    schedule = SCHEDULES.get(gateway.info.schedule_id)
+    return len(gateway.nodes) / schedule["max_nodes"] if schedule else 0.0
+
+
+def _value(value: int | float | bool) -> str:
+    return repr(value) if isinstance(value, float) else str(int(value))
@@ -0,0 +1,218 @@
+"""Fixed memory streaming histograms, with HDR-style log-linear buckets."""
+
+import threading
+import time
+from array import array
+from typing import Iterable
+
+HISTOGRAM_SUB_BUCKET_BITS = 5  # 32 sub-buckets per power of 2, ~3% precision
+HISTOGRAM_MAX_BITS = 32  # largest value recorded, larger values are clamped
+
+
+class Histogram:
+    """Histogram of non-negative integers with O(1) insertion and fixed memory.
+
+    Values below 2**sub_bucket_bits get their own bucket, above that each power
+    of 2 is split in 2**(sub_bucket_bits - 1) buckets, so the relative error of
+    a value read back from the histogram is bounded by the bucket width.
+    Histograms with the same parameters can be merged.
+    """
+
+    def __init__(
+        self,
+        sub_bucket_bits: int = HISTOGRAM_SUB_BUCKET_BITS,
+        max_bits: int = HISTOGRAM_MAX_BITS,
+    ):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.max_bits = max_bits
+        self.max_value = (1 << max_bits) - 1
+        self._sub_bucket_count = 1 << sub_bucket_bits
+        self._half_count = self._sub_bucket_count >> 1
+        self.counts = array("I", [0]) * ((max_bits - sub_bucket_bits + 2) * self._half_count)
+        self.count = 0
+        self.total = 0
+        # exact extremes, only valid as long as nothing was subtracted
+        self._min = None
+        self._max = None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _index(self, value: int) -> int:
+        if value < self._sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits
+        return shift * self._half_count + (value >> shift)
+
+    def _bucket_bounds(self, index: int) -> tuple[int, int]:
+        if index < self._sub_bucket_count:
+            return index, index
+        shift = index // self._half_count - 1
+        mantissa = self._half_count + index % self._half_count
+        return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+    def record(self, value: int, count: int = 1):
+        # on every hot path, so _index() and the extremes are inlined
+        value = int(value)
+        if value < 0:
+            value = 0
+        elif value > self.max_value:
+            value = self.max_value
+        if value < self._sub_bucket_count:
+            self.counts[value] += count
+        else:
+            shift = value.bit_length() - self.sub_bucket_bits
+            self.counts[shift * self._half_count + (value >> shift)] += count
+        self.count += count
+        self.total += value * count
+        if self.count == count:
+            self._min = self._max = value
+        elif self._min is not None:
+            if value < self._min:
+                self._min = value
+            elif value > self._max:
+                self._max = value
+
+    def merge(self, other: "Histogram"):
+        """Adds the content of another histogram with the same parameters.
+
+        `other` can be recorded into by another thread meanwhile: its count is
+        read before its buckets, which `record` updates first, so the merged
+        buckets always hold at least `count` values.
+        """
+        self._check_compatible(other)
+        other_count, other_total = other.count, other.total
+        counts = self.counts
+        for index, count in enumerate(other.counts):
+            if count:
+                counts[index] += count
+        exact = (self._min is not None or not self.count) and (
+            other._min is not None or not other_count
+        )
+        self.count += other_count
+        self.total += other_total
+        if exact and other_count:
+            self._min = other._min if self._min is None else min(self._min, other._min)
+            self._max = other._max if self._max is None else max(self._max, other._max)
+        elif not exact:
+            self._min = self._max = None
+
+    def subtract(self, other: "Histogram"):
+        """Removes the content of a histogram previously merged in this one."""
+        self._check_compatible(other)
+        counts = self.counts
+        for index, count in enumerate(other.counts):
+            if count:
+                counts[index] -= count
+        self.count -= other.count
+        self.total -= other.total
+        self._min = self._max = None
+
+    def reset(self):
+        self.counts = array("I", [0]) * len(self.counts)
+        self.count = 0
+        self.total = 0
+        self._min = None
+        self._max = None
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    @property
+    def min(self) -> int:
+        if not self.count:
+            return 0
+        if self._min is not None:
+            return self._min
+        index = next(index for index, count in enumerate(self.counts) if count)
+        return self._bucket_bounds(index)[0]
+
+    @property
+    def max(self) -> int:
+        if not self.count:
+            return 0
+        if self._max is not None:
+            return self._max
+        index = next(index for index in range(len(self.counts) - 1, -1, -1) if self.counts[index])
+        return self._bucket_bounds(index)[1]
+
+    def percentile(self, percentile: float) -> int:
+        """Returns the value below which `percentile` % of the recorded values fall."""
+        return self.percentiles([percentile])[0]
+
+    def percentiles(self, percentiles: Iterable[float]) -> list[int]:
+        """Returns several percentiles, in a single pass over the buckets."""
+        percentiles = list(percentiles)
+        if not self.count:
+            return [0] * len(percentiles)
+        lowest, highest = self.min, self.max
+        ranks = sorted(
+            (max(1, round(percentile / 100 * self.count)), position)
+            for position, percentile in enumerate(percentiles)
+        )
+        result = [highest] * len(percentiles)
+        seen = 0
+        next_rank = 0
+        for index, count in enumerate(self.counts):
+            if not count:
+                continue
+            seen += count
+            while next_rank < len(ranks) and seen >= ranks[next_rank][0]:
+                low, high = self._bucket_bounds(index)
+                result[ranks[next_rank][1]] = min(max((low + high) // 2, lowest), highest)
+                next_rank += 1
+            if next_rank == len(ranks):
+                break
+        return result
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.counts.itemsize * len(self.counts)
+
+    def _check_compatible(self, other: "Histogram"):
+        if (other.sub_bucket_bits, other.max_bits) != (self.sub_bucket_bits, self.max_bits):
+            raise ValueError("Cannot combine histograms with different parameters")
+
+
+class WindowedHistogram:
+    """Histogram of the values recorded during the last `window_seconds`.
+
+    The window is split in slots, the oldest one is subtracted from the merged
+    histogram when it expires so queries never re-scan the recorded values.
+    """
+
+    def __init__(self, window_seconds: float = 60, slots: int = 4, **histogram_kwargs):
+        self.window_seconds = window_seconds
+        self.slot_seconds = window_seconds / slots
+        self.histogram = Histogram(**histogram_kwargs)
+        self._slots = [Histogram(**histogram_kwargs) for _ in range(slots)]
+        self._slot = int(time.monotonic() / self.slot_seconds)
+        self._lock = threading.Lock()
+
+    def record(self, value: int, now: float | None = None):
+        with self._lock:
+            self._rotate(time.monotonic() if now is None else now)
+            self._slots[self._slot % len(self._slots)].record(value)
+            self.histogram.record(value)
+
+    def current(self, now: float | None = None) -> Histogram:
+        """Returns the histogram of the window, after expiring the old values."""
+        with self._lock:
+            self._rotate(time.monotonic() if now is None else now)
+            return self.histogram
+
+    def _rotate(self, now: float):
+        slot = int(now / self.slot_seconds)
+        if slot <= self._slot:
+            return
+        for expired in range(max(self._slot + 1, slot - len(self._slots) + 1), slot + 1):
+            histogram = self._slots[expired % len(self._slots)]
+            if histogram.count:
+                self.histogram.subtract(histogram)
+                histogram.reset()
+        self._slot = slot
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.histogram.memory_bytes + sum(slot.memory_bytes for slot in self._slots)
@@ -0,0 +1,259 @@
+"""Instrumentation helpers to measure where time goes at runtime."""
+
+import json
+import threading
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import IO
+
+from marilib.histogram import Histogram
+
+
+class InstrumentedLock:
+    """A `threading.Lock` that records how long it is waited for and held.
+
+    Durations are recorded in nanoseconds. Each thread records into its own
+    histograms, `wait_ns` and `hold_ns` merge them when read, so readers never
+    see a histogram being written.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._acquired_ns = 0
+        self.acquisitions = 0
+        self.contended = 0  # acquisitions that had to wait for another thread
+        self._local = threading.local()
+        self._threads_histograms: list[tuple[Histogram, Histogram]] = []  # (wait, hold)
+        self._histograms_lock = threading.Lock()
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        start = time.perf_counter_ns()
+        if not self._lock.acquire(False):
+            if not blocking or not self._lock.acquire(True, timeout):
+                return False
+            self.contended += 1
+        self._acquired_ns = time.perf_counter_ns()
+        self.acquisitions += 1
+        self._histograms()[0].record(self._acquired_ns - start)
+        return True
+
+    def release(self):
+        self._histograms()[1].record(time.perf_counter_ns() - self._acquired_ns)
+        self._lock.release()
+
+    @property
+    def wait_ns(self) -> Histogram:
+        """Returns the time waited for the lock, all threads merged."""
+        return self._merged(0)
+
+    @property
+    def hold_ns(self) -> Histogram:
+        """Returns the time the lock was held, all threads merged."""
+        return self._merged(1)
+
+    def _histograms(self) -> tuple[Histogram, Histogram]:
+        """Returns the (wait, hold) histograms of the current thread."""
+        histograms = getattr(self._local, "histograms", None)
+        if histograms is None:
+            histograms = self._local.histograms = (Histogram(), Histogram())
+            with self._histograms_lock:
+                self._threads_histograms.append(histograms)
+        return histograms
+
+    def _merged(self, index: int) -> Histogram:
+        merged = Histogram()
+        with self._histograms_lock:
+            threads_histograms = list(self._threads_histograms)
+        for histograms in threads_histograms:
+            merged.merge(histograms[index])
+        return merged
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    def __enter__(self) -> bool:
+        return self.acquire()
+
+    def __exit__(self, *args):
+        self.release()
+
+    def reset_stats(self):
+        """Clears the recorded durations, to measure a new period. Takes the lock."""
+        with self._lock, self._histograms_lock:
+            self.acquisitions = 0
+            self.contended = 0
+            for wait_ns, hold_ns in self._threads_histograms:
+                wait_ns.reset()
+                hold_ns.reset()
+
+    def __repr__(self) -> str:
+        return (
+            f"InstrumentedLock(acquisitions={self.acquisitions}, contended={self.contended}, "
+            f"wait_p99_us={self.wait_ns.percentile(99) / 1000:.1f}, "
+            f"hold_p99_us={self.hold_ns.percentile(99) / 1000:.1f})"
+        )
+
+
+@dataclass(frozen=True)
+class StageStats:
+    """Durations of a pipeline stage, in microseconds."""
+
+    count: int
+    mean_us: float
+    p50_us: float
+    p99_us: float
+    max_us: float
+
+    @classmethod
+    def from_histogram(cls, histogram: Histogram) -> "StageStats":
+        p50, p99 = histogram.percentiles([50, 99])
+        return cls(
+            histogram.count, histogram.mean / 1000, p50 / 1000, p99 / 1000, histogram.max / 1000
+        )
+
+
+class _TraceState(threading.local):
+    """State of the trace of the current thread."""
+
+    frames = 0
+    active = False
+    start_ns = 0
+    last_ns = 0
+    histograms: dict[str, Histogram] | None = None
+
+
+class PipelineTracer:
+    """Time spent by received frames in each stage of the pipeline.
+
+    A trace starts with `begin()` when the bytes of a frame are read, each
+    `mark(stage)` records the time since the previous boundary as `stage`, and
+    `end()` records the whole trace as `total`. Marks are per thread: a trace
+    handed to another thread is carried by the token of `suspend()`, the wait
+    until `resume(token)` is recorded as `dispatch`.
+
+    Each thread records into its own histograms, merged when queried, so
+    recording takes no lock. Code paths check for a tracer being set, so
+    tracing costs nothing when disabled, and `sample_every` bounds its cost
+    when enabled.
+    """
+
+    def __init__(
+        self,
+        sample_every: int = 1,
+        dump_path: str | None = None,
+        dump_interval: float = 10.0,
+    ):
+        self.sample_every = max(1, sample_every)
+        self.dump_path = dump_path
+        self.dump_interval = dump_interval
+        self._last_dump = time.monotonic()
+        self._local = _TraceState()
+        self._threads_histograms: list[dict[str, Histogram]] = []
+        self._lock = threading.Lock()
+
+    def begin(self, start_ns: int | None = None):
+        """Starts the trace of a frame on this thread, read at `start_ns`.
+
+        Only one frame in `sample_every` is traced, the marks of the others do nothing.
+        """
+        local = self._local
+        local.frames += 1
+        local.active = local.frames % self.sample_every == 0
+        if not local.active:
+            return
+        self._start(local)
+        now = time.perf_counter_ns()
+        local.start_ns = now if start_ns is None else start_ns
+        local.last_ns = now
+
+    def _start(self, local: _TraceState):
+        local.active = True
+        if local.histograms is None:
+            local.histograms = defaultdict(Histogram)
+            with self._lock:
+                self._threads_histograms.append(local.histograms)
+
+    def record(self, stage: str, duration_ns: int):
+        """Records a duration measured by the caller, for the frame being traced."""
+        if self._local.active:
+            self._local.histograms[stage].record(duration_ns)
+
+    def mark(self, stage: str):
+        """Records the time since the previous boundary of the trace as `stage`."""
+        local = self._local
+        if not local.active:
+            return
+        now = time.perf_counter_ns()
+        local.histograms[stage].record(now - local.last_ns)
+        local.last_ns = now
+
+    def end(self):
+        """Records the duration of the whole trace."""
+        local = self._local
+        if not local.active:
+            return
+        local.histograms["total"].record(time.perf_counter_ns() - local.start_ns)
+        local.active = False
+
+    def suspend(self) -> tuple[int, int] | None:
+        """Returns the token of the trace, to resume it on another thread."""
+        if not self._local.active:
+            return None
+        return self._local.start_ns, time.perf_counter_ns()
+
+    def resume(self, token: tuple[int, int] | None):
+        """Continues on this thread the trace of a `suspend()` token, None if not traced."""
+        local = self._local
+        if token is None:
+            local.active = False
+            return
+        self._start(local)
+        local.start_ns, local.last_ns = token
+        self.mark("dispatch")
+
+    def histograms(self) -> dict[str, Histogram]:
+        """Returns the durations in ns of each stage, all threads merged."""
+        merged = defaultdict(Histogram)
+        with self._lock:
+            threads_histograms = list(self._threads_histograms)
+        for histograms in threads_histograms:
+            for stage, histogram in list(histograms.items()):
+                merged[stage].merge(histogram)
+        return dict(merged)
+
+    def stats(self) -> dict[str, StageStats]:
+        return {
+            stage: StageStats.from_histogram(histogram)
+            for stage, histogram in self.histograms().items()
+        }
+
+    def reset(self):
+        """Clears the recorded durations, the ones being recorded may be lost."""
+        with self._lock:
+            for histograms in self._threads_histograms:
+                for histogram in list(histograms.values()):
+                    histogram.reset()
+
+    def dump(self, file: IO[str]):
+        """Writes the statistics of the stages as a JSON line."""
+        stats = {stage: asdict(stage_stats) for stage, stage_stats in self.stats().items()}
+        file.write(json.dumps({"timestamp": datetime.now().isoformat(), "stages": stats}) + "\n")
+
+    def dump_if_due(self):
+        """Appends the statistics to `dump_path` every `dump_interval` seconds."""
+        if self.dump_path is None or time.monotonic() - self._last_dump < self.dump_interval:
+            return
+        self._last_dump = time.monotonic()
+        with open(self.dump_path, "a", encoding="utf-8") as file:
+            self.dump(file)
+
+    def __repr__(self) -> str:
+        return (
+            "PipelineTracer("
+            + ", ".join(
+                f"{stage}_p99_us={stats.p99_us:.1f}" for stage, stats in self.stats().items()
+            )
+            + ")"
+        )
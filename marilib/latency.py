@@ -4,7 +4,8 @@ import time
 from typing import TYPE_CHECKING
 import math
 
-from marilib.mari_protocol import Frame
+from marilib.downlink import DownlinkQueueFull
+from marilib.mari_protocol import Frame, FrameView
 
 if TYPE_CHECKING:
     from marilib.marilib import MariLib
@@ -49,25 +50,28 @@ class LatencyTester:
         """Sends a latency request packet to a specific address."""
 
         payload = LATENCY_PACKET_MAGIC + struct.pack("<d", time.time())
-        self.marilib.send_frame(address, payload)
+        try:
+            self.marilib.send_frame(address, payload)
+        except DownlinkQueueFull:
+            pass  # the downlink is saturated, try again on the next round
 
-    def handle_response(self, frame: Frame):
+    def handle_response(self, frame: Frame | FrameView):
         """
         Processes a latency response frame.
         This should be called when a LATENCY_DATA event is received.
         """
-        if not frame.payload.startswith(LATENCY_PACKET_MAGIC):
+        if frame.payload[: len(LATENCY_PACKET_MAGIC)] != LATENCY_PACKET_MAGIC:
             return
         try:
             # Unpack the original timestamp from the payload
-            original_ts = struct.unpack("<d", frame.payload[2:10])[0]
+            original_ts = struct.unpack_from("<d", frame.payload, 2)[0]
             rtt = time.time() - original_ts
             if math.isnan(rtt) or math.isinf(rtt):
                 return  # Ignore corrupted/invalid packets
             if rtt < 0 or rtt > 5.0:
                 return  # Ignore this outlier
 
-            node = self.marilib.gateway.get_node(frame.header.source)
+            node = self.marilib.gateway.get_node(frame.source)
             if node:
                 # Update statistics for both the specific node and the whole gateway
                 node.latency_stats.add_latency(rtt)
@@ -1,10 +1,11 @@
 import csv
 import os
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from datetime import datetime, timedelta
-from typing import IO, List, Dict
+from typing import IO, Dict, List
 
 from marilib.model import MariGateway, MariNode
+from marilib.snapshot import GatewaySnapshot, NodeColumns
 
 
 @dataclass
@@ -90,6 +91,9 @@ class MetricsLogger:
             "tx_rate_1s",
             "rx_rate_1s",
             "avg_latency_ms",
+            "p50_latency_ms",
+            "p95_latency_ms",
+            "p99_latency_ms",
         ]
         self._gateway_writer.writerow(gateway_header)
 
@@ -111,6 +115,9 @@ class MetricsLogger:
             "rssi_dbm_5s",
             "last_latency_ms",
             "avg_latency_ms",
+            "p50_latency_ms",
+            "p95_latency_ms",
+            "p99_latency_ms",
         ]
         self._nodes_writer.writerow(nodes_header)
 
@@ -124,54 +131,74 @@ class MetricsLogger:
         self._check_for_rotation()
         return True
 
-    def log_periodic_metrics(self, gateway: MariGateway, nodes: List[MariNode]):
-        last_log_time = self.last_log_time.get(gateway.info.address, self.segment_start_time)
+    def log_periodic_metrics(
+        self, gateway: GatewaySnapshot | MariGateway, nodes: List[MariNode] | None = None
+    ):
+        """Logs the metrics of a gateway and its nodes, at most once per log interval.
+
+        A MariGateway, and the list of its nodes to log, is still accepted: its
+        snapshot is built here.
+        """
+        if isinstance(gateway, MariGateway):
+            snapshot = GatewaySnapshot.from_gateway(gateway)
+            if nodes is not None:
+                snapshot = replace(snapshot, nodes=NodeColumns.from_nodes(nodes))
+            gateway = snapshot
+        last_log_time = self.last_log_time.get(gateway.address, self.segment_start_time)
         if datetime.now() - last_log_time >= timedelta(seconds=self.log_interval_seconds):
             self.log_gateway_metrics(gateway)
-            self.log_all_nodes_metrics(nodes)
-            self.last_log_time[gateway.info.address] = datetime.now()
+            self.log_all_nodes_metrics(gateway)
+            self.last_log_time[gateway.address] = datetime.now()
 
-    def log_gateway_metrics(self, gateway: MariGateway):
+    def log_gateway_metrics(self, gateway: GatewaySnapshot):
         if not self._log_common() or self._gateway_writer is None:
             return
 
         timestamp = datetime.now().isoformat()
         row = [
             timestamp,
-            f"0x{gateway.info.address:016X}",
+            f"0x{gateway.address:016X}",
             gateway.info.schedule_id,
             len(gateway.nodes),
-            gateway.stats.sent_count(include_test_packets=False),
-            gateway.stats.received_count(include_test_packets=False),
-            gateway.stats.sent_count(1, include_test_packets=False),
-            gateway.stats.received_count(1, include_test_packets=False),
-            f"{gateway.latency_stats.avg_ms:.2f}",
+            gateway.tx_total,
+            gateway.rx_total,
+            gateway.tx_rate,
+            gateway.rx_rate,
+            f"{gateway.latency.avg_ms:.2f}",
+            f"{gateway.latency.p50_ms:.2f}",
+            f"{gateway.latency.p95_ms:.2f}",
+            f"{gateway.latency.p99_ms:.2f}",
         ]
         self._gateway_writer.writerow(row)
 
-    def log_all_nodes_metrics(self, nodes: List[MariNode]):
-        """Writes metrics for all nodes, handling rotation."""
+    def log_all_nodes_metrics(self, gateway: GatewaySnapshot):
+        """Writes metrics for all nodes of a gateway, handling rotation."""
         if not self._log_common() or self._nodes_writer is None:
             return
 
         timestamp = datetime.now().isoformat()
-        for node in nodes:
+        gateway_address = f"0x{gateway.address:016X}"
+        nodes = gateway.nodes
+        for i in range(len(nodes)):
             row = [
                 timestamp,
-                f"0x{node.gateway_address:016X}",
-                f"0x{node.address:016X}",
-                node.is_alive,
-                node.stats.sent_count(include_test_packets=False),
-                node.stats.received_count(include_test_packets=False),
-                node.stats.sent_count(1, include_test_packets=False),
-                node.stats.received_count(1, include_test_packets=False),
-                f"{node.stats.success_rate(30):.2%}",
-                f"{node.stats.success_rate():.2%}",
-                f"{node.pdr_downlink:.2%}",
-                f"{node.pdr_uplink:.2%}",
-                node.stats.received_rssi_dbm(5),
-                f"{node.latency_stats.last_ms:.2f}",
-                f"{node.latency_stats.avg_ms:.2f}",
+                gateway_address,
+                f"0x{nodes.address[i]:016X}",
+                nodes.alive[i],
+                nodes.tx_total[i],
+                nodes.rx_total[i],
+                nodes.tx_rate[i],
+                nodes.rx_rate[i],
+                f"{nodes.success_rate_30s[i]:.2%}",
+                f"{nodes.success_rate[i]:.2%}",
+                f"{nodes.pdr_downlink[i]:.2%}",
+                f"{nodes.pdr_uplink[i]:.2%}",
+                nodes.rssi_dbm[i],
+                f"{nodes.latency_last_ms[i]:.2f}",
+                f"{nodes.latency_avg_ms[i]:.2f}",
+                f"{nodes.latency_p50_ms[i]:.2f}",
+                f"{nodes.latency_p95_ms[i]:.2f}",
+                f"{nodes.latency_p99_ms[i]:.2f}",
             ]
             self._nodes_writer.writerow(row)
 
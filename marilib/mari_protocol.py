@@ -1,4 +1,5 @@
 import dataclasses
+import struct
 from dataclasses import dataclass
 
 from marilib.protocol import Packet, PacketFieldMetadata, PacketType
@@ -6,6 +7,17 @@ from marilib.protocol import Packet, PacketFieldMetadata, PacketType
 MARI_PROTOCOL_VERSION = 2
 MARI_BROADCAST_ADDRESS = 0xFFFFFFFFFFFFFFFF
 MARI_NET_ID_DEFAULT = 0x0001
+MARI_HEADER_SIZE = 20
+MARI_FRAME_PAYLOAD_OFFSET = MARI_HEADER_SIZE + 1  # header + stats
+
+_UINT16 = struct.Struct("<H")
+_UINT64 = struct.Struct("<Q")
+
+
+def rssi_to_dbm(rssi: int) -> int:
+    if rssi > 127:
+        return rssi - 255
+    return rssi
 
 
 @dataclass
@@ -21,9 +33,7 @@ class HeaderStats(Packet):
 
     @property
     def rssi_dbm(self) -> int:
-        if self.rssi > 127:
-            return self.rssi - 255
-        return self.rssi
+        return rssi_to_dbm(self.rssi)
 
 
 @dataclass
@@ -58,19 +68,110 @@ class Frame:
     stats: HeaderStats = dataclasses.field(default_factory=HeaderStats)
     payload: bytes = b""
 
-    def from_bytes(self, bytes_):
-        self.header = Header().from_bytes(bytes_[0:20])
-        if len(bytes_) > 20:
-            self.stats = HeaderStats().from_bytes(bytes_[20:21])
-            if len(bytes_) > 21:
-                self.payload = bytes_[21:]
+    @property
+    def source(self) -> int:
+        return self.header.source
+
+    @property
+    def rssi_dbm(self) -> int:
+        return self.stats.rssi_dbm
+
+    def from_bytes(self, bytes_, offset: int = 0):
+        self.header = Header().from_bytes(bytes_, offset)
+        if len(bytes_) > offset + MARI_HEADER_SIZE:
+            self.stats = HeaderStats().from_bytes(bytes_, offset + MARI_HEADER_SIZE)
+            if len(bytes_) > offset + MARI_FRAME_PAYLOAD_OFFSET:
+                self.payload = bytes_[offset + MARI_FRAME_PAYLOAD_OFFSET :]
         return self
 
     def to_bytes(self, byteorder="little") -> bytes:
-        header_bytes = self.header.to_bytes(byteorder)
-        stats_bytes = self.stats.to_bytes(byteorder)
-        return header_bytes + stats_bytes + self.payload
+        if byteorder != "little":
+            header_bytes = self.header.to_bytes(byteorder)
+            stats_bytes = self.stats.to_bytes(byteorder)
+            return header_bytes + stats_bytes + self.payload
+        buffer = bytearray(MARI_FRAME_PAYLOAD_OFFSET + len(self.payload))
+        self.header.pack_into(buffer, 0)
+        self.stats.pack_into(buffer, MARI_HEADER_SIZE)
+        buffer[MARI_FRAME_PAYLOAD_OFFSET:] = self.payload
+        return buffer
 
     def __repr__(self):
         header_no_metadata = dataclasses.replace(self.header, metadata=[])
         return f"Frame(header={header_no_metadata}, payload={self.payload})"
+
+
+class FrameView:
+    """Read-only view of a serialized frame, without copy.
+
+    Header fields are decoded when accessed and the payload is a memoryview on
+    the original buffer. Use `to_frame()` to get a regular `Frame`.
+    """
+
+    __slots__ = ("_buffer", "_header", "_stats")
+
+    def __init__(self, bytes_, offset: int = 0):
+        buffer = memoryview(bytes_)[offset:]
+        if len(buffer) < MARI_HEADER_SIZE:
+            raise ValueError("Not enough bytes to parse")
+        self._buffer = buffer
+        self._header = None
+        self._stats = None
+
+    @property
+    def version(self) -> int:
+        return self._buffer[0]
+
+    @property
+    def type_(self) -> int:
+        return self._buffer[1]
+
+    @property
+    def network_id(self) -> int:
+        return _UINT16.unpack_from(self._buffer, 2)[0]
+
+    @property
+    def destination(self) -> int:
+        return _UINT64.unpack_from(self._buffer, 4)[0]
+
+    @property
+    def source(self) -> int:
+        return _UINT64.unpack_from(self._buffer, 12)[0]
+
+    @property
+    def rssi(self) -> int:
+        return self._buffer[MARI_HEADER_SIZE] if len(self._buffer) > MARI_HEADER_SIZE else 0
+
+    @property
+    def rssi_dbm(self) -> int:
+        return rssi_to_dbm(self.rssi)
+
+    @property
+    def payload(self) -> memoryview:
+        return self._buffer[MARI_FRAME_PAYLOAD_OFFSET:]
+
+    @property
+    def header(self) -> Header:
+        if self._header is None:
+            self._header = Header().from_bytes(self._buffer)
+        return self._header
+
+    @property
+    def stats(self) -> HeaderStats:
+        if self._stats is None:
+            self._stats = HeaderStats(rssi=self.rssi)
+        return self._stats
+
+    def to_frame(self) -> Frame:
+        return Frame(header=self.header, stats=self.stats, payload=bytes(self.payload))
+
+    def to_bytes(self, byteorder="little") -> bytes:
+        return bytes(self._buffer)
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def __repr__(self):
+        return (
+            f"FrameView(source=0x{self.source:016x}, destination=0x{self.destination:016x}, "
+            f"rssi_dbm={self.rssi_dbm}, payload={bytes(self.payload)})"
+        )
@@ -1,19 +1,26 @@
-import threading
+import time
 from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Any, Callable
 
+from marilib.histogram import Histogram
+from marilib.dispatcher import EventDispatcher
+from marilib.exporter import MetricsExporter, RuntimeStats
+from marilib.instrumentation import InstrumentedLock, PipelineTracer
 from marilib.latency import LatencyTester
-from marilib.mari_protocol import Frame, Header
+from marilib.mari_protocol import Frame, FrameView, Header
 from marilib.model import (
     EdgeEvent,
     GatewayInfo,
+    LatencyStats,
     MariGateway,
     MariNode,
     NodeInfoCloud,
 )
 from marilib.communication_adapter import MQTTAdapter
+from marilib.mqtt_batch import MQTTBatchError, is_batch, unpack_batch
 from marilib.marilib import MarilibBase
+from marilib.snapshot import NetworkSnapshot
 from marilib.tui_cloud import MarilibTUICloud
 
 LOAD_PACKET_PAYLOAD = b"L"
@@ -24,21 +31,44 @@ class MarilibCloud(MarilibBase):
     """
     The MarilibCloud class runs in a computer.
     It is used to communicate with a Mari radio gateway (nRF5340) via MQTT.
+
+    `gateways` and the node registries are copied on write, under `lock`, so
+    they can be read without it.
+
+    `snapshot` holds the statistics of the gateways and their nodes as of the
+    last `update()`, it can be read without taking the lock.
+
+    With a `dispatcher`, the application callback runs on its worker threads
+    instead of the MQTT thread.
+
+    With `frame_views=True`, NODE_DATA events carry a `FrameView` on the received
+    bytes instead of a decoded `Frame`.
+
+    With a `tracer`, the time NODE_DATA frames spend in each stage, from the
+    MQTT message to the application callback, is recorded.
+
+    With an `exporter`, the statistics of each `update()` are served over HTTP
+    in the OpenMetrics format.
     """
 
-    cb_application: Callable[[EdgeEvent, MariNode | Frame | GatewayInfo], None]
+    cb_application: Callable[[EdgeEvent, MariNode | Frame | FrameView | GatewayInfo], None]
     mqtt_interface: MQTTAdapter
     network_id: int
     tui: MarilibTUICloud | None = None
 
     logger: Any | None = None
     gateways: dict[int, MariGateway] = field(default_factory=dict)
-    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    lock: InstrumentedLock = field(default_factory=InstrumentedLock, repr=False)
     latency_tester: LatencyTester | None = None
 
     started_ts: datetime = field(default_factory=datetime.now)
     last_received_mqtt_data_ts: datetime = field(default_factory=datetime.now)
     main_file: str | None = None
+    frame_views: bool = False
+    snapshot: NetworkSnapshot = field(default_factory=NetworkSnapshot, repr=False)
+    dispatcher: EventDispatcher | None = None
+    tracer: PipelineTracer | None = None
+    exporter: MetricsExporter | None = None
 
     def __post_init__(self):
         self.setup_params = {
@@ -50,6 +80,8 @@ class MarilibCloud(MarilibBase):
         self.mqtt_interface.set_network_id(self.network_id_str)
         self.mqtt_interface.set_on_data_received(self.on_mqtt_data_received)
         self.mqtt_interface.init()
+        if self.exporter is not None:
+            self.exporter.start()
         if self.logger:
             self.logger.log_setup_parameters(self.setup_params)
 
@@ -57,16 +89,30 @@ class MarilibCloud(MarilibBase):
 
     def update(self):
         """Recurrent bookkeeping. Don't forget to call this periodically on your main loop."""
+        expired_nodes = []
         with self.lock:
-            # remove dead gateways
-            self.gateways = {
-                addr: gateway for addr, gateway in self.gateways.items() if gateway.is_alive
-            }
+            # remove dead gateways, their nodes are gone with them
+            if dead_gateways := [gw for gw in self.gateways.values() if not gw.is_alive]:
+                gateways = dict(self.gateways)
+                for gateway in dead_gateways:
+                    expired_nodes.extend(gateways.pop(gateway.info.address).nodes)
+                self.gateways = gateways
             # update each gateway
             for gateway in self.gateways.values():
-                gateway.update()
-                if self.logger:
-                    self.logger.log_periodic_metrics(gateway, gateway.nodes)
+                expired_nodes.extend(gateway.update())
+        # the gateways and node registries are copied on write, so the snapshot is built without
+        # the lock, readers only ever see a complete snapshot, replaced at once, so they don't lock
+        self.snapshot = NetworkSnapshot.from_gateways(self.gateways.values())
+        if self.logger:
+            for gateway in self.snapshot.gateways:
+                self.logger.log_periodic_metrics(gateway)
+        if self.exporter is not None:
+            self.exporter.update(self.snapshot, RuntimeStats.from_marilib(self))
+        if self.tracer is not None:
+            self.tracer.dump_if_due()
+        # nodes that timed out are reported like the ones that left explicitly
+        for node in expired_nodes:
+            self.dispatch_event(EdgeEvent.NODE_LEFT, node.as_node_info_cloud())
 
     @property
     def nodes(self) -> list[MariNode]:
@@ -113,6 +159,12 @@ class MarilibCloud(MarilibBase):
     def network_id_str(self) -> str:
         return f"{self.network_id:04X}"
 
+    def latency_histogram(self, lifetime: bool = False) -> Histogram:
+        """Returns the latencies of all gateways, merged in a single histogram."""
+        return LatencyStats.merged(
+            [gateway.latency_stats for gateway in self.gateways.values()], lifetime
+        )
+
     # ============================ Callbacks ===================================
 
     def handle_mqtt_data(self, data: bytes) -> tuple[bool, EdgeEvent, Any]:
@@ -135,46 +187,51 @@ class MarilibCloud(MarilibBase):
 
         try:
             if event_type == EdgeEvent.NODE_JOINED:
-                node_info = NodeInfoCloud().from_bytes(data[1:])
-                if node := self.add_node(node_info.address, node_info.gateway_address):
+                node_info = NodeInfoCloud().from_bytes(data, 1)
+                if self.add_node(node_info.address, node_info.gateway_address):
                     return True, EdgeEvent.NODE_JOINED, node_info
 
             elif event_type == EdgeEvent.NODE_LEFT:
-                node_info = NodeInfoCloud().from_bytes(data[1:])
-                if node := self.remove_node(node_info.address, node_info.gateway_address):
+                node_info = NodeInfoCloud().from_bytes(data, 1)
+                if self.remove_node(node_info.address, node_info.gateway_address):
                     return True, EdgeEvent.NODE_LEFT, node_info
 
             elif event_type == EdgeEvent.NODE_KEEP_ALIVE:
-                node_info = NodeInfoCloud().from_bytes(data[1:])
+                node_info = NodeInfoCloud().from_bytes(data, 1)
                 gateway = self.gateways.get(node_info.gateway_address)
                 if gateway:
-                    gateway.update_node_liveness(node_info.address)
+                    self._update_node_liveness(gateway, node_info.address)
                     return True, EdgeEvent.NODE_KEEP_ALIVE, node_info
 
             elif event_type == EdgeEvent.GATEWAY_INFO:
-                gateway_info = GatewayInfo().from_bytes(data[1:])
+                gateway_info = GatewayInfo().from_bytes(data, 1)
                 gateway = self.gateways.get(gateway_info.address)
                 if not gateway:
                     # we are learning about a new gateway, so instantiate it and add it to the list
                     gateway = MariGateway(info=gateway_info)
-                    self.gateways[gateway.info.address] = gateway
+                    with self.lock:
+                        self.gateways = {**self.gateways, gateway.info.address: gateway}
                 else:
                     gateway.set_info(gateway_info)
                 return True, EdgeEvent.GATEWAY_INFO, gateway_info
 
             elif event_type == EdgeEvent.NODE_DATA:
-                frame = Frame().from_bytes(data[1:])
+                frame = FrameView(data, 1)
 
-                gateway_address = frame.header.destination
-                node_address = frame.header.source
+                gateway_address = frame.destination
+                node_address = frame.source
                 gateway = self.gateways.get(gateway_address)
-                node = gateway.get_node(node_address)
-                if not gateway or not node:
+                if not gateway or not gateway.get_node(node_address):
                     return False, EdgeEvent.UNKNOWN, None
+                event_data = frame if self.frame_views else frame.to_frame()
+                if self.tracer is not None:
+                    self.tracer.mark("parse")
 
-                gateway.update_node_liveness(node_address)
+                self._update_node_liveness(gateway, node_address)
                 gateway.register_received_frame(frame, is_test_packet=False)
-                return True, EdgeEvent.NODE_DATA, frame
+                if self.tracer is not None:
+                    self.tracer.mark("model_update")
+                return True, EdgeEvent.NODE_DATA, event_data
 
         except Exception as e:
             print(f"Error handling MQTT data: {e}")
@@ -183,11 +240,58 @@ class MarilibCloud(MarilibBase):
         return False, EdgeEvent.UNKNOWN, None
 
     def on_mqtt_data_received(self, data: bytes):
+        """Handles a message of the edge, a single event or a batch of events."""
+        if not is_batch(data):
+            self._on_mqtt_event(data)
+            return
+        # the events of a batch are traced from the reception of the batch
+        start_ns = time.perf_counter_ns() if self.tracer is not None else None
+        try:
+            for event in unpack_batch(data):
+                self._on_mqtt_event(event, start_ns)
+        except MQTTBatchError as e:
+            print(f"Error unpacking MQTT batch: {e}")
+
+    def _on_mqtt_event(self, data: bytes, start_ns: int | None = None):
+        if self.tracer is not None:
+            self.tracer.begin(start_ns)
         res, event_type, event_data = self.handle_mqtt_data(data)
         if res:
-            if self.logger and event_type in [EdgeEvent.NODE_JOINED, EdgeEvent.NODE_LEFT]:
-                # TODO: update the logging system to also support GATEWAY_INFO events from multiple gateways
-                self.logger.log_event(
-                    event_data.gateway_address, event_data.address, event_type.name
-                )
-            self.cb_application(event_type, event_data)
+            self.dispatch_event(event_type, event_data)
+
+    def dispatch_event(self, event_type: EdgeEvent, event_data: Any):
+        """Handles an event right away, or queues it to the dispatcher if there is one."""
+        if self.dispatcher is None:
+            self.on_event(event_type, event_data)
+            return
+        # events of the same node are kept in order
+        key = event_data.source if event_type == EdgeEvent.NODE_DATA else event_data.address
+        if self.tracer is not None and event_type == EdgeEvent.NODE_DATA:
+            token = self.tracer.suspend()
+            self.dispatcher.submit(key, self._on_traced_event, token, event_type, event_data)
+            return
+        self.dispatcher.submit(key, self.on_event, event_type, event_data)
+
+    def _on_traced_event(self, token: tuple[int, int], event_type: EdgeEvent, event_data: Any):
+        self.tracer.resume(token)
+        self.on_event(event_type, event_data)
+
+    def on_event(self, event_type: EdgeEvent, event_data: Any):
+        """Logs an event and passes it to the application."""
+        if self.logger and event_type in [EdgeEvent.NODE_JOINED, EdgeEvent.NODE_LEFT]:
+            # TODO: update the logging system to also support GATEWAY_INFO events from multiple gateways
+            self.logger.log_event(event_data.gateway_address, event_data.address, event_type.name)
+        self.cb_application(event_type, event_data)
+        if self.tracer is not None and event_type == EdgeEvent.NODE_DATA:
+            self.tracer.mark("callback")
+            self.tracer.end()
+
+    # ============================ Private methods =============================
+
+    def _update_node_liveness(self, gateway: MariGateway, address: int):
+        """Marks a node as seen, only locks when the node has to be created."""
+        if node := gateway.get_node(address):
+            node.touch()
+            return
+        with self.lock:
+            gateway.update_node_liveness(address)
@@ -1,11 +1,14 @@
-import threading
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any, Callable
+from typing import Any, Callable, Iterable
 from rich import print
 
+from marilib.dispatcher import EventDispatcher
+from marilib.downlink import DownlinkQueueFull, DownlinkScheduler, downlink_capacity
+from marilib.exporter import MetricsExporter, RuntimeStats
+from marilib.instrumentation import InstrumentedLock, PipelineTracer
 from marilib.latency import LATENCY_PACKET_MAGIC, LatencyTester
-from marilib.mari_protocol import MARI_BROADCAST_ADDRESS, Frame, Header
+from marilib.mari_protocol import MARI_BROADCAST_ADDRESS, Frame, FrameView, Header
 from marilib.model import (
     EdgeEvent,
     GatewayInfo,
@@ -15,6 +18,7 @@ from marilib.model import (
     SCHEDULES,
 )
 from marilib.protocol import ProtocolPayloadParserException
+from marilib.snapshot import NetworkSnapshot
 from marilib.communication_adapter import MQTTAdapter, MQTTAdapterDummy, SerialAdapter
 from marilib.marilib import MarilibBase
 from marilib.tui_edge import MarilibTUIEdge
@@ -29,21 +33,48 @@ class MarilibEdge(MarilibBase):
     It is used to communicate with:
     - a Mari radio gateway (nRF5340) via serial
     - a Mari cloud instance via MQTT (optional)
+
+    `lock` protects the changes to the set of nodes, the sent frames statistics
+    and `update()`. The serial RX path only takes it to create nodes.
+
+    `snapshot` holds the statistics of the gateway and its nodes as of the last
+    `update()`, it can be read without taking the lock.
+
+    With a `dispatcher`, the application callback and the forwarding to the cloud
+    run on its worker threads instead of the serial thread.
+
+    With a `downlink_scheduler`, sent frames are paced to the downlink capacity
+    of the gateway schedule.
+
+    With `frame_views=True`, NODE_DATA events carry a `FrameView` on the received
+    bytes instead of a decoded `Frame`.
+
+    With a `tracer`, the time NODE_DATA frames spend in each stage, from the
+    serial read to the cloud publish, is recorded.
+
+    With an `exporter`, the statistics of each `update()` are served over HTTP
+    in the OpenMetrics format.
     """
 
-    cb_application: Callable[[EdgeEvent, MariNode | Frame], None]
+    cb_application: Callable[[EdgeEvent, MariNode | Frame | FrameView], None]
     serial_interface: SerialAdapter
     mqtt_interface: MQTTAdapter | None = None
     tui: MarilibTUIEdge | None = None
 
     logger: Any | None = None
     gateway: MariGateway = field(default_factory=MariGateway)
-    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    lock: InstrumentedLock = field(default_factory=InstrumentedLock, repr=False)
     latency_tester: LatencyTester | None = None
 
     started_ts: datetime = field(default_factory=datetime.now)
     last_received_serial_data_ts: datetime = field(default_factory=datetime.now)
     main_file: str | None = None
+    frame_views: bool = False
+    snapshot: NetworkSnapshot = field(default_factory=NetworkSnapshot, repr=False)
+    dispatcher: EventDispatcher | None = None
+    downlink_scheduler: DownlinkScheduler | None = None
+    tracer: PipelineTracer | None = None
+    exporter: MetricsExporter | None = None
 
     def __post_init__(self):
         self.setup_params = {
@@ -52,7 +83,14 @@ class MarilibEdge(MarilibBase):
         }
         if self.mqtt_interface is None:
             self.mqtt_interface = MQTTAdapterDummy()
+        self.serial_interface.tracer = self.tracer
         self.serial_interface.init(self.on_serial_data_received)
+        if self.exporter is not None:
+            self.exporter.start()
+        if self.downlink_scheduler is not None:
+            self.downlink_scheduler.start(
+                self._send_frame_now, lambda: SCHEDULES.get(self.gateway.info.schedule_id)
+            )
         # NOTE: MQTT interface will only be initialized when the network_id is known
         if self.logger:
             self.logger.log_setup_parameters(self.setup_params)
@@ -61,9 +99,19 @@ class MarilibEdge(MarilibBase):
 
     def update(self):
         with self.lock:
-            self.gateway.update()
-            if self.logger and self.logger.active:
-                self.logger.log_periodic_metrics(self.gateway, self.gateway.nodes)
+            expired_nodes = self.gateway.update()
+        # the node registry is copied on write, so the snapshot is built without the lock,
+        # readers only ever see a complete snapshot, replaced at once, so they don't lock either
+        self.snapshot = NetworkSnapshot.from_gateways([self.gateway])
+        if self.logger and self.logger.active:
+            self.logger.log_periodic_metrics(self.snapshot.gateways[0])
+        if self.exporter is not None:
+            self.exporter.update(self.snapshot, RuntimeStats.from_marilib(self))
+        if self.tracer is not None:
+            self.tracer.dump_if_due()
+        # nodes that timed out are reported like the ones that left explicitly
+        for node in expired_nodes:
+            self.dispatch_event(EdgeEvent.NODE_LEFT, NodeInfoEdge(address=node.address))
 
     @property
     def nodes(self) -> list[MariNode]:
@@ -77,21 +125,29 @@ class MarilibEdge(MarilibBase):
         with self.lock:
             return self.gateway.remove_node(address)
 
-    def send_frame(self, dst: int, payload: bytes):
-        """Sends a frame to the gateway via serial."""
+    def send_frame(self, dst: int, payload: bytes, priority: bool = False):
+        """Sends a frame to the gateway via serial.
+
+        With a downlink scheduler, the frame is queued, in the priority lane if
+        `priority`, and DownlinkQueueFull is raised if the queue is full.
+        """
+        if self.downlink_scheduler is not None:
+            self.downlink_scheduler.put(dst, payload, priority)
+            return
+        self._send_frame_now(dst, payload)
+
+    def can_send_frame(self, dst: int, priority: bool = False) -> bool:
+        """Whether `send_frame` would accept a frame for `dst` now, without raising."""
+        return self.downlink_scheduler is None or self.downlink_scheduler.has_room(dst, priority)
+
+    def _send_frame_now(self, dst: int, payload: bytes):
         assert self.serial_interface is not None
 
         mari_frame = Frame(Header(destination=dst), payload=payload)
         is_test = self._is_test_packet(payload)
 
         with self.lock:
-            # Only register statistics for normal data packets, not for test packets.
             self.gateway.register_sent_frame(mari_frame, is_test)
-            if dst == MARI_BROADCAST_ADDRESS:
-                for n in self.gateway.nodes:
-                    n.register_sent_frame(mari_frame, is_test)
-            elif n := self.gateway.get_node(dst):
-                n.register_sent_frame(mari_frame, is_test)
 
         # FIXME: instead of prefixing with a magic 0x01 byte, we should use EdgeEvent.NODE_DATA
         self.serial_interface.send_data(b"\x01" + mari_frame.to_bytes())
@@ -106,6 +162,32 @@ class MarilibEdge(MarilibBase):
 
     # ============================ MarilibEdge methods =========================
 
+    def send_frames(self, frames: Iterable[tuple[int, bytes]]):
+        """Sends several frames to the gateway via serial, in a single write.
+
+        `frames` yields (destination, payload) tuples. With a downlink scheduler,
+        the frames are queued one by one instead.
+        """
+        assert self.serial_interface is not None
+        if self.downlink_scheduler is not None:
+            for dst, payload in frames:
+                self.downlink_scheduler.put(dst, payload)
+            return
+
+        mari_frames = [Frame(Header(destination=dst), payload=payload) for dst, payload in frames]
+        if not mari_frames:
+            return
+
+        with self.lock:
+            for mari_frame in mari_frames:
+                self.gateway.register_sent_frame(
+                    mari_frame, self._is_test_packet(mari_frame.payload)
+                )
+
+        self.serial_interface.send_data_batch(
+            [b"\x01" + mari_frame.to_bytes() for mari_frame in mari_frames]
+        )
+
     @property
     def uses_mqtt(self) -> bool:
         return not isinstance(self.mqtt_interface, MQTTAdapterDummy)
@@ -116,14 +198,7 @@ class MarilibEdge(MarilibBase):
 
     def get_max_downlink_rate(self) -> float:
         """Calculate the max downlink packets/sec for a given schedule_id."""
-        schedule_params = SCHEDULES.get(self.gateway.info.schedule_id)
-        if not schedule_params:
-            return 0.0
-        d_down = schedule_params["d_down"]
-        sf_duration_ms = schedule_params["sf_duration"]
-        if sf_duration_ms == 0:
-            return 0.0
-        return d_down / (sf_duration_ms / 1000.0)
+        return downlink_capacity(SCHEDULES.get(self.gateway.info.schedule_id))[0]
 
     # ============================ Callbacks ===================================
 
@@ -133,7 +208,7 @@ class MarilibEdge(MarilibBase):
             return
         try:
             event_type = EdgeEvent(data[0])
-            frame = Frame().from_bytes(data[1:])
+            frame = Frame().from_bytes(data, 1)
         except (ValueError, ProtocolPayloadParserException) as exc:
             print(f"[red]Error parsing frame: {exc}[/]")
             return
@@ -145,7 +220,10 @@ class MarilibEdge(MarilibBase):
         ):
             # ignore frames for unknown nodes
             return
-        self.send_frame(frame.header.destination, frame.payload)
+        try:
+            self.send_frame(frame.header.destination, frame.payload)
+        except DownlinkQueueFull:
+            pass  # counted in the downlink scheduler stats
 
     def handle_serial_data(self, data: bytes) -> tuple[bool, EdgeEvent, Any]:
         """
@@ -166,38 +244,42 @@ class MarilibEdge(MarilibBase):
             return False, EdgeEvent.UNKNOWN, None
 
         if event_type == EdgeEvent.NODE_JOINED:
-            node_info = NodeInfoEdge().from_bytes(data[1:])
+            node_info = NodeInfoEdge().from_bytes(data, 1)
             self.add_node(node_info.address)
             return True, event_type, node_info
 
         elif event_type == EdgeEvent.NODE_LEFT:
-            node_info = NodeInfoEdge().from_bytes(data[1:])
+            node_info = NodeInfoEdge().from_bytes(data, 1)
             if self.remove_node(node_info.address):
                 return True, event_type, node_info
             else:
                 return False, event_type, node_info
 
         elif event_type == EdgeEvent.NODE_KEEP_ALIVE:
-            node_info = NodeInfoEdge().from_bytes(data[1:])
-            with self.lock:
-                self.gateway.update_node_liveness(node_info.address)
+            node_info = NodeInfoEdge().from_bytes(data, 1)
+            self._update_node_liveness(node_info.address)
             return True, event_type, node_info
 
         elif event_type == EdgeEvent.GATEWAY_INFO:
             try:
                 with self.lock:
-                    self.gateway.set_info(GatewayInfo().from_bytes(data[1:]))
+                    self.gateway.set_info(GatewayInfo().from_bytes(data, 1))
                 return True, event_type, self.gateway.info
             except (ValueError, ProtocolPayloadParserException):
                 return False, EdgeEvent.UNKNOWN, None
 
         elif event_type == EdgeEvent.NODE_DATA:
             try:
-                frame = Frame().from_bytes(data[1:])
-                with self.lock:
-                    self.gateway.update_node_liveness(frame.header.source)
-                    self.gateway.register_received_frame(frame, is_test_packet=False)
-                return True, event_type, frame
+                frame = FrameView(data, 1)
+                event_data = frame if self.frame_views else frame.to_frame()
+                if self.tracer is not None:
+                    self.tracer.mark("parse")
+                # only this thread updates the received statistics, no need to lock
+                self._update_node_liveness(frame.source)
+                self.gateway.register_received_frame(frame, is_test_packet=False)
+                if self.tracer is not None:
+                    self.tracer.mark("model_update")
+                return True, event_type, event_data
             except (ValueError, ProtocolPayloadParserException):
                 return False, EdgeEvent.UNKNOWN, None
         return True, event_type, None
@@ -205,21 +287,46 @@ class MarilibEdge(MarilibBase):
     def on_serial_data_received(self, data: bytes):
         res, event_type, event_data = self.handle_serial_data(data)
         if res:
-            if self.logger and event_type in [EdgeEvent.NODE_JOINED, EdgeEvent.NODE_LEFT]:
-                self.logger.log_event(
-                    self.gateway.info.address, event_data.address, event_type.name
-                )
-            if event_type == EdgeEvent.GATEWAY_INFO:
-                # when the first GATEWAY_INFO is received, this will cause the MQTT interface to be initialized
-                self.mqtt_interface.update(event_data.network_id_str, self.on_mqtt_data_received)
-                if self.logger:
-                    self.setup_params["schedule_name"] = self.gateway.info.schedule_name
-                    self.logger.log_setup_parameters(self.setup_params)
-            self.cb_application(event_type, event_data)
-            self.send_data_to_cloud(event_type, event_data)
+            self.dispatch_event(event_type, event_data)
+
+    def dispatch_event(self, event_type: EdgeEvent, event_data: Any):
+        """Handles an event right away, or queues it to the dispatcher if there is one."""
+        if self.dispatcher is None:
+            self.on_event(event_type, event_data)
+            return
+        # events of the same node are kept in order
+        key = event_data.source if event_type == EdgeEvent.NODE_DATA else event_data.address
+        if self.tracer is not None and event_type == EdgeEvent.NODE_DATA:
+            token = self.tracer.suspend()
+            self.dispatcher.submit(key, self._on_traced_event, token, event_type, event_data)
+            return
+        self.dispatcher.submit(key, self.on_event, event_type, event_data)
+
+    def _on_traced_event(self, token: tuple[int, int], event_type: EdgeEvent, event_data: Any):
+        self.tracer.resume(token)
+        self.on_event(event_type, event_data)
+
+    def on_event(self, event_type: EdgeEvent, event_data: Any):
+        """Logs an event, passes it to the application and forwards it to the cloud."""
+        if self.logger and event_type in [EdgeEvent.NODE_JOINED, EdgeEvent.NODE_LEFT]:
+            self.logger.log_event(self.gateway.info.address, event_data.address, event_type.name)
+        if event_type == EdgeEvent.GATEWAY_INFO:
+            # when the first GATEWAY_INFO is received, this will cause the MQTT interface to be initialized
+            self.mqtt_interface.update(event_data.network_id_str, self.on_mqtt_data_received)
+            if self.logger:
+                self.setup_params["schedule_name"] = self.gateway.info.schedule_name
+                self.logger.log_setup_parameters(self.setup_params)
+        tracer = self.tracer if event_type == EdgeEvent.NODE_DATA else None
+        self.cb_application(event_type, event_data)
+        if tracer is not None:
+            tracer.mark("callback")
+        self.send_data_to_cloud(event_type, event_data)
+        if tracer is not None:
+            tracer.mark("cloud_publish")
+            tracer.end()
 
     def send_data_to_cloud(
-        self, event_type: EdgeEvent, event_data: NodeInfoEdge | GatewayInfo | Frame
+        self, event_type: EdgeEvent, event_data: NodeInfoEdge | GatewayInfo | Frame | FrameView
     ):
         if event_type in [EdgeEvent.NODE_JOINED, EdgeEvent.NODE_LEFT, EdgeEvent.NODE_KEEP_ALIVE]:
             # the cloud needs to know which gateway the node belongs to
@@ -241,6 +348,14 @@ class MarilibEdge(MarilibBase):
 
     # ============================ Private methods =============================
 
+    def _update_node_liveness(self, address: int):
+        """Marks a node as seen, only locks when the node has to be created."""
+        if node := self.gateway.get_node(address):
+            node.touch()
+            return
+        with self.lock:
+            self.gateway.update_node_liveness(address)
+
     def _is_test_packet(self, payload: bytes) -> bool:
         """Determines if a packet is for testing purposes (load or latency)."""
         is_latency = payload.startswith(LATENCY_PACKET_MAGIC)
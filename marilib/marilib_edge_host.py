@@ -0,0 +1,162 @@
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from marilib.communication_adapter import (
+    MQTTAdapter,
+    MQTTAdapterDummy,
+    ProcessSerialAdapter,
+    SerialAdapter,
+)
+from marilib.downlink import DownlinkQueueFull
+from marilib.mari_protocol import MARI_BROADCAST_ADDRESS, FrameView
+from marilib.marilib import MarilibBase
+from marilib.marilib_edge import MarilibEdge
+from marilib.model import EdgeEvent, MariGateway, MariNode
+from marilib.protocol import ProtocolPayloadParserException
+from marilib.serial_uart import get_default_ports
+from marilib.snapshot import NetworkSnapshot
+
+
+@dataclass
+class MarilibEdgeHost(MarilibBase):
+    """
+    The MarilibEdgeHost class runs several Mari radio gateways from one computer.
+    Each serial port gets its own MarilibEdge, all of them share the MQTT
+    connection and the logger.
+
+    Frames are sent through the gateway the destination node is connected to,
+    broadcast frames through all of them.
+    """
+
+    cb_application: Callable[[EdgeEvent, Any], None]
+    serial_interfaces: list[SerialAdapter]
+    mqtt_interface: MQTTAdapter | None = None
+
+    logger: Any | None = None
+    main_file: str | None = None
+    edge_kwargs: dict[str, Any] = field(default_factory=dict)
+    edges: list[MarilibEdge] = field(init=False)
+    snapshot: NetworkSnapshot = field(default_factory=NetworkSnapshot, repr=False)
+
+    def __post_init__(self):
+        if self.mqtt_interface is None:
+            self.mqtt_interface = MQTTAdapterDummy()
+        # downlink data is routed by the host, not by the edge that initializes MQTT
+        self.mqtt_interface.set_on_data_received(self.on_mqtt_data_received)
+        self.edges = [
+            MarilibEdge(
+                self.cb_application,
+                serial_interface,
+                mqtt_interface=self.mqtt_interface,
+                logger=self.logger,
+                main_file=self.main_file,
+                **self.edge_kwargs,
+            )
+            for serial_interface in self.serial_interfaces
+        ]
+
+    @classmethod
+    def from_ports(
+        cls,
+        cb_application: Callable[[EdgeEvent, Any], None],
+        ports: list[str] | None = None,
+        use_processes: bool = True,
+        **kwargs,
+    ) -> "MarilibEdgeHost":
+        """Creates a host for the given ports, or all the JLink ports available.
+
+        With `use_processes`, each port is read by its own process.
+        """
+        adapter_class = ProcessSerialAdapter if use_processes else SerialAdapter
+        ports = get_default_ports() if ports is None else ports
+        return cls(cb_application, [adapter_class(port) for port in ports], **kwargs)
+
+    # ============================ MarilibBase methods =========================
+
+    def update(self):
+        for edge in self.edges:
+            edge.update()
+        self.snapshot = NetworkSnapshot(
+            gateways=tuple(gateway for edge in self.edges for gateway in edge.snapshot.gateways)
+        )
+
+    @property
+    def nodes(self) -> list[MariNode]:
+        return [node for edge in self.edges for node in edge.nodes]
+
+    def add_node(self, address: int, gateway_address: int = None) -> MariNode | None:
+        if edge := self.get_edge(gateway_address):
+            return edge.add_node(address)
+        return None
+
+    def remove_node(self, address: int) -> MariNode | None:
+        if edge := self.get_node_edge(address):
+            return edge.remove_node(address)
+        return None
+
+    def send_frame(self, dst: int, payload: bytes, priority: bool = False):
+        """Sends a frame via the gateway of the destination node, or all gateways if broadcast.
+
+        Like `MarilibEdge.send_frame`, DownlinkQueueFull is raised if the frame
+        can't be queued. A broadcast is only queued if every gateway has room
+        for it. Another thread can still fill a queue meanwhile: the broadcast
+        is then sent by the other gateways, and DownlinkQueueFull raised after.
+        """
+        if dst != MARI_BROADCAST_ADDRESS:
+            if edge := self.get_node_edge(dst):
+                edge.send_frame(dst, payload, priority)
+            return
+        if not all(edge.can_send_frame(dst, priority) for edge in self.edges):
+            raise DownlinkQueueFull("Downlink queue full for the broadcast on a gateway")
+        full = None
+        for edge in self.edges:
+            try:
+                edge.send_frame(dst, payload, priority)
+            except DownlinkQueueFull as exc:
+                full = exc
+        if full is not None:
+            raise full
+
+    def get_max_downlink_rate(self) -> float:
+        """Returns the downlink frames per second of the slowest gateway whose schedule is known."""
+        return min(
+            (rate for edge in self.edges if (rate := edge.get_max_downlink_rate())), default=0.0
+        )
+
+    def render_tui(self):
+        pass  # no TUI for several gateways yet
+
+    def close_tui(self):
+        pass
+
+    # ============================ MarilibEdgeHost methods =====================
+
+    @property
+    def gateways(self) -> dict[int, MariGateway]:
+        return {edge.gateway.info.address: edge.gateway for edge in self.edges}
+
+    def get_edge(self, gateway_address: int) -> MarilibEdge | None:
+        return next((e for e in self.edges if e.gateway.info.address == gateway_address), None)
+
+    def get_node_edge(self, address: int) -> MarilibEdge | None:
+        """Returns the edge whose gateway the node is connected to."""
+        return next((e for e in self.edges if e.gateway.get_node(address)), None)
+
+    def close(self):
+        for edge in self.edges:
+            edge.serial_interface.close()
+        self.mqtt_interface.close()
+
+    # ============================ Callbacks ===================================
+
+    def on_mqtt_data_received(self, data: bytes):
+        """Forwards the data to the gateway(s) of the destination."""
+        try:
+            destination = FrameView(data, 1).destination
+        except (ValueError, ProtocolPayloadParserException):
+            return
+        if destination == MARI_BROADCAST_ADDRESS:
+            for edge in self.edges:
+                edge.on_mqtt_data_received(data)
+        elif edge := self.get_node_edge(destination):
+            edge.on_mqtt_data_received(data)
@@ -1,11 +1,16 @@
-import statistics
-from collections import deque
+import heapq
+import itertools
+import math
+import sys
+import time
+from array import array
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from enum import IntEnum
 import rich
 
-from marilib.mari_protocol import Frame
+from marilib.histogram import Histogram, WindowedHistogram
+from marilib.mari_protocol import MARI_BROADCAST_ADDRESS, Frame, FrameView
 from marilib.protocol import Packet, PacketFieldMetadata
 
 # schedules taken from: https://github.com/DotBots/mari-evaluation/blob/main/simulations/radio-schedule.ipynb
@@ -51,6 +56,11 @@ EMPTY_SCHEDULE_DATA = {
 
 MARI_TIMEOUT_NODE_IS_ALIVE = 3  # seconds
 MARI_TIMEOUT_GATEWAY_IS_ALIVE = 3  # seconds
+FRAME_STATS_BUCKET_SECONDS = 0.1  # resolution of windowed frame counts
+FRAME_STATS_RSSI_WINDOW_SECONDS = 60  # longest window of the mean received RSSI
+FRAME_STATS_RSSI_OFFSET_DBM = 128  # added to the RSSI sums to keep them positive
+LATENCY_WINDOW_SECONDS = 60
+LATENCY_HISTOGRAM_MAX_BITS = 26  # in microseconds, ~67 seconds
 
 
 @dataclass
@@ -114,80 +124,239 @@ class NodeStatsReply(Packet):
 
 
 @dataclass
-class FrameLogEntry:
-    frame: Frame
-    ts: datetime = field(default_factory=lambda: datetime.now())
-    is_test_packet: bool = False
+class LatencyStats:
+    """Round trip latencies, in streaming histograms over the last `window_seconds` and lifetime.
 
+    avg, min, max and percentiles are computed over the window unless stated otherwise.
+    """
 
-@dataclass
-class LatencyStats:
-    latencies: deque = field(default_factory=lambda: deque(maxlen=50))
+    window_seconds: float = LATENCY_WINDOW_SECONDS
+    last_ms: float = 0.0
+    lifetime: Histogram = field(
+        default_factory=lambda: Histogram(max_bits=LATENCY_HISTOGRAM_MAX_BITS), repr=False
+    )
+    window: WindowedHistogram = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.window = WindowedHistogram(self.window_seconds, max_bits=LATENCY_HISTOGRAM_MAX_BITS)
 
     def add_latency(self, rtt_seconds: float):
-        self.latencies.append(rtt_seconds * 1000)
+        rtt_us = round(rtt_seconds * 1_000_000)
+        self.last_ms = rtt_seconds * 1000
+        self.lifetime.record(rtt_us)
+        self.window.record(rtt_us)
 
-    @property
-    def last_ms(self) -> float:
-        return self.latencies[-1] if self.latencies else 0.0
+    def histogram(self, lifetime: bool = False) -> Histogram:
+        return self.lifetime if lifetime else self.window.current()
+
+    def percentile_ms(self, percentile: float, lifetime: bool = False) -> float:
+        return self.histogram(lifetime).percentile(percentile) / 1000
 
     @property
     def avg_ms(self) -> float:
-        return statistics.mean(self.latencies) if self.latencies else 0.0
+        return self.window.current().mean / 1000
 
     @property
     def min_ms(self) -> float:
-        return min(self.latencies) if self.latencies else 0.0
+        return self.window.current().min / 1000
 
     @property
     def max_ms(self) -> float:
-        return max(self.latencies) if self.latencies else 0.0
+        return self.window.current().max / 1000
+
+    @property
+    def p50_ms(self) -> float:
+        return self.percentile_ms(50)
+
+    @property
+    def p95_ms(self) -> float:
+        return self.percentile_ms(95)
+
+    @property
+    def p99_ms(self) -> float:
+        return self.percentile_ms(99)
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.lifetime.memory_bytes + self.window.memory_bytes
+
+    @staticmethod
+    def merged(stats: list["LatencyStats"], lifetime: bool = False) -> Histogram:
+        """Returns a histogram aggregating the latencies of several stats."""
+        histogram = Histogram(max_bits=LATENCY_HISTOGRAM_MAX_BITS)
+        for latency_stats in stats:
+            histogram.merge(latency_stats.histogram(lifetime))
+        return histogram
+
+
+@dataclass
+class RollingCounter:
+    """Counts events over sliding time windows, in O(1) per event and per query.
+
+    A ring keeps the running total at the end of each time bucket, so the count
+    over the last N seconds is the current total minus the total N seconds ago.
+    The bucket where the window starts is counted whole, so a count may include
+    events up to `bucket_seconds` older than the window, but never misses one.
+    Totals are stored modulo 2**32, differences of them stay exact.
+    """
+
+    window_seconds: float = 240
+    bucket_seconds: float = FRAME_STATS_BUCKET_SECONDS
+    total: int = 0
+    _totals: array = field(init=False, repr=False)
+    _bucket: int = field(default=0, repr=False)
+
+    def __post_init__(self):
+        self._totals = array("I", [0]) * (math.ceil(self.window_seconds / self.bucket_seconds) + 2)
+        self._bucket = int(time.monotonic() / self.bucket_seconds)
+
+    @property
+    def memory_bytes(self) -> int:
+        return sys.getsizeof(self._totals)
+
+    def add(self, count: int = 1, now: float | None = None):
+        bucket = int((time.monotonic() if now is None else now) / self.bucket_seconds)
+        if bucket > self._bucket:
+            # no event since the last one: totals at the end of the elapsed buckets are unchanged
+            totals = self._totals
+            size = len(totals)
+            total = self.total & 0xFFFFFFFF
+            for elapsed in range(max(self._bucket, bucket - size), bucket):
+                totals[elapsed % size] = total
+            self._bucket = bucket
+        self.total += count
+
+    def count(self, window_secs: float, now: float | None = None) -> int:
+        """Returns the number of events in the last `window_secs` seconds."""
+        now = time.monotonic() if now is None else now
+        start = int((now - min(window_secs, self.window_seconds)) / self.bucket_seconds)
+        if start > self._bucket:
+            return 0
+        # events before the bucket where the window starts
+        before = self._totals[(start - 1) % len(self._totals)]
+        return (self.total - before) & 0xFFFFFFFF
+
+
+@dataclass
+class RssiSamples:
+    """RSSI of the received frames over sliding time windows, in O(1) per sample and per query.
+
+    Keeps the sample count and the RSSI sum per time bucket, as `RollingCounter`
+    does, so a window covers its full duration whatever the rate of samples, up
+    to `window_seconds`. Sums are of the RSSI offset by `FRAME_STATS_RSSI_OFFSET_DBM`, which
+    keeps them positive.
+    """
+
+    window_seconds: float = FRAME_STATS_RSSI_WINDOW_SECONDS
+    _counts: RollingCounter = field(init=False, repr=False)
+    _sums: RollingCounter = field(init=False, repr=False)
+    _last: int = field(default=0, repr=False)
+
+    def __post_init__(self):
+        self._counts = RollingCounter(self.window_seconds)
+        self._sums = RollingCounter(self.window_seconds)
+
+    def __len__(self) -> int:
+        return self._counts.total
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._counts.memory_bytes + self._sums.memory_bytes
+
+    def append(self, rssi_dbm: int, now: float | None = None):
+        now = time.monotonic() if now is None else now
+        self._counts.add(now=now)
+        self._sums.add(rssi_dbm + FRAME_STATS_RSSI_OFFSET_DBM, now=now)
+        self._last = rssi_dbm
+
+    def last(self) -> int:
+        return self._last
+
+    def mean(self, window_secs: float, now: float | None = None) -> float:
+        """Returns the mean RSSI of the samples of the last `window_secs` seconds, 0 if none."""
+        now = time.monotonic() if now is None else now
+        count = self._counts.count(window_secs, now=now)
+        if not count:
+            return 0
+        return self._sums.count(window_secs, now=now) / count - FRAME_STATS_RSSI_OFFSET_DBM
 
 
 @dataclass
 class FrameStats:
     window_seconds: int = 240  # set window duration
-    sent: deque[FrameLogEntry] = field(default_factory=deque)
-    received: deque[FrameLogEntry] = field(default_factory=deque)
     cumulative_sent: int = 0
     cumulative_received: int = 0
     cumulative_sent_non_test: int = 0
     cumulative_received_non_test: int = 0
+    sent_window: RollingCounter = field(init=False, repr=False)
+    received_window: RollingCounter = field(init=False, repr=False)
+    received_rssi: RssiSamples = field(default_factory=RssiSamples, repr=False)
+    # frames sent to the broadcast address, counted once for all the nodes
+    broadcast: "FrameStats | None" = field(default=None, repr=False)
+    _broadcast_baseline: tuple[int, int] = field(default=(0, 0), repr=False)
+
+    def __post_init__(self):
+        # windowed counts and samples only account for non-test packets
+        self.sent_window = RollingCounter(self.window_seconds)
+        self.received_window = RollingCounter(self.window_seconds)
+        if self.broadcast is not None:
+            self.follow_broadcast(self.broadcast)
 
-    def add_sent(self, frame: Frame, is_test_packet: bool):
-        """Adds a sent frame, prunes old entries, and updates counters."""
+    def follow_broadcast(self, broadcast: "FrameStats"):
+        """Counts the frames sent in `broadcast` from now on as sent frames too."""
+        self.broadcast = broadcast
+        self._broadcast_baseline = (broadcast.cumulative_sent, broadcast.cumulative_sent_non_test)
+
+    @property
+    def memory_bytes(self) -> int:
+        """Returns the memory used by the counters and samples, in bytes."""
+        return (
+            sys.getsizeof(self)
+            + self.sent_window.memory_bytes
+            + self.received_window.memory_bytes
+            + self.received_rssi.memory_bytes
+        )
+
+    def add_sent(self, frame: Frame | FrameView, is_test_packet: bool):
+        """Adds a sent frame and updates counters."""
         self.cumulative_sent += 1
 
         if not is_test_packet:
             self.cumulative_sent_non_test += 1
+            self.sent_window.add()
 
-            entry = FrameLogEntry(frame=frame, is_test_packet=is_test_packet)
-            self.sent.append(entry)
-            while self.sent and (entry.ts - self.sent[0].ts).total_seconds() > self.window_seconds:
-                self.sent.popleft()
-
-    def add_received(self, frame: Frame, is_test_packet: bool):
-        """Adds a received frame and prunes old entries."""
+    def add_received(self, frame: Frame | FrameView, is_test_packet: bool):
+        """Adds a received frame, records its RSSI and updates counters."""
         self.cumulative_received += 1
 
         if not is_test_packet:
             self.cumulative_received_non_test += 1
-            entry = FrameLogEntry(frame=frame, is_test_packet=is_test_packet)
-            self.received.append(entry)
-            while (
-                self.received
-                and (entry.ts - self.received[0].ts).total_seconds() > self.window_seconds
-            ):
-                self.received.popleft()
+            self.received_window.add()
+            self.received_rssi.append(frame.rssi_dbm)
 
     def sent_count(self, window_secs: int = 0, include_test_packets: bool = True) -> int:
         if window_secs == 0:
-            return self.cumulative_sent if include_test_packets else self.cumulative_sent_non_test
+            if include_test_packets:
+                return self.cumulative_sent + self._broadcast_sent(include_test_packets)
+            return self.cumulative_sent_non_test + self._broadcast_sent(include_test_packets)
 
-        now = datetime.now()
         # Windowed count is always for non-test packets.
-        entries = [e for e in self.sent if now - e.ts < timedelta(seconds=window_secs)]
-        return len(entries)
+        sent = self.sent_window.count(window_secs)
+        if self.broadcast is not None:
+            # broadcasts in the window, but not more than were sent since following them
+            sent += min(
+                self.broadcast.sent_window.count(window_secs),
+                self._broadcast_sent(include_test_packets=False),
+            )
+        return sent
+
+    def _broadcast_sent(self, include_test_packets: bool) -> int:
+        """Returns the number of broadcast frames sent since `follow_broadcast`."""
+        if self.broadcast is None:
+            return 0
+        if include_test_packets:
+            return self.broadcast.cumulative_sent - self._broadcast_baseline[0]
+        return self.broadcast.cumulative_sent_non_test - self._broadcast_baseline[1]
 
     def received_count(self, window_secs: int = 0, include_test_packets: bool = True) -> int:
         if window_secs == 0:
@@ -197,9 +366,7 @@ class FrameStats:
                 else self.cumulative_received_non_test
             )
 
-        now = datetime.now()
-        entries = [e for e in self.received if now - e.ts < timedelta(seconds=window_secs)]
-        return len(entries)
+        return self.received_window.count(window_secs)
 
     def success_rate(self, window_secs: int = 0) -> float:
         s = self.sent_count(window_secs, include_test_packets=False)
@@ -209,25 +376,19 @@ class FrameStats:
         return min(r / s, 1.0)
 
     def received_rssi_dbm(self, window_secs: int = 0) -> float:
-        if not self.received:
+        if not self.received_rssi:
             return 0
 
         if window_secs == 0:
-            return int(self.received[-1].frame.stats.rssi_dbm) if self.received else 0
-        n = datetime.now()
-        d = [
-            e.frame.stats.rssi_dbm
-            for e in self.received
-            if (n - e.ts < timedelta(seconds=window_secs))
-        ]
-        return int(sum(d) / len(d) if d else 0)
+            return int(self.received_rssi.last())
+        return int(self.received_rssi.mean(window_secs))
 
 
 @dataclass
 class MariNode:
     address: int
     gateway_address: int
-    last_seen: datetime = field(default_factory=lambda: datetime.now())
+    last_seen_ts: float = field(default_factory=time.monotonic)  # monotonic clock
     stats: FrameStats = field(default_factory=FrameStats)
     latency_stats: LatencyStats = field(default_factory=LatencyStats)
     last_reported_rx_count: int = 0
@@ -235,11 +396,27 @@ class MariNode:
     pdr_downlink: float = 0.0
     pdr_uplink: float = 0.0
 
+    @property
+    def last_seen(self) -> datetime:
+        return datetime.now() - timedelta(seconds=time.monotonic() - self.last_seen_ts)
+
+    @last_seen.setter
+    def last_seen(self, value: datetime):
+        self.last_seen_ts = time.monotonic() - (datetime.now() - value).total_seconds()
+
+    @property
+    def deadline(self) -> float:
+        """Monotonic time at which the node is considered gone if not seen again."""
+        return self.last_seen_ts + MARI_TIMEOUT_NODE_IS_ALIVE
+
     @property
     def is_alive(self) -> bool:
-        return datetime.now() - self.last_seen < timedelta(seconds=MARI_TIMEOUT_NODE_IS_ALIVE)
+        return time.monotonic() < self.deadline
+
+    def touch(self, now: float | None = None):
+        self.last_seen_ts = time.monotonic() if now is None else now
 
-    def register_received_frame(self, frame: Frame, is_test_packet: bool):
+    def register_received_frame(self, frame: Frame | FrameView, is_test_packet: bool):
         self.stats.add_received(frame, is_test_packet)
 
     def register_sent_frame(self, frame: Frame, is_test_packet: bool):
@@ -328,14 +505,31 @@ class GatewayInfo(Packet):
     def schedule_downlink_cells(self) -> int:
         return SCHEDULES.get(self.schedule_id, EMPTY_SCHEDULE_DATA)["slots"].count("D")
 
+    @property
+    def schedule_utilization(self) -> float:
+        """Fraction of the schedule cells used, as reported in `schedule_stats`."""
+        cells = self.repr_schedule_stats()
+        return cells.count("1") / len(cells) if cells else 0.0
+
 
 @dataclass
 class MariGateway:
+    """A gateway and its nodes.
+
+    `node_registry` is copied on write: adding or removing nodes, which needs
+    the owner's lock, replaces the dict, so it can be read and iterated without
+    lock. Node liveness and statistics are updated in place.
+    """
+
     info: GatewayInfo = field(default_factory=GatewayInfo)
     node_registry: dict[int, MariNode] = field(default_factory=dict)
     stats: FrameStats = field(default_factory=FrameStats)
     latency_stats: LatencyStats = field(default_factory=LatencyStats)
+    broadcast_stats: FrameStats = field(default_factory=FrameStats, repr=False)
     last_seen: datetime = field(default_factory=lambda: datetime.now())
+    # min-heap of (deadline, sequence, node), entries are checked lazily when they expire
+    _expiry_heap: list[tuple[float, int, MariNode]] = field(default_factory=list, repr=False)
+    _expiry_sequence: itertools.count = field(default_factory=itertools.count, repr=False)
 
     def __post_init__(self):
         self.last_seen = datetime.now()
@@ -352,11 +546,39 @@ class MariGateway:
     def is_alive(self) -> bool:
         return datetime.now() - self.last_seen < timedelta(seconds=MARI_TIMEOUT_GATEWAY_IS_ALIVE)
 
-    def update(self):
-        """Recurrent bookkeeping. Don't forget to call this periodically on your main loop."""
-        self.node_registry = {
-            addr: node for addr, node in self.node_registry.items() if node.is_alive
-        }
+    @property
+    def stats_memory_bytes(self) -> int:
+        """Returns the memory used by the frame statistics of the gateway and its nodes."""
+        return (
+            self.stats.memory_bytes
+            + self.broadcast_stats.memory_bytes
+            + sum(node.stats.memory_bytes for node in self.nodes)
+        )
+
+    def update(self, now: float | None = None) -> list[MariNode]:
+        """Recurrent bookkeeping. Don't forget to call this periodically on your main loop.
+
+        Removes the nodes that timed out and returns them. Only the nodes whose
+        deadline passed are looked at, a node seen since its deadline was pushed
+        is pushed again with its new deadline.
+        """
+        now = time.monotonic() if now is None else now
+        heap = self._expiry_heap
+        expired = []
+        while heap and heap[0][0] <= now:
+            _, _, node = heapq.heappop(heap)
+            if self.node_registry.get(node.address) is not node:
+                continue  # removed explicitly, or replaced by a new node with the same address
+            if node.deadline > now:
+                self._schedule_expiry(node)
+            else:
+                expired.append(node)
+        if expired:
+            registry = dict(self.node_registry)
+            for node in expired:
+                del registry[node.address]
+            self.node_registry = registry
+        return expired
 
     def set_info(self, info: GatewayInfo):
         self.info = info
@@ -367,27 +589,42 @@ class MariGateway:
 
     def add_node(self, addr: int) -> MariNode:
         if node := self.get_node(addr):
-            node.last_seen = datetime.now()
+            node.touch()
             return node
-        node = MariNode(addr, self.info.address)
-        self.node_registry[addr] = node
+        node = MariNode(addr, self.info.address, stats=FrameStats(broadcast=self.broadcast_stats))
+        self.node_registry = {**self.node_registry, addr: node}
+        self._schedule_expiry(node)
         return node
 
     def remove_node(self, addr: int) -> MariNode | None:
-        return self.node_registry.pop(addr, None)
+        if addr not in self.node_registry:
+            return None
+        registry = dict(self.node_registry)
+        node = registry.pop(addr)
+        self.node_registry = registry
+        return node
 
     def update_node_liveness(self, addr: int) -> MariNode:
         node = self.get_node(addr)
         if node:
-            node.last_seen = datetime.now()
+            node.touch()
         else:
             node = self.add_node(addr)
         return node
 
-    def register_received_frame(self, frame: Frame, is_test_packet: bool):
-        if n := self.get_node(frame.header.source):
+    def register_received_frame(self, frame: Frame | FrameView, is_test_packet: bool):
+        if n := self.get_node(frame.source):
             n.register_received_frame(frame, is_test_packet)
         self.stats.add_received(frame, is_test_packet)
 
     def register_sent_frame(self, frame: Frame, is_test_packet: bool):
+        """Counts a sent frame, for the destination node or all nodes if broadcast."""
+        if frame.header.destination == MARI_BROADCAST_ADDRESS:
+            # nodes count the broadcast frames sent since they joined on their own
+            self.broadcast_stats.add_sent(frame, is_test_packet)
+        elif n := self.get_node(frame.header.destination):
+            n.register_sent_frame(frame, is_test_packet)
         self.stats.add_sent(frame, is_test_packet)
+
+    def _schedule_expiry(self, node: MariNode):
+        heapq.heappush(self._expiry_heap, (node.deadline, next(self._expiry_sequence), node))
@@ -0,0 +1,133 @@
+"""Batches of edge events, published to the cloud as a single MQTT message.
+
+A batch starts with a header, magic and format version, followed by each event
+prefixed by its length on 2 bytes, little endian. The magic can't be the first
+byte of an event, which is its EdgeEvent, so a receiver tells batches from
+single events and both kinds of publishers can share a topic.
+"""
+
+import struct
+import threading
+import time
+from typing import Callable, Iterator
+
+MQTT_BATCH_MAGIC = b"MB"
+MQTT_BATCH_VERSION = 1
+MQTT_BATCH_MAX_BYTES = 4096  # before base64 encoding
+MQTT_BATCH_LINGER = 0.05  # seconds an event waits for others to join its batch
+
+_BATCH_HEADER = struct.Struct("<2sB")
+_EVENT_LENGTH = struct.Struct("<H")
+
+
+class MQTTBatchError(Exception):
+    """Raised when a batch is truncated, or of an unsupported version."""
+
+
+def is_batch(data: bytes) -> bool:
+    return data[:2] == MQTT_BATCH_MAGIC
+
+
+def unpack_batch(data: bytes) -> Iterator[bytes]:
+    """Yields the events of a batch.
+
+    >>> list(unpack_batch(b"MB\\x01\\x02\\x00\\x03A\\x01\\x00\\x04"))
+    [b'\\x03A', b'\\x04']
+    """
+    if len(data) < _BATCH_HEADER.size:
+        raise MQTTBatchError("Batch too short")
+    magic, version = _BATCH_HEADER.unpack_from(data)
+    if magic != MQTT_BATCH_MAGIC:
+        raise MQTTBatchError("Not a batch")
+    if version != MQTT_BATCH_VERSION:
+        raise MQTTBatchError(f"Unsupported batch version {version}")
+    pos = _BATCH_HEADER.size
+    while pos < len(data):
+        if pos + _EVENT_LENGTH.size > len(data):
+            raise MQTTBatchError("Truncated batch")
+        (length,) = _EVENT_LENGTH.unpack_from(data, pos)
+        pos += _EVENT_LENGTH.size
+        if pos + length > len(data):
+            raise MQTTBatchError("Truncated batch")
+        yield bytes(data[pos : pos + length])
+        pos += length
+
+
+class MQTTBatcher:
+    """Packs events in batches, published with `publish(batch)`.
+
+    A batch is published when the next event would make it larger than
+    `max_bytes`, or `linger` seconds after its first event, by a thread of the
+    batcher. Batches are published in order, with the lock of the batcher held.
+    """
+
+    def __init__(
+        self,
+        publish: Callable[[bytes], None],
+        max_bytes: int = MQTT_BATCH_MAX_BYTES,
+        linger: float = MQTT_BATCH_LINGER,
+    ):
+        self.max_bytes = max_bytes
+        self.linger = linger
+        self.events = 0
+        self.batches = 0
+        self._publish = publish
+        self._buffer = bytearray()
+        self._deadline: float | None = None
+        self._condition = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="marilib-mqtt-batch", daemon=True)
+        self._thread.start()
+
+    def add(self, data: bytes):
+        """Queues an event, raises ValueError if it can't fit in a batch or if closed."""
+        if len(data) > 0xFFFF:
+            raise ValueError(f"Event too large for a batch: {len(data)} bytes")
+        with self._condition:
+            if not self._running:
+                raise ValueError("Batcher closed")
+            if len(self._buffer) + _EVENT_LENGTH.size + len(data) > self.max_bytes:
+                self._flush()
+            if not self._buffer:
+                self._buffer += _BATCH_HEADER.pack(MQTT_BATCH_MAGIC, MQTT_BATCH_VERSION)
+                self._deadline = time.monotonic() + self.linger
+                self._condition.notify()
+            self._buffer += _EVENT_LENGTH.pack(len(data))
+            self._buffer += data
+            self.events += 1
+
+    def flush(self):
+        """Publishes the pending events now."""
+        with self._condition:
+            self._flush()
+
+    def close(self):
+        """Publishes the pending events and stops the thread."""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
+
+    @property
+    def events_per_batch(self) -> float:
+        return self.events / self.batches if self.batches else 0.0
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        batch = bytes(self._buffer)
+        self._buffer.clear()
+        self._deadline = None
+        self.batches += 1
+        self._publish(batch)
+
+    def _run(self):
+        with self._condition:
+            while self._running:
+                if self._deadline is None:
+                    self._condition.wait()
+                elif (delay := self._deadline - time.monotonic()) > 0:
+                    self._condition.wait(delay)
+                else:
+                    self._flush()
+            self._flush()
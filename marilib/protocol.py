@@ -1,6 +1,8 @@
 # TODO: import this from like PyDotBot or similar
 
 import dataclasses
+import functools
+import struct
 import typing
 from abc import ABC
 from dataclasses import dataclass
@@ -36,15 +38,118 @@ class PacketFieldMetadata:
             self.disp = self.name
 
 
+# struct format characters of little endian integers, by (length, signed)
+_INT_FORMATS = {
+    (1, False): "B",
+    (1, True): "b",
+    (2, False): "H",
+    (2, True): "h",
+    (4, False): "I",
+    (4, True): "i",
+    (8, False): "Q",
+    (8, True): "q",
+}
+
+
+@dataclass(frozen=True)
+class PacketLayout:
+    """Precompiled layout of a packet class made of fixed size fields only."""
+
+    codec: struct.Struct
+    names: tuple[str, ...]
+    # (position, signed) of integers that don't fit a struct format character,
+    # they are packed as raw bytes and converted separately
+    wide_ints: tuple[tuple[int, bool], ...]
+
+
+@functools.lru_cache(maxsize=None)
+def packet_layout(cls: type) -> PacketLayout | None:
+    """Returns the compiled layout of a packet class, None if it has variable size fields."""
+    fields = dataclasses.fields(cls)
+    if not fields or fields[0].name != "metadata":
+        raise ValueError("metadata must be defined first")
+    metadata = fields[0].default_factory()
+    field_names = [field.name for field in fields]
+    formats = ["<"]
+    wide_ints = []
+    for idx, field in enumerate(fields[1:]):
+        field_metadata = metadata[idx]
+        if field_metadata.type_ is list:
+            return None
+        if field_metadata.type_ in [bytes, bytearray]:
+            if "count" in field_names:
+                return None
+            formats.append(f"{field_metadata.length}s")
+        elif (field_metadata.length, field_metadata.signed) in _INT_FORMATS:
+            formats.append(_INT_FORMATS[(field_metadata.length, field_metadata.signed)])
+        else:
+            formats.append(f"{field_metadata.length}s")
+            wide_ints.append((idx, field_metadata.signed))
+    return PacketLayout(
+        codec=struct.Struct("".join(formats)),
+        names=tuple(field.name for field in fields[1:]),
+        wide_ints=tuple(wide_ints),
+    )
+
+
 @dataclass
 class Packet(ABC):
-    """Base class for packet classes."""
+    """Base class for packet classes.
+
+    Packets made of fixed size fields are parsed and serialized with a
+    `struct.Struct` compiled once per class, the others field by field.
+    """
 
     @property
     def size(self) -> int:
+        if layout := packet_layout(type(self)):
+            return layout.codec.size
         return sum(field.length for field in self.metadata)
 
-    def from_bytes(self, bytes_):
+    def from_bytes(self, bytes_, offset: int = 0):
+        """Parses the packet from `bytes_`, starting at `offset`."""
+        layout = packet_layout(type(self))
+        if layout is None:
+            return self._from_bytes_fields(bytes_[offset:] if offset else bytes_)
+        if len(bytes_) - offset < layout.codec.size:
+            raise ValueError("Not enough bytes to parse")
+        values = layout.codec.unpack_from(bytes_, offset)
+        if layout.wide_ints:
+            values = list(values)
+            for idx, signed in layout.wide_ints:
+                values[idx] = int.from_bytes(values[idx], byteorder="little", signed=signed)
+        self.__dict__.update(zip(layout.names, values))
+        return self
+
+    def to_bytes(self, byteorder="little") -> bytes:
+        layout = packet_layout(type(self))
+        if layout is None or byteorder != "little":
+            return self._to_bytes_fields(byteorder)
+        return layout.codec.pack(*self._layout_values(layout))
+
+    def pack_into(self, buffer: bytearray, offset: int = 0) -> int:
+        """Writes the packet in `buffer` at `offset`, returns the offset that follows it."""
+        layout = packet_layout(type(self))
+        if layout is None:
+            bytes_ = self._to_bytes_fields()
+            buffer[offset : offset + len(bytes_)] = bytes_
+            return offset + len(bytes_)
+        layout.codec.pack_into(buffer, offset, *self._layout_values(layout))
+        return offset + layout.codec.size
+
+    def _layout_values(self, layout: PacketLayout) -> list:
+        values = [getattr(self, name) for name in layout.names]
+        if layout.wide_ints:
+            metadata = self.metadata
+            for idx, signed in layout.wide_ints:
+                # raw bytes are packed as they are, struct pads them to the field length
+                if not isinstance(values[idx], (bytes, bytearray)):
+                    values[idx] = int(values[idx]).to_bytes(
+                        length=metadata[idx].length, byteorder="little", signed=signed
+                    )
+        return values
+
+    def _from_bytes_fields(self, bytes_):
         fields = dataclasses.fields(self)
         # base class makes metadata attribute mandatory so there's at least one
         # field defined in subclasses
@@ -90,7 +195,7 @@ class Packet(ABC):
                 bytes_ = bytes_[length:]
         return self
 
-    def to_bytes(self, byteorder="little") -> bytes:
+    def _to_bytes_fields(self, byteorder="little") -> bytes:
         buffer = bytearray()
         metadata = dataclasses.fields(self)[0].default_factory()
         for idx, field in enumerate(dataclasses.fields(self)[1:]):
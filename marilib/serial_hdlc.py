@@ -56,21 +56,44 @@ def _fcs_update(fcs, byte):
     return (fcs >> 8) ^ FCS16TAB[((fcs ^ ord(byte)) & 0xFF)]
 
 
-def _to_byte(value):
-    return int(value).to_bytes(1, "little")
+def _fcs_compute(data, fcs=HDLC_FCS_INIT) -> int:
+    """Compute the FCS of a whole buffer, iterating over it without copying."""
+    table = FCS16TAB
+    for byte in memoryview(data).cast("B"):
+        fcs = (fcs >> 8) ^ table[(fcs ^ byte) & 0xFF]
+    return fcs
 
 
-def _escape_byte(byte) -> bytes:
-    result = bytearray()
-    if byte == HDLC_ESCAPE:
-        result += HDLC_ESCAPE
-        result += HDLC_ESCAPE_ESCAPED
-    elif byte == HDLC_FLAG:
-        result += HDLC_ESCAPE
-        result += HDLC_FLAG_ESCAPED
-    else:
-        result += byte
-    return result
+def _hdlc_escape(data: bytes) -> bytes:
+    """Escape flag and escape bytes of a buffer in a single pass each."""
+    if HDLC_FLAG not in data and HDLC_ESCAPE not in data:
+        return data
+    # escape bytes must be processed first so the ones added for flags are kept
+    return data.replace(HDLC_ESCAPE, HDLC_ESCAPE + HDLC_ESCAPE_ESCAPED).replace(
+        HDLC_FLAG, HDLC_ESCAPE + HDLC_FLAG_ESCAPED
+    )
+
+
+_UNESCAPE = {
+    HDLC_ESCAPE_ESCAPED: HDLC_ESCAPE,
+    HDLC_FLAG_ESCAPED: HDLC_FLAG,
+}
+
+
+def _hdlc_unescape(data: bytes) -> bytes:
+    """Remove escaping from the content of a frame (without its flags).
+
+    Behaves like the byte by byte decoder on malformed input: an escape byte
+    followed by an unexpected byte drops both.
+    """
+    if HDLC_ESCAPE not in data:
+        return data
+    parts = bytes(data).split(HDLC_ESCAPE)
+    chunks = [parts[0]]
+    for part in parts[1:]:
+        chunks.append(_UNESCAPE.get(part[:1], b""))
+        chunks.append(part[1:])
+    return b"".join(chunks)
 
 
 def hdlc_encode(payload: bytes) -> bytes:
@@ -92,26 +115,11 @@ def hdlc_encode(payload: bytes) -> bytes:
     >>> hdlc_encode(b"'$W\\x82")
     bytearray(b"~\\'$W\\x82\\x13}]~")
     """
-    # initialize output buffer
-    hdlc_frame = bytearray()
-
-    # initialize frame check sequence
-    fcs = HDLC_FCS_INIT
-
-    # add start flag
-    hdlc_frame += HDLC_FLAG
-
-    # write payload in frame
-    for byte in payload:
-        fcs = _fcs_update(fcs, _to_byte(byte))
-        hdlc_frame += _escape_byte(_to_byte(byte))
-    fcs = 0xFFFF - fcs
+    fcs = 0xFFFF - _fcs_compute(payload)
 
-    # add FCS
-    hdlc_frame += _escape_byte(_to_byte(fcs & 0xFF))
-    hdlc_frame += _escape_byte(_to_byte((fcs & 0xFF00) >> 8))
-
-    # add end flag
+    hdlc_frame = bytearray(HDLC_FLAG)
+    hdlc_frame += _hdlc_escape(payload)
+    hdlc_frame += _hdlc_escape(bytes((fcs & 0xFF, (fcs & 0xFF00) >> 8)))
     hdlc_frame += HDLC_FLAG
 
     return hdlc_frame
@@ -143,29 +151,12 @@ def hdlc_decode(frame: bytes) -> bytes:
     Traceback (most recent call last):
     marilib.serial_hdlc.HDLCDecodeException: Invalid payload
     """
-    output = bytearray()
-    fcs = HDLC_FCS_INIT
-    escape_byte = False
-    for byte in frame[1:-1]:
-        byte = _to_byte(byte)
-        if byte == HDLC_ESCAPE:
-            escape_byte = True
-        elif escape_byte is True:
-            if byte == HDLC_ESCAPE_ESCAPED:
-                output += HDLC_ESCAPE
-                fcs = _fcs_update(fcs, HDLC_ESCAPE)
-            elif byte == HDLC_FLAG_ESCAPED:
-                output += HDLC_FLAG
-                fcs = _fcs_update(fcs, HDLC_FLAG)
-            escape_byte = False
-        else:
-            output += byte
-            fcs = _fcs_update(fcs, byte)
+    output = _hdlc_unescape(bytes(frame[1:-1]))
     if len(output) < 2:
         raise HDLCDecodeException("Invalid payload")
-    if fcs != HDLC_FCS_OK:
+    if _fcs_compute(output) != HDLC_FCS_OK:
         raise HDLCDecodeException("Invalid FCS")
-    return output[:-2]
+    return bytearray(output[:-2])
 
 
 class HDLCState(Enum):
@@ -177,13 +168,24 @@ class HDLCState(Enum):
 
 
 class HDLCHandler:
-    """Handles the reception of an HDLC frame byte by byte."""
+    """Handles the reception of HDLC frames, either byte by byte or by chunks.
+
+    `handle_byte` and `feed` keep separate states, use only one of them on a
+    given stream.
+
+    `decoded`, `invalid_fcs` and `invalid_payload` count the frames received.
+    """
 
     def __init__(self):
         self.state = HDLCState.IDLE
         self.fcs = HDLC_FCS_INIT
         self.output = bytearray()
         self.escape_byte = False
+        self._buffer = bytearray()
+        self._in_frame = False
+        self.decoded = 0
+        self.invalid_fcs = 0
+        self.invalid_payload = 0
         self._logger = logging.getLogger(__name__)
 
     @property
@@ -194,12 +196,15 @@ class HDLCHandler:
 
         self.state = HDLCState.IDLE
         if len(self.output) < 2:
+            self.invalid_payload += 1
             self._logger.error("Invalid payload")
             return bytearray()
         if self.fcs != HDLC_FCS_OK:
+            self.invalid_fcs += 1
             self._logger.error("Invalid FCS")
             return bytearray()
         self.fcs = HDLC_FCS_INIT
+        self.decoded += 1
         return self.output[:-2]
 
     def handle_byte(self, byte):
@@ -226,3 +231,55 @@ class HDLCHandler:
             else:
                 self.output += byte
                 self.fcs = _fcs_update(self.fcs, byte)
+
+    def feed(self, chunk: bytes) -> list[bytes]:
+        """Handle a chunk of received bytes and return the payloads of all complete frames.
+
+        An incomplete frame at the end of the chunk is kept until the next call.
+        Frames with an invalid FCS or payload are logged and skipped.
+
+        >>> handler = HDLCHandler()
+        >>> handler.feed(b"~test\\x88\\x07~~}^test}]\\x06")
+        [b'test']
+        >>> handler.feed(b"\\x94~")
+        [b'~test}']
+        """
+        buffer = self._buffer
+        buffer += chunk
+        payloads = []
+        pos = 0
+        while True:
+            if not self._in_frame:
+                start = buffer.find(HDLC_FLAG, pos)
+                if start < 0:
+                    pos = len(buffer)
+                    break
+                pos = start + 1
+                self._in_frame = True
+            end = buffer.find(HDLC_FLAG, pos)
+            if end < 0:
+                break
+            if end == pos:
+                # consecutive flags, the last one starts the frame
+                pos = end + 1
+                continue
+            payload = self._decode_frame(buffer[pos:end])
+            if payload is not None:
+                payloads.append(payload)
+            pos = end + 1
+            self._in_frame = False
+        del buffer[:pos]
+        return payloads
+
+    def _decode_frame(self, content: bytes) -> bytes | None:
+        output = _hdlc_unescape(bytes(content))
+        if len(output) < 2:
+            self.invalid_payload += 1
+            self._logger.error("Invalid payload")
+            return None
+        if _fcs_compute(output) != HDLC_FCS_OK:
+            self.invalid_fcs += 1
+            self._logger.error("Invalid FCS")
+            return None
+        self.decoded += 1
+        return output[:-2]
@@ -7,60 +7,242 @@
 """Serial interface."""
 
 import logging
+import queue
 import sys
 import threading
 import time
+from dataclasses import dataclass, field
 from typing import Callable
 
 import serial
 from serial.tools import list_ports
 
-SERIAL_PAYLOAD_CHUNK_SIZE = 64
-SERIAL_PAYLOAD_CHUNK_DELAY = 0.002  # 2 ms
+SERIAL_GATEWAY_RX_BUFFER_SIZE = 64  # bytes the gateway UART can take in a single burst
+SERIAL_GATEWAY_RX_DRAIN_TIME = 0.002  # seconds the gateway takes to process a full RX buffer
+SERIAL_BITS_PER_BYTE = 10  # 8N1: start bit + 8 data bits + stop bit
 SERIAL_DEFAULT_PORT = "/dev/ttyACM0"
 SERIAL_DEFAULT_BAUDRATE = 1_000_000
+SERIAL_READ_SIZE_MAX = 4096
+SERIAL_TX_QUEUE_SIZE = 1024  # frames
+SERIAL_STATS_INTERVAL = 1.0  # seconds
 
 
-def get_default_port():
-    """Return default serial port."""
+def get_default_ports() -> list[str]:
+    """Return all the JLink serial ports available, or all serial ports on Windows."""
     ports = [port for port in list_ports.comports()]
     if sys.platform != "win32":
         ports = sorted([port for port in ports if "J-Link" == port.product])
+    return [port.device for port in ports]
+
+
+def get_default_port():
+    """Return default serial port."""
+    ports = get_default_ports()
     if not ports:
         return SERIAL_DEFAULT_PORT
     # return first JLink port available
-    return ports[0].device
+    return ports[0]
 
 
 class SerialInterfaceException(Exception):
     """Exception raised when serial port is disconnected."""
 
 
+@dataclass
+class SerialStats:
+    """Counters of the serial link activity."""
+
+    reads: int = 0
+    bytes_read: int = 0
+    reads_per_second: float = 0.0
+    bytes_read_per_second: float = 0.0
+    writes: int = 0
+    bytes_written: int = 0
+    write_drops: int = 0
+    write_queue_wait_last_ms: float = 0.0
+    write_queue_wait_max_ms: float = 0.0
+    _write_queue_wait_total_ms: float = field(default=0.0, repr=False)
+    _interval_start: float = field(default_factory=time.monotonic, repr=False)
+    _interval_reads: int = field(default=0, repr=False)
+    _interval_bytes: int = field(default=0, repr=False)
+
+    @property
+    def bytes_per_read(self) -> float:
+        return self.bytes_read / self.reads if self.reads else 0.0
+
+    @property
+    def write_queue_wait_avg_ms(self) -> float:
+        return self._write_queue_wait_total_ms / self.writes if self.writes else 0.0
+
+    def add_write(self, size: int, queue_wait_secs: float):
+        """Account for a frame written after waiting `queue_wait_secs` in the TX queue."""
+        wait_ms = queue_wait_secs * 1000
+        self.writes += 1
+        self.bytes_written += size
+        self.write_queue_wait_last_ms = wait_ms
+        self.write_queue_wait_max_ms = max(self.write_queue_wait_max_ms, wait_ms)
+        self._write_queue_wait_total_ms += wait_ms
+
+    def add_read(self, size: int):
+        """Account for a read of `size` bytes, rates are refreshed every interval."""
+        self.reads += 1
+        self.bytes_read += size
+        self._interval_reads += 1
+        self._interval_bytes += size
+        now = time.monotonic()
+        elapsed = now - self._interval_start
+        if elapsed >= SERIAL_STATS_INTERVAL:
+            self.reads_per_second = self._interval_reads / elapsed
+            self.bytes_read_per_second = self._interval_bytes / elapsed
+            self._interval_start = now
+            self._interval_reads = 0
+            self._interval_bytes = 0
+
+
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens per second, holding at most `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self._last_refill = time.monotonic()
+
+    def reserve(self, size: float, now: float | None = None) -> float:
+        """Takes `size` tokens, returns how long to wait before they are actually available."""
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+        self.tokens -= size
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+def gateway_tx_bucket(
+    baudrate: int,
+    buffer_size: int = SERIAL_GATEWAY_RX_BUFFER_SIZE,
+    drain_time: float = SERIAL_GATEWAY_RX_DRAIN_TIME,
+) -> TokenBucket:
+    """Token bucket of the bytes written to the gateway.
+
+    It holds one RX buffer of the gateway, and refills at the rate the gateway
+    drains it, or at the line rate if slower: after a full buffer, the next
+    chunk waits for `drain_time`.
+    """
+    rate = min(baudrate / SERIAL_BITS_PER_BYTE, buffer_size / drain_time)
+    return TokenBucket(rate, buffer_size)
+
+
+class SerialWriter(threading.Thread):
+    """Writes queued frames on serial, paced by `gateway_tx_bucket`.
+
+    Frames are written in chunks of the gateway RX buffer size, and a chunk
+    only waits when the gateway has not drained the previous ones yet.
+    """
+
+    def __init__(
+        self,
+        serial_: serial.Serial,
+        baudrate: int,
+        stats: SerialStats,
+        buffer_size: int = SERIAL_GATEWAY_RX_BUFFER_SIZE,
+        queue_size: int = SERIAL_TX_QUEUE_SIZE,
+    ):
+        self.serial = serial_
+        self.stats = stats
+        self.buffer_size = buffer_size
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.bucket = gateway_tx_bucket(baudrate, buffer_size)
+        super().__init__(daemon=True)
+        self._logger = logging.getLogger(__name__)
+        self.start()
+
+    @property
+    def queue_depth(self) -> int:
+        return self.queue.qsize()
+
+    def put(self, bytes_: bytes) -> bool:
+        """Queue a frame for writing, without blocking. Returns False if the queue is full."""
+        try:
+            self.queue.put_nowait((time.monotonic(), bytes_))
+        except queue.Full:
+            self.stats.write_drops += 1
+            self._logger.warning("Serial TX queue full, frame dropped")
+            return False
+        return True
+
+    def stop(self):
+        self.queue.put(None)
+        self.join()
+
+    def run(self):
+        while 1:
+            item = self.queue.get()
+            if item is None:
+                break
+            queued_ts, bytes_ = item
+            queue_wait = time.monotonic() - queued_ts
+            data = memoryview(bytes_)
+            try:
+                for pos in range(0, len(data), self.buffer_size):
+                    chunk = data[pos : pos + self.buffer_size]
+                    if delay := self.bucket.reserve(len(chunk)):
+                        time.sleep(delay)
+                    self.serial.write(chunk)
+            except (TypeError, OSError, serial.serialutil.SerialException) as exc:
+                self._logger.error(f"Serial write failed: {exc}")
+                continue
+            self.stats.add_write(len(data), queue_wait)
+
+
 class SerialInterface(threading.Thread):
-    """Bidirectional serial interface."""
+    """Bidirectional serial interface.
+
+    The callback is called with chunks of received bytes: everything available
+    on the port, up to `max_read_size` bytes. Use `max_read_size=1` to receive
+    the bytes one by one.
 
-    def __init__(self, port: str, baudrate: int, callback: Callable):
+    Writes are queued and performed by a dedicated `SerialWriter` thread.
+    """
+
+    def __init__(
+        self,
+        port: str,
+        baudrate: int,
+        callback: Callable[[bytes], None],
+        max_read_size: int = SERIAL_READ_SIZE_MAX,
+        tx_queue_size: int = SERIAL_TX_QUEUE_SIZE,
+    ):
         self.lock = threading.Lock()
         self.callback = callback
+        self.max_read_size = max(1, max_read_size)
+        self.stats = SerialStats()
         self.serial = serial.Serial(port, baudrate)
+        self.writer = SerialWriter(self.serial, baudrate, self.stats, queue_size=tx_queue_size)
         super().__init__(daemon=True)
         self._logger = logging.getLogger(__name__)
         self.start()
         self._logger.info("Serial port thread started")
 
+    @property
+    def tx_queue_depth(self) -> int:
+        return self.writer.queue_depth
+
     def run(self):
-        """Listen continuously at each byte received on serial."""
+        """Listen continuously to the bytes received on serial."""
         self.serial.flush()
         try:
             while 1:
                 try:
-                    byte = self.serial.read(1)
-                except (TypeError, serial.serialutil.SerialException):
-                    byte = None
-                if byte is None:
+                    # block until at least one byte is there, then get all that's waiting
+                    size = min(max(1, self.serial.in_waiting), self.max_read_size)
+                    data = self.serial.read(size)
+                except (TypeError, OSError, serial.serialutil.SerialException):
+                    data = None
+                if data is None:
                     self._logger.info("Serial port disconnected")
                     break
-                self.callback(byte)
+                self.stats.add_read(len(data))
+                self.callback(data)
         except serial.serialutil.PortNotOpenError as exc:
             self._logger.error(f"{exc}")
             raise SerialInterfaceException(f"{exc}") from exc
@@ -69,16 +251,10 @@ class SerialInterface(threading.Thread):
             raise SerialInterfaceException(f"{exc}") from exc
 
     def stop(self):
+        self.writer.stop()
         self.serial.close()
         self.join()
 
-    def write(self, bytes_):
-        """Write bytes on serial."""
-        # Send 64 bytes at a time
-        pos = 0
-        while (pos % SERIAL_PAYLOAD_CHUNK_SIZE) == 0 and pos < len(bytes_):
-            self.serial.write(bytes_[pos : pos + SERIAL_PAYLOAD_CHUNK_SIZE])
-            self.serial.flush()
-            pos += SERIAL_PAYLOAD_CHUNK_SIZE
-            time.sleep(SERIAL_PAYLOAD_CHUNK_DELAY)
-        # self.serial.flush()
+    def write(self, bytes_) -> bool:
+        """Queue bytes to be written on serial, returns False if the TX queue is full."""
+        return self.writer.put(bytes_)
@@ -0,0 +1,311 @@
+"""Simulated Mari gateway, behind a pseudo terminal.
+
+The simulator speaks the serial protocol of a real gateway, HDLC framed
+EdgeEvents, so a `SerialAdapter` connects to its port unchanged: it sends
+GATEWAY_INFO periodically, NODE_JOINED, NODE_KEEP_ALIVE and NODE_LEFT for its
+virtual nodes, and NODE_DATA at their rates, with a random RSSI. The latency
+probes sent to a virtual node are echoed back, like a node does.
+
+Run it with `python -m marilib.simulator --nodes 100`, it prints its port.
+"""
+
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+
+import click
+from rich import print
+
+from marilib.latency import LATENCY_PACKET_MAGIC
+from marilib.mari_protocol import (
+    MARI_BROADCAST_ADDRESS,
+    MARI_NET_ID_DEFAULT,
+    Frame,
+    Header,
+    HeaderStats,
+)
+from marilib.model import SCHEDULES, EdgeEvent, GatewayInfo, NodeInfoEdge
+from marilib.protocol import ProtocolPayloadParserException
+from marilib.serial_hdlc import HDLCHandler, hdlc_encode
+
+SIMULATOR_GATEWAY_ADDRESS = 0x5A5A000000000001
+SIMULATOR_NODE_ADDRESS_BASE = 0x5A5A100000000000
+SIMULATOR_INFO_INTERVAL = 1.0  # seconds between two GATEWAY_INFO
+SIMULATOR_KEEP_ALIVE_INTERVAL = 1.0  # seconds, below the node timeout of the edge
+SIMULATOR_TICK = 0.005  # seconds, resolution of the frame timings
+SIMULATOR_MAX_PENDING = 1 << 20  # bytes waiting for the reader before frames are dropped
+SIMULATOR_READ_SIZE = 4096
+
+_NODE_DATA = 0x01  # prefix of the frames sent by the edge
+
+
+def dbm_to_rssi(dbm: int) -> int:
+    """Inverse of `rssi_to_dbm`, the RSSI byte of a frame header."""
+    return dbm + 255 if dbm < 0 else dbm
+
+
+@dataclass
+class SimulatorStats:
+    """Counters of the simulated gateway."""
+
+    frames_sent: int = 0
+    bytes_sent: int = 0
+    frames_dropped: int = 0  # not read by the edge fast enough
+    frames_received: int = 0
+    frames_invalid: int = 0  # downlink frames that could not be parsed, dropped
+    probes_echoed: int = 0
+
+
+@dataclass
+class VirtualNode:
+    address: int
+    rate: float  # NODE_DATA frames per second, 0 for keep alives only
+    rssi_dbm: float
+    rssi_stddev: float
+    sequence: int = 0  # unique to each join, the events of a node that left are ignored
+    joined: bool = field(default=False, repr=False)
+
+
+class GatewaySimulator:
+    """A gateway with virtual nodes, on the port `port` while started.
+
+    Each node sends NODE_DATA frames as a Poisson process of rate `rate`, with
+    an RSSI drawn from a normal distribution around `rssi_dbm`.
+    """
+
+    def __init__(
+        self,
+        nodes: int = 10,
+        schedule_id: int = 6,
+        rate: float = 1.0,
+        rssi_dbm: float = -60,
+        rssi_stddev: float = 5,
+        payload_size: int = 16,
+        address: int = SIMULATOR_GATEWAY_ADDRESS,
+        network_id: int = MARI_NET_ID_DEFAULT,
+        seed: int | None = None,
+    ):
+        if schedule_id not in SCHEDULES:
+            raise ValueError(f"Unknown schedule {schedule_id}")
+        self.schedule_id = schedule_id
+        self.rate = rate
+        self.rssi_dbm = rssi_dbm
+        self.rssi_stddev = rssi_stddev
+        self.payload = bytes(payload_size)
+        self.address = address
+        self.network_id = network_id
+        self.stats = SimulatorStats()
+        self.nodes: dict[int, VirtualNode] = {}
+        self._random = random.Random(seed)
+        self._events: list[tuple[float, int, int, str]] = []  # (due, sequence, address, kind)
+        self._sequences = itertools.count()
+        self._lock = threading.Lock()
+        self._pending = bytearray()
+        self._hdlc_handler = HDLCHandler()
+        self._running = False
+        self._thread: threading.Thread | None = None
+        # not available on Windows, where the module must still import
+        import pty
+        import tty
+
+        self.fd, self.port_fd = pty.openpty()
+        tty.setraw(self.port_fd)
+        os.set_blocking(self.fd, False)
+        self.port = os.ttyname(self.port_fd)
+        for index in range(nodes):
+            self.add_node(SIMULATOR_NODE_ADDRESS_BASE + index)
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="marilib-simulator", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+
+    def close(self):
+        self.stop()
+        os.close(self.fd)
+        os.close(self.port_fd)
+
+    @property
+    def info(self) -> GatewayInfo:
+        return GatewayInfo(
+            address=self.address, network_id=self.network_id, schedule_id=self.schedule_id
+        )
+
+    def add_node(
+        self, address: int, rate: float | None = None, rssi_dbm: float | None = None
+    ) -> VirtualNode:
+        """Adds a node, which joins right away, with the simulator defaults if not given."""
+        with self._lock:
+            if node := self.nodes.get(address):
+                return node
+            node = self.nodes[address] = VirtualNode(
+                address,
+                self.rate if rate is None else rate,
+                self.rssi_dbm if rssi_dbm is None else rssi_dbm,
+                self.rssi_stddev,
+                next(self._sequences),
+            )
+            self._push(time.monotonic(), node, "join")
+        return node
+
+    def remove_node(self, address: int):
+        """Makes a node leave the network."""
+        with self._lock:
+            node = self.nodes.pop(address, None)
+            if node is not None and node.joined:
+                self._emit(EdgeEvent.NODE_LEFT, NodeInfoEdge(address=address).to_bytes())
+
+    # ============================ Simulation ==================================
+
+    def _push(self, due: float, node: VirtualNode, kind: str):
+        heapq.heappush(self._events, (due, node.sequence, node.address, kind))
+
+    def _emit(self, event: EdgeEvent, payload: bytes):
+        data = hdlc_encode(EdgeEvent.to_bytes(event) + payload)
+        if len(self._pending) + len(data) > SIMULATOR_MAX_PENDING:
+            self.stats.frames_dropped += 1
+            return
+        self._pending += data
+        self.stats.frames_sent += 1
+        self.stats.bytes_sent += len(data)
+
+    def _node_frame(self, node: VirtualNode, payload: bytes) -> bytes:
+        rssi_dbm = round(self._random.gauss(node.rssi_dbm, node.rssi_stddev))
+        rssi_dbm = max(-127, min(0, rssi_dbm))
+        return Frame(
+            Header(destination=self.address, source=node.address, network_id=self.network_id),
+            stats=HeaderStats(rssi=dbm_to_rssi(rssi_dbm)),
+            payload=payload,
+        ).to_bytes()
+
+    def _run_due_events(self, now: float):
+        with self._lock:
+            while self._events and self._events[0][0] <= now:
+                due, sequence, address, kind = heapq.heappop(self._events)
+                node = self.nodes.get(address)
+                if node is None or node.sequence != sequence:
+                    continue  # the node left
+                if kind == "join":
+                    node.joined = True
+                    self._emit(EdgeEvent.NODE_JOINED, NodeInfoEdge(address=address).to_bytes())
+                    self._push(now + SIMULATOR_KEEP_ALIVE_INTERVAL, node, "keep_alive")
+                    if node.rate > 0:
+                        self._push(now + self._random.expovariate(node.rate), node, "data")
+                elif kind == "keep_alive":
+                    self._emit(EdgeEvent.NODE_KEEP_ALIVE, NodeInfoEdge(address=address).to_bytes())
+                    self._push(due + SIMULATOR_KEEP_ALIVE_INTERVAL, node, "keep_alive")
+                elif kind == "data":
+                    self._emit(EdgeEvent.NODE_DATA, self._node_frame(node, self.payload))
+                    # catch up from the due time, so the rate holds under load
+                    self._push(due + self._random.expovariate(node.rate), node, "data")
+
+    def _handle_downlink(self, data: bytes):
+        if len(data) < 1 or data[0] != _NODE_DATA:
+            return
+        self.stats.frames_received += 1
+        try:
+            frame = Frame().from_bytes(data, 1)
+        except (ValueError, ProtocolPayloadParserException):
+            self.stats.frames_invalid += 1
+            return
+        if frame.header.destination == MARI_BROADCAST_ADDRESS:
+            return
+        if frame.payload[: len(LATENCY_PACKET_MAGIC)] != LATENCY_PACKET_MAGIC:
+            return
+        with self._lock:
+            node = self.nodes.get(frame.header.destination)
+            if node is not None and node.joined:
+                self._emit(EdgeEvent.NODE_DATA, self._node_frame(node, frame.payload))
+                self.stats.probes_echoed += 1
+
+    def _read_downlink(self):
+        while True:
+            try:
+                chunk = os.read(self.fd, SIMULATOR_READ_SIZE)
+            except (BlockingIOError, OSError):
+                return
+            if not chunk:
+                return
+            for payload in self._hdlc_handler.feed(chunk):
+                self._handle_downlink(payload)
+
+    def _flush(self):
+        with self._lock:
+            if not self._pending:
+                return
+            try:
+                written = os.write(self.fd, self._pending)
+            except (BlockingIOError, OSError):
+                return
+            del self._pending[:written]
+
+    def _run(self):
+        next_info = time.monotonic()
+        while self._running:
+            now = time.monotonic()
+            if now >= next_info:
+                with self._lock:
+                    self._emit(EdgeEvent.GATEWAY_INFO, self.info.to_bytes())
+                next_info = now + SIMULATOR_INFO_INTERVAL
+            self._run_due_events(now)
+            self._read_downlink()
+            self._flush()
+            time.sleep(SIMULATOR_TICK)
+
+
+@click.command()
+@click.option("--nodes", "-n", default=10, show_default=True, help="Number of virtual nodes.")
+@click.option(
+    "--schedule",
+    "-s",
+    "schedule_id",
+    default=6,
+    show_default=True,
+    type=click.Choice([str(schedule_id) for schedule_id in SCHEDULES]),
+    help="Schedule announced by the gateway.",
+)
+@click.option("--rate", "-r", default=1.0, show_default=True, help="Frames per second per node.")
+@click.option("--rssi", default=-60.0, show_default=True, help="Mean RSSI of the frames, in dBm.")
+@click.option("--rssi-stddev", default=5.0, show_default=True, help="RSSI standard deviation.")
+@click.option("--payload-size", default=16, show_default=True, help="Bytes of NODE_DATA payload.")
+@click.option("--seed", type=int, default=None, help="Seed of the random generator.")
+def main(
+    nodes: int,
+    schedule_id: str,
+    rate: float,
+    rssi: float,
+    rssi_stddev: float,
+    payload_size: int,
+    seed: int | None,
+):
+    """Simulates a Mari gateway and its nodes on a pseudo terminal."""
+    simulator = GatewaySimulator(
+        nodes, int(schedule_id), rate, rssi, rssi_stddev, payload_size, seed=seed
+    )
+    simulator.start()
+    print(f"[green]Simulated gateway on {simulator.port}[/] ({nodes} nodes, {rate} frames/s each)")
+    try:
+        while True:
+            time.sleep(1)
+            stats = simulator.stats
+            print(
+                f"sent {stats.frames_sent} frames, dropped {stats.frames_dropped}, "
+                f"received {stats.frames_received}, echoed {stats.probes_echoed} probes"
+            )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.close()
+
+
+if __name__ == "__main__":
+    main()
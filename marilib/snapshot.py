@@ -0,0 +1,167 @@
+"""Immutable snapshots of the network statistics, built once per update() tick."""
+
+from dataclasses import dataclass, field, fields
+from datetime import datetime
+from typing import Iterable
+
+from marilib.model import GatewayInfo, LatencyStats, MariGateway, MariNode
+
+SNAPSHOT_RATE_WINDOW_SECONDS = 1
+SNAPSHOT_SUCCESS_RATE_WINDOW_SECONDS = 30
+SNAPSHOT_RSSI_WINDOW_SECONDS = 5
+
+
+@dataclass(frozen=True)
+class LatencySnapshot:
+    """Latency figures of a LatencyStats, in milliseconds over its window of `count` probes."""
+
+    last_ms: float = 0.0
+    avg_ms: float = 0.0
+    min_ms: float = 0.0
+    max_ms: float = 0.0
+    p50_ms: float = 0.0
+    p95_ms: float = 0.0
+    p99_ms: float = 0.0
+    count: int = 0
+
+    @classmethod
+    def from_stats(cls, stats: LatencyStats) -> "LatencySnapshot":
+        return cls(*_latency_row(stats))
+
+
+@dataclass(frozen=True)
+class NodeColumns:
+    """Statistics of the nodes of a gateway, one tuple per column and one index per node.
+
+    Frame counts exclude test packets, as displayed by the TUI and the logger.
+    """
+
+    address: tuple[int, ...] = ()
+    alive: tuple[bool, ...] = ()
+    tx_total: tuple[int, ...] = ()
+    rx_total: tuple[int, ...] = ()
+    tx_rate: tuple[int, ...] = ()
+    rx_rate: tuple[int, ...] = ()
+    success_rate: tuple[float, ...] = ()
+    success_rate_30s: tuple[float, ...] = ()
+    pdr_downlink: tuple[float, ...] = ()
+    pdr_uplink: tuple[float, ...] = ()
+    rssi_dbm: tuple[int, ...] = ()
+    latency_last_ms: tuple[float, ...] = ()
+    latency_avg_ms: tuple[float, ...] = ()
+    latency_min_ms: tuple[float, ...] = ()
+    latency_max_ms: tuple[float, ...] = ()
+    latency_p50_ms: tuple[float, ...] = ()
+    latency_p95_ms: tuple[float, ...] = ()
+    latency_p99_ms: tuple[float, ...] = ()
+    latency_count: tuple[int, ...] = ()
+
+    @classmethod
+    def from_nodes(cls, nodes: Iterable[MariNode]) -> "NodeColumns":
+        rows = [_node_row(node) for node in nodes]
+        if not rows:
+            return cls()
+        return cls(*zip(*rows))
+
+    def __len__(self) -> int:
+        return len(self.address)
+
+    def index(self, address: int) -> int:
+        """Returns the index of a node in the columns, raises ValueError if unknown."""
+        return self.address.index(address)
+
+    def latency(self, index: int) -> LatencySnapshot:
+        """Returns the latency figures of the node at `index`."""
+        return LatencySnapshot(
+            *(getattr(self, f"latency_{field_.name}")[index] for field_ in fields(LatencySnapshot))
+        )
+
+
+@dataclass(frozen=True)
+class GatewaySnapshot:
+    info: GatewayInfo = field(default_factory=GatewayInfo)
+    tx_total: int = 0
+    rx_total: int = 0
+    tx_rate: int = 0
+    rx_rate: int = 0
+    latency: LatencySnapshot = field(default_factory=LatencySnapshot)
+    nodes: NodeColumns = field(default_factory=NodeColumns)
+
+    @property
+    def address(self) -> int:
+        return self.info.address
+
+    @classmethod
+    def from_gateway(cls, gateway: MariGateway) -> "GatewaySnapshot":
+        stats = gateway.stats
+        return cls(
+            info=gateway.info,
+            tx_total=stats.sent_count(include_test_packets=False),
+            rx_total=stats.received_count(include_test_packets=False),
+            tx_rate=stats.sent_count(SNAPSHOT_RATE_WINDOW_SECONDS, include_test_packets=False),
+            rx_rate=stats.received_count(SNAPSHOT_RATE_WINDOW_SECONDS, include_test_packets=False),
+            latency=LatencySnapshot.from_stats(gateway.latency_stats),
+            nodes=NodeColumns.from_nodes(gateway.node_registry.values()),
+        )
+
+
+@dataclass(frozen=True)
+class NetworkSnapshot:
+    """Statistics of all the gateways and nodes at a given time.
+
+    Snapshots are never modified once built, so they can be read without lock
+    while the next one is being built.
+    """
+
+    timestamp: datetime = field(default_factory=datetime.now)
+    gateways: tuple[GatewaySnapshot, ...] = ()
+
+    @classmethod
+    def from_gateways(cls, gateways: Iterable[MariGateway]) -> "NetworkSnapshot":
+        """Builds a snapshot, without lock.
+
+        The node registries of the gateways are copied on write, so each
+        gateway is read from a consistent set of nodes.
+        """
+        return cls(gateways=tuple(GatewaySnapshot.from_gateway(gateway) for gateway in gateways))
+
+    @property
+    def nodes_count(self) -> int:
+        return sum(len(gateway.nodes) for gateway in self.gateways)
+
+    def gateway(self, address: int) -> GatewaySnapshot | None:
+        return next((gateway for gateway in self.gateways if gateway.address == address), None)
+
+
+def _latency_row(stats: LatencyStats) -> tuple[float, ...]:
+    window = stats.window.current()
+    p50, p95, p99 = window.percentiles([50, 95, 99])
+    return (
+        stats.last_ms,
+        window.mean / 1000,
+        window.min / 1000,
+        window.max / 1000,
+        p50 / 1000,
+        p95 / 1000,
+        p99 / 1000,
+        window.count,
+    )
+
+
+def _node_row(node: MariNode) -> tuple:
+    """Returns the values of a node, in the order of the NodeColumns fields."""
+    stats = node.stats
+    return (
+        node.address,
+        node.is_alive,
+        stats.sent_count(include_test_packets=False),
+        stats.received_count(include_test_packets=False),
+        stats.sent_count(SNAPSHOT_RATE_WINDOW_SECONDS, include_test_packets=False),
+        stats.received_count(SNAPSHOT_RATE_WINDOW_SECONDS, include_test_packets=False),
+        stats.success_rate(),
+        stats.success_rate(SNAPSHOT_SUCCESS_RATE_WINDOW_SECONDS),
+        node.pdr_downlink,
+        node.pdr_uplink,
+        stats.received_rssi_dbm(SNAPSHOT_RSSI_WINDOW_SECONDS),
+        *_latency_row(node.latency_stats),
+    )
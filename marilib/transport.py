@@ -0,0 +1,366 @@
+"""Transfer of payloads larger than a Mari frame, as numbered fragments.
+
+Each fragment starts with a header: magic, kind, transfer id, fragment index
+and number of fragments, all little endian. Both ends run the same protocol,
+nodes that take part in transfers have to implement it too.
+
+With selective repeat, the receiver acknowledges a complete transfer with an
+ACK and asks for the missing fragments with a NACK, when it receives the last
+fragment or when the transfer has been idle for a while. The sender only
+retransmits the fragments listed in NACKs.
+
+ACKs and NACKs are sent from `handle_frame`, on the thread receiving the
+frames, so they never wait for room in the downlink queue: a reply that can't
+be queued is dropped, and the timeouts of both ends recover from it.
+"""
+
+import struct
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Callable
+
+from marilib.downlink import DownlinkQueueFull
+from marilib.mari_protocol import MARI_BROADCAST_ADDRESS, Frame, FrameView
+from marilib.serial_uart import TokenBucket
+
+TRANSPORT_MAGIC = b"\x4d\x54"  # "MT" for Mari Transport
+TRANSPORT_FRAGMENT_SIZE = 200  # data bytes per fragment
+TRANSPORT_MAX_FRAGMENTS = 4096
+TRANSPORT_REASSEMBLY_TIMEOUT = 30.0  # seconds without fragments before giving up a transfer
+TRANSPORT_NACK_DELAY = 1.0  # seconds without fragments before asking for the missing ones
+TRANSPORT_ACK_TIMEOUT = 3.0  # seconds waiting for an ACK or a NACK before probing again
+TRANSPORT_MAX_RETRIES = 5
+TRANSPORT_HISTORY_SIZE = 100  # finished transfers kept for their statistics
+TRANSPORT_QUEUE_FULL_BACKOFF = 0.05  # seconds
+
+_HEADER = struct.Struct("<2sBHHH")
+
+
+class FragmentKind(IntEnum):
+    DATA = 0
+    NACK = 1
+    ACK = 2
+
+
+@dataclass
+class TransferStats:
+    """Progress of a transfer, in one direction, with its goodput once completed."""
+
+    peer: int
+    transfer_id: int
+    size: int
+    fragments: int
+    uplink: bool
+    started_ts: float = field(default_factory=time.monotonic)
+    completed_ts: float | None = None
+    retransmitted: int = 0
+    failed: bool = False
+
+    @property
+    def completion_time(self) -> float | None:
+        """Seconds from the first fragment to the completion, None if not completed."""
+        if self.completed_ts is None:
+            return None
+        return self.completed_ts - self.started_ts
+
+    @property
+    def goodput(self) -> float:
+        """Payload bytes per second, 0 if the transfer did not complete."""
+        if not self.completion_time:
+            return 0.0
+        return self.size / self.completion_time
+
+
+@dataclass
+class _OutgoingTransfer:
+    stats: TransferStats
+    fragments: list[bytes]
+    condition: threading.Condition = field(default_factory=threading.Condition)
+    missing: list[int] = field(default_factory=list)
+    acked: bool = False
+
+
+@dataclass
+class _Reassembly:
+    stats: TransferStats
+    fragments: list[bytes | None]
+    received: int = 0
+    last_ts: float = field(default_factory=time.monotonic)
+    nack_ts: float = 0.0
+
+
+class Transport:
+    """Sends and receives payloads of any size, split in fragments.
+
+    `send_frame(dst, payload)` sends a frame, `max_rate` is the maximum frames
+    per second, or a function returning it, used to pipeline the fragments
+    without a stop and wait. `send_control(dst, payload)`, `send_frame` by
+    default, sends the ACKs and NACKs. Received frames are passed to
+    `handle_frame`, completed uplink transfers to `on_transfer(source, data,
+    stats)`, and `update()` has to be called periodically for the timeouts.
+    """
+
+    def __init__(
+        self,
+        send_frame: Callable[[int, bytes], None],
+        max_rate: Callable[[], float] | float | None = None,
+        on_transfer: Callable[[int, bytes, TransferStats], None] | None = None,
+        fragment_size: int = TRANSPORT_FRAGMENT_SIZE,
+        selective_repeat: bool = True,
+        reassembly_timeout: float = TRANSPORT_REASSEMBLY_TIMEOUT,
+        nack_delay: float = TRANSPORT_NACK_DELAY,
+        ack_timeout: float = TRANSPORT_ACK_TIMEOUT,
+        max_retries: int = TRANSPORT_MAX_RETRIES,
+        send_control: Callable[[int, bytes], None] | None = None,
+    ):
+        self.send_frame = send_frame
+        self.send_control = send_control or send_frame
+        self.max_rate = max_rate
+        self.on_transfer = on_transfer
+        self.fragment_size = fragment_size
+        self.selective_repeat = selective_repeat
+        self.reassembly_timeout = reassembly_timeout
+        self.nack_delay = nack_delay
+        self.ack_timeout = ack_timeout
+        self.max_retries = max_retries
+        self.history: deque[TransferStats] = deque(maxlen=TRANSPORT_HISTORY_SIZE)
+        self.expired = 0
+        self.control_dropped = 0  # ACKs and NACKs refused by a full downlink queue
+        self._lock = threading.Lock()
+        self._pace_lock = threading.Lock()
+        self._bucket: TokenBucket | None = None
+        self._next_transfer_id: dict[int, int] = {}
+        self._outgoing: dict[tuple[int, int], _OutgoingTransfer] = {}
+        self._incoming: dict[tuple[int, int], _Reassembly] = {}
+
+    @classmethod
+    def for_edge(cls, mari, **kwargs) -> "Transport":
+        """Returns a transport sending through a MarilibEdge, at its downlink capacity.
+
+        ACKs and NACKs go in the priority lane of the downlink scheduler, if any.
+        The application callback has to pass the NODE_DATA frames to the transport,
+        and call `update()` periodically:
+
+            def on_event(event, event_data):
+                if event == EdgeEvent.NODE_DATA and transport.handle_frame(event_data):
+                    return
+                ...
+        """
+        return cls(
+            mari.send_frame,
+            mari.get_max_downlink_rate,
+            send_control=lambda dst, payload: mari.send_frame(dst, payload, priority=True),
+            **kwargs,
+        )
+
+    # ============================ Sending =====================================
+
+    def send(self, dst: int, data: bytes) -> TransferStats:
+        """Sends `data` to `dst`, returns once it's acknowledged or the transfer failed.
+
+        Transfers to the broadcast address, or without selective repeat, are
+        complete once all fragments are sent.
+        """
+        size = self.fragment_size
+        fragments = [data[pos : pos + size] for pos in range(0, len(data), size)] or [b""]
+        if len(fragments) > TRANSPORT_MAX_FRAGMENTS:
+            raise ValueError(f"Payload too large, {len(fragments)} fragments")
+        wait_ack = self.selective_repeat and dst != MARI_BROADCAST_ADDRESS
+        with self._lock:
+            transfer_id = self._next_transfer_id.get(dst, 0)
+            self._next_transfer_id[dst] = (transfer_id + 1) & 0xFFFF
+            stats = TransferStats(dst, transfer_id, len(data), len(fragments), uplink=False)
+            transfer = _OutgoingTransfer(stats, fragments)
+            if wait_ack:
+                self._outgoing[(dst, transfer_id)] = transfer
+
+        self._send_fragments(transfer, range(len(fragments)))
+        if wait_ack:
+            self._wait_for_ack(transfer)
+        else:
+            stats.completed_ts = time.monotonic()
+
+        with self._lock:
+            self._outgoing.pop((dst, transfer_id), None)
+            self.history.append(stats)
+        return stats
+
+    def _wait_for_ack(self, transfer: _OutgoingTransfer):
+        stats = transfer.stats
+        retries = 0
+        while True:
+            with transfer.condition:
+                transfer.condition.wait_for(
+                    lambda: transfer.acked or transfer.missing, self.ack_timeout
+                )
+                if transfer.acked:
+                    stats.completed_ts = time.monotonic()
+                    return
+                if retries == self.max_retries:
+                    stats.failed = True
+                    return
+                missing, transfer.missing = transfer.missing, []
+            retries += 1
+            # without news from the receiver, the last fragment makes it answer
+            missing = missing or [stats.fragments - 1]
+            stats.retransmitted += len(missing)
+            self._send_fragments(transfer, missing)
+
+    def _send_fragments(self, transfer: _OutgoingTransfer, indexes):
+        stats = transfer.stats
+        for index in indexes:
+            header = _HEADER.pack(
+                TRANSPORT_MAGIC, FragmentKind.DATA, stats.transfer_id, index, stats.fragments
+            )
+            self._pace()
+            self._send(stats.peer, header + transfer.fragments[index])
+
+    def _pace(self):
+        rate = self.max_rate() if callable(self.max_rate) else self.max_rate
+        if not rate:
+            return
+        with self._pace_lock:
+            if self._bucket is None or self._bucket.rate != rate:
+                self._bucket = TokenBucket(rate, 1)
+            delay = self._bucket.reserve(1)
+        if delay:
+            time.sleep(delay)
+
+    def _send(self, dst: int, payload: bytes):
+        """Sends a fragment, waiting for room in the downlink queue."""
+        while True:
+            try:
+                self.send_frame(dst, payload)
+                return
+            except DownlinkQueueFull:
+                time.sleep(TRANSPORT_QUEUE_FULL_BACKOFF)
+
+    def _send_reply(self, dst: int, payload: bytes):
+        """Sends an ACK or a NACK, dropped if the downlink queue is full."""
+        try:
+            self.send_control(dst, payload)
+        except DownlinkQueueFull:
+            self.control_dropped += 1
+
+    # ============================ Receiving ===================================
+
+    def handle_frame(self, frame: Frame | FrameView) -> bool:
+        """Handles a received frame, returns False if it isn't a transport fragment."""
+        payload = frame.payload
+        if payload[: len(TRANSPORT_MAGIC)] != TRANSPORT_MAGIC or len(payload) < _HEADER.size:
+            return False
+        _, kind, transfer_id, index, total = _HEADER.unpack_from(payload)
+        body = bytes(payload[_HEADER.size :])
+        if kind == FragmentKind.DATA:
+            self._on_data(frame.source, transfer_id, index, total, body)
+        elif kind == FragmentKind.NACK:
+            self._on_nack(frame.source, transfer_id, body)
+        elif kind == FragmentKind.ACK:
+            self._on_ack(frame.source, transfer_id)
+        return True
+
+    def update(self, now: float | None = None):
+        """Gives up idle transfers and asks for the fragments missing in the others."""
+        now = time.monotonic() if now is None else now
+        nacks = []
+        with self._lock:
+            for key, reassembly in list(self._incoming.items()):
+                idle = now - reassembly.last_ts
+                if idle > self.reassembly_timeout:
+                    del self._incoming[key]
+                    reassembly.stats.failed = True
+                    self.history.append(reassembly.stats)
+                    self.expired += 1
+                elif (
+                    self.selective_repeat
+                    and idle > self.nack_delay
+                    and now - reassembly.nack_ts > self.nack_delay
+                ):
+                    reassembly.nack_ts = now
+                    nacks.append(reassembly)
+        for reassembly in nacks:
+            self._send_nack(reassembly)
+
+    def _on_data(self, source: int, transfer_id: int, index: int, total: int, body: bytes):
+        key = (source, transfer_id)
+        completed = nack = None
+        with self._lock:
+            reassembly = self._incoming.get(key)
+            if reassembly is None:
+                if not 0 < total <= TRANSPORT_MAX_FRAGMENTS or index >= total:
+                    return
+                # if the transfer just finished, the ACK was lost: send it again
+                completed = self._finished(source, transfer_id, total)
+                if completed is None:
+                    stats = TransferStats(source, transfer_id, 0, total, uplink=True)
+                    reassembly = self._incoming[key] = _Reassembly(stats, [None] * total)
+            if reassembly is not None and index < len(reassembly.fragments):
+                reassembly.last_ts = time.monotonic()
+                if reassembly.fragments[index] is None:
+                    reassembly.fragments[index] = body
+                    reassembly.received += 1
+                    reassembly.stats.size += len(body)
+                if reassembly.received == total:
+                    del self._incoming[key]
+                    completed = reassembly.stats
+                    completed.completed_ts = reassembly.last_ts
+                    self.history.append(completed)
+                elif index == total - 1 and self.selective_repeat:
+                    reassembly.nack_ts = reassembly.last_ts
+                    nack = reassembly
+
+        if nack is not None:
+            self._send_nack(nack)
+        if completed is None:
+            return
+        if self.selective_repeat:
+            ack = _HEADER.pack(TRANSPORT_MAGIC, FragmentKind.ACK, transfer_id, 0, total)
+            self._send_reply(source, ack)
+        if reassembly is not None and self.on_transfer is not None:
+            self.on_transfer(source, b"".join(reassembly.fragments), completed)
+
+    def _finished(self, source: int, transfer_id: int, total: int) -> TransferStats | None:
+        """Returns the uplink transfer a fragment belongs to, if it completed recently.
+
+        The sender probes again one ACK timeout after a lost ACK. An older
+        transfer with the same id is from a sender that restarted its ids, the
+        fragment then starts a new transfer.
+        """
+        oldest_ts = time.monotonic() - 2 * self.ack_timeout
+        for stats in reversed(self.history):
+            if not stats.uplink or stats.failed:
+                continue
+            if stats.completed_ts < oldest_ts:
+                return None  # the history is in completion order
+            if (stats.peer, stats.transfer_id, stats.fragments) == (source, transfer_id, total):
+                return stats
+        return None
+
+    def _send_nack(self, reassembly: _Reassembly):
+        stats = reassembly.stats
+        missing = [index for index, body in enumerate(reassembly.fragments) if body is None]
+        missing = missing[: self.fragment_size // 2]
+        header = _HEADER.pack(
+            TRANSPORT_MAGIC, FragmentKind.NACK, stats.transfer_id, 0, len(missing)
+        )
+        self._send_reply(stats.peer, header + struct.pack(f"<{len(missing)}H", *missing))
+
+    def _on_nack(self, source: int, transfer_id: int, body: bytes):
+        transfer = self._outgoing.get((source, transfer_id))
+        if transfer is None:
+            return
+        missing = struct.unpack(f"<{len(body) // 2}H", body[: len(body) // 2 * 2])
+        with transfer.condition:
+            transfer.missing.extend(i for i in missing if i < transfer.stats.fragments)
+            transfer.condition.notify_all()
+
+    def _on_ack(self, source: int, transfer_id: int):
+        transfer = self._outgoing.get((source, transfer_id))
+        if transfer is None:
+            return
+        with transfer.condition:
+            transfer.acked = True
+            transfer.condition.notify_all()
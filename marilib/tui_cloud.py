@@ -9,7 +9,7 @@ from rich.table import Table
 from rich.text import Text
 
 from marilib import MarilibCloud
-from marilib.model import MariGateway
+from marilib.snapshot import GatewaySnapshot, NetworkSnapshot
 from marilib.tui import MarilibTUI
 
 
@@ -35,19 +35,19 @@ class MarilibTUICloud(MarilibTUI):
         return max(2, available_height)
 
     def render(self, mari: MarilibCloud):
-        """Render the TUI layout."""
-        with mari.lock:
-            if datetime.now() - self.last_render_time < timedelta(seconds=self.re_render_max_freq):
-                return
-            self.last_render_time = datetime.now()
-            layout = Layout()
-            layout.split(
-                Layout(self.create_header_panel(mari), size=6),
-                Layout(self.create_gateways_panel(mari)),
-            )
-            self.live.update(layout, refresh=True)
+        """Render the TUI layout, from the last snapshot of the network."""
+        if datetime.now() - self.last_render_time < timedelta(seconds=self.re_render_max_freq):
+            return
+        self.last_render_time = datetime.now()
+        snapshot = mari.snapshot
+        layout = Layout()
+        layout.split(
+            Layout(self.create_header_panel(mari, snapshot), size=6),
+            Layout(self.create_gateways_panel(snapshot)),
+        )
+        self.live.update(layout, refresh=True)
 
-    def create_header_panel(self, mari: MarilibCloud) -> Panel:
+    def create_header_panel(self, mari: MarilibCloud, snapshot: NetworkSnapshot) -> Panel:
         """Create the header panel with MQTT connection and network info."""
         status = Text()
         status.append("MarilibCloud is ", style="bold")
@@ -68,14 +68,14 @@ class MarilibTUICloud(MarilibTUI):
         status.append(f"0x{mari.network_id:04X}")
         status.append("  |  ")
         status.append("Gateways: ", style="bold cyan")
-        status.append(f"{len(mari.gateways)}")
+        status.append(f"{len(snapshot.gateways)}")
         status.append("  |  ")
         status.append("Nodes: ", style="bold cyan")
-        status.append(f"{len(mari.nodes)}")
+        status.append(f"{snapshot.nodes_count}")
 
         return Panel(status, title="[bold]MarilibCloud Status", border_style="blue")
 
-    def create_gateway_table(self, gateway: MariGateway) -> Table:
+    def create_gateway_table(self, gateway: GatewaySnapshot) -> Table:
         """Create a table for a single gateway with 3 rows and 2 columns."""
         table = Table(
             show_header=False,
@@ -99,7 +99,7 @@ class MarilibTUICloud(MarilibTUI):
 
         # Row 3: Node list
         if gateway.nodes:
-            node_addresses = [f"0x{node.address:016X}" for node in gateway.nodes]
+            node_addresses = [f"0x{address:016X}" for address in gateway.nodes.address]
             node_display = " ".join(node_addresses)
         else:
             node_display = "—"
@@ -108,9 +108,9 @@ class MarilibTUICloud(MarilibTUI):
 
         return table
 
-    def create_gateways_panel(self, mari: MarilibCloud) -> Panel:
+    def create_gateways_panel(self, snapshot: NetworkSnapshot) -> Panel:
         """Create the panel that contains individual gateway tables."""
-        gateways = list(mari.gateways.values())
+        gateways = snapshot.gateways
 
         if not gateways:
             empty_table = Table(title="No Gateways Connected")
@@ -9,7 +9,8 @@ from rich.table import Table
 from rich.text import Text
 
 from marilib import MarilibEdge
-from marilib.model import MariNode, TestState
+from marilib.model import TestState
+from marilib.snapshot import GatewaySnapshot, NodeColumns
 from marilib.tui import MarilibTUI
 
 
@@ -37,19 +38,20 @@ class MarilibTUIEdge(MarilibTUI):
         return max(2, available_height)
 
     def render(self, mari: MarilibEdge):
-        """Render the TUI layout."""
-        with mari.lock:
-            if datetime.now() - self.last_render_time < timedelta(seconds=self.re_render_max_freq):
-                return
-            self.last_render_time = datetime.now()
-            layout = Layout()
-            layout.split(
-                Layout(self.create_header_panel(mari), size=12),
-                Layout(self.create_nodes_panel(mari)),
-            )
-            self.live.update(layout, refresh=True)
+        """Render the TUI layout, from the last snapshot of the network."""
+        if datetime.now() - self.last_render_time < timedelta(seconds=self.re_render_max_freq):
+            return
+        self.last_render_time = datetime.now()
+        snapshot = mari.snapshot
+        gateway = snapshot.gateways[0] if snapshot.gateways else GatewaySnapshot(mari.gateway.info)
+        layout = Layout()
+        layout.split(
+            Layout(self.create_header_panel(mari, gateway), size=12),
+            Layout(self.create_nodes_panel(gateway.nodes)),
+        )
+        self.live.update(layout, refresh=True)
 
-    def create_header_panel(self, mari: MarilibEdge) -> Panel:
+    def create_header_panel(self, mari: MarilibEdge, gateway: GatewaySnapshot) -> Panel:
         """Create the header panel with gateway and network stats."""
         status = Text()
         status.append("MarilibEdge is ", style="bold")
@@ -69,21 +71,22 @@ class MarilibTUIEdge(MarilibTUI):
         )
 
         status.append("\n\nGateway:  ", style="bold cyan")
-        status.append(f"0x{mari.gateway.info.address:016X}  |  ")
+        status.append(f"0x{gateway.info.address:016X}  |  ")
         status.append("Network ID: ", style="bold cyan")
-        status.append(f"0x{mari.gateway.info.network_id:04X}  |  ")
+        status.append(f"0x{gateway.info.network_id:04X}  |  ")
 
         status.append("\n\n")
         status.append("Schedule: ", style="bold cyan")
-        status.append(f"#{mari.gateway.info.schedule_id} ({mari.gateway.info.schedule_name})  |  ")
-        status.append(mari.gateway.info.repr_schedule_cells_with_colors())
+        status.append(f"#{gateway.info.schedule_id} ({gateway.info.schedule_name})  |  ")
+        status.append(gateway.info.repr_schedule_cells_with_colors())
         status.append("\n\n")
 
-        if mari.gateway.latency_stats.last_ms > 0:
+        if gateway.latency.last_ms > 0:
             status.append("Latency:  ", style="bold cyan")
-            lat = mari.gateway.latency_stats
+            lat = gateway.latency
             status.append(
                 f"Last: {lat.last_ms:.1f}ms | Avg: {lat.avg_ms:.1f}ms | "
+                f"P50: {lat.p50_ms:.1f}ms | P95: {lat.p95_ms:.1f}ms | P99: {lat.p99_ms:.1f}ms | "
                 f"Min: {lat.min_ms:.1f}ms | Max: {lat.max_ms:.1f}ms"
             )
 
@@ -96,16 +99,33 @@ class MarilibTUIEdge(MarilibTUI):
             status.append(f"{self.test_state.load}% of {self.test_state.rate} pps")
             status.append("  |  ")
 
-        stats = mari.gateway.stats
-        status.append(f"Nodes: {len(mari.gateway.nodes)}  |  ")
-        status.append(f"Frames TX: {stats.sent_count(include_test_packets=False)}  |  ")
-        status.append(f"Frames RX: {stats.received_count(include_test_packets=False)} |  ")
-        status.append(f"TX/s: {stats.sent_count(1, include_test_packets=False)}  |  ")
-        status.append(f"RX/s: {stats.received_count(1, include_test_packets=False)}")
+        status.append(f"Nodes: {len(gateway.nodes)}  |  ")
+        status.append(f"Frames TX: {gateway.tx_total}  |  ")
+        status.append(f"Frames RX: {gateway.rx_total} |  ")
+        status.append(f"TX/s: {gateway.tx_rate}  |  ")
+        status.append(f"RX/s: {gateway.rx_rate}")
+        if serial_stats := mari.serial_interface.stats:
+            status.append("  |  ")
+            status.append(
+                f"Serial reads/s: {serial_stats.reads_per_second:.0f} "
+                f"({serial_stats.bytes_per_read:.1f} B/read)  |  "
+                f"TX queue: {mari.serial_interface.tx_queue_depth} "
+                f"(wait avg {serial_stats.write_queue_wait_avg_ms:.1f}ms)"
+            )
+        if dispatcher := mari.dispatcher:
+            status.append(
+                f"  |  Events queued: {dispatcher.depth} (dropped {dispatcher.dropped}, "
+                f"callback p99 {dispatcher.callback_latency_ns().percentile(99) / 1000:.0f}us)"
+            )
+        lock = mari.lock
+        status.append(
+            f"  |  Lock wait/hold p99: {lock.wait_ns.percentile(99) / 1000:.0f}/"
+            f"{lock.hold_ns.percentile(99) / 1000:.0f}us"
+        )
 
         return Panel(status, title="[bold]MarilibEdge Status", border_style="blue")
 
-    def create_nodes_table(self, nodes: list[MariNode], title="") -> Table:
+    def create_nodes_table(self, nodes: NodeColumns, indexes: range, title="") -> Table:
         """Create a table displaying information about connected nodes."""
         table = Table(
             show_header=True,
@@ -123,42 +143,37 @@ class MarilibTUIEdge(MarilibTUI):
         table.add_column("PDR Down", justify="right")
         table.add_column("PDR Up", justify="right")
         table.add_column("RSSI", justify="right")
-        table.add_column("Latency (ms)", justify="right")
-        for node in nodes:
-            lat_str = (
-                f"{node.latency_stats.avg_ms:.1f}" if node.latency_stats.last_ms > 0 else "..."
-            )
+        table.add_column("Latency p50/p99 (ms)", justify="right")
+        for i in indexes:
+            if nodes.latency_last_ms[i] > 0:
+                lat_str = f"{nodes.latency_p50_ms[i]:.1f}/{nodes.latency_p99_ms[i]:.1f}"
+            else:
+                lat_str = "..."
             table.add_row(
-                f"0x{node.address:016X}",
-                str(node.stats.sent_count(include_test_packets=False)),
-                str(node.stats.sent_count(1, include_test_packets=False)),
-                str(node.stats.received_count(include_test_packets=False)),
-                str(node.stats.received_count(1, include_test_packets=False)),
-                f"{node.stats.success_rate():>4.0%}",
-                f"{node.pdr_downlink:>4.0%}",
-                f"{node.pdr_uplink:>4.0%}",
-                f"{node.stats.received_rssi_dbm(5)}",
+                f"0x{nodes.address[i]:016X}",
+                str(nodes.tx_total[i]),
+                str(nodes.tx_rate[i]),
+                str(nodes.rx_total[i]),
+                str(nodes.rx_rate[i]),
+                f"{nodes.success_rate[i]:>4.0%}",
+                f"{nodes.pdr_downlink[i]:>4.0%}",
+                f"{nodes.pdr_uplink[i]:>4.0%}",
+                f"{nodes.rssi_dbm[i]}",
                 lat_str,
             )
         return table
 
-    def create_nodes_panel(self, mari: MarilibEdge) -> Panel:
+    def create_nodes_panel(self, nodes: NodeColumns) -> Panel:
         """Create the panel that contains the nodes table."""
-        nodes = mari.gateway.nodes
         max_rows = self.get_max_rows()
         max_displayable_nodes = self.max_tables * max_rows
-        nodes_to_display = nodes[:max_displayable_nodes]
+        displayed_nodes = min(len(nodes), max_displayable_nodes)
         remaining_nodes = max(0, len(nodes) - max_displayable_nodes)
         tables = []
-        current_table_nodes = []
-        for i, node in enumerate(nodes_to_display):
-            current_table_nodes.append(node)
-            if len(current_table_nodes) == max_rows or i == len(nodes_to_display) - 1:
-                title = f"Nodes {i - len(current_table_nodes) + 2}-{i + 1}"
-                tables.append(self.create_nodes_table(current_table_nodes, title))
-                current_table_nodes = []
-                if len(tables) >= self.max_tables:
-                    break
+        for start in range(0, displayed_nodes, max_rows):
+            end = min(start + max_rows, displayed_nodes)
+            title = f"Nodes {start + 1}-{end}"
+            tables.append(self.create_nodes_table(nodes, range(start, end), title))
         if len(tables) > 1:
             content = Columns(tables, equal=True, expand=True)
         else:
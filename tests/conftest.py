@@ -0,0 +1,61 @@
+"""Fixtures shared by the test modules."""
+
+import os
+import time
+
+import pytest
+
+from marilib.model import EdgeEvent
+from marilib.serial_hdlc import HDLCHandler, hdlc_encode
+
+
+class PtyGateway:
+    """The gateway end of a pseudo terminal, the edge connects to `port`."""
+
+    def __init__(self, address: int = 0x10):
+        pty = pytest.importorskip("pty")
+        tty = pytest.importorskip("tty")
+        self.address = address
+        self.fd, self.port_fd = pty.openpty()
+        tty.setraw(self.port_fd)
+        os.set_blocking(self.fd, False)
+        self.port = os.ttyname(self.port_fd)
+        self.hdlc_handler = HDLCHandler()
+
+    def send(self, event: EdgeEvent, payload: bytes):
+        os.write(self.fd, hdlc_encode(EdgeEvent.to_bytes(event) + payload))
+
+    def read(self) -> list[bytes]:
+        """Returns the frames received so far, without waiting."""
+        try:
+            return self.hdlc_handler.feed(os.read(self.fd, 1024))
+        except BlockingIOError:
+            return []
+
+    def received(self, timeout: float = 0.5) -> list[bytes]:
+        """Returns the frames received during `timeout` seconds."""
+        frames = []
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not (new_frames := self.read()):
+                time.sleep(0.01)
+            frames += new_frames
+        return frames
+
+    def close(self):
+        os.close(self.fd)
+        os.close(self.port_fd)
+
+
+@pytest.fixture
+def pty_gateway():
+    """Returns a factory of PtyGateway, closed at the end of the test."""
+    gateways = []
+
+    def factory(address: int = 0x10) -> PtyGateway:
+        gateways.append(PtyGateway(address))
+        return gateways[-1]
+
+    yield factory
+    for gateway in gateways:
+        gateway.close()
@@ -0,0 +1,101 @@
+"""Test module for the asyncio API, with a pseudo terminal in place of the gateway."""
+
+import asyncio
+import threading
+
+from marilib.aio import AsyncMarilibEdge, AsyncMQTTAdapter, AsyncSerialAdapter
+from marilib.dispatcher import EventDispatcher
+from marilib.mari_protocol import Frame, Header
+from marilib.model import EdgeEvent, GatewayInfo, NodeInfoEdge
+
+
+async def _read_frames(gateway, count: int) -> list[bytes]:
+    frames = []
+    while len(frames) < count:
+        await asyncio.sleep(0.01)
+        frames += gateway.read()
+    return frames
+
+
+async def _edge_over_pty(gateway):
+    adapter = AsyncSerialAdapter(gateway.port)
+    async with AsyncMarilibEdge(adapter, update_interval=0.01) as mari:
+        await adapter.wait_connected()
+        gateway.send(EdgeEvent.GATEWAY_INFO, GatewayInfo(address=0x10).to_bytes())
+        gateway.send(EdgeEvent.NODE_JOINED, NodeInfoEdge(address=0x42).to_bytes())
+        gateway.send(EdgeEvent.NODE_DATA, Frame(Header(source=0x42), payload=b"hello").to_bytes())
+        events = []
+        async for event in mari.events():
+            events.append(event)
+            if len(events) == 3:
+                break
+
+        await mari.send_frame(0x42, b"downlink")
+        (sent,) = await asyncio.wait_for(_read_frames(gateway, 1), timeout=2)
+        assert mari.mari.gateway.get_node(0x42).stats.sent_count() == 1
+        assert adapter.stats.writes == 1
+    return events, sent
+
+
+def test_async_edge(pty_gateway):
+    gateway = pty_gateway()
+    events, sent = asyncio.run(asyncio.wait_for(_edge_over_pty(gateway), timeout=5))
+    assert [event_type for event_type, _ in events] == [
+        EdgeEvent.GATEWAY_INFO,
+        EdgeEvent.NODE_JOINED,
+        EdgeEvent.NODE_DATA,
+    ]
+    assert events[0][1].address == 0x10
+    assert events[1][1].address == 0x42
+    assert events[2][1].payload == b"hello"
+    assert sent[0] == 0x01
+    assert Frame().from_bytes(sent, 1).payload == b"downlink"
+
+
+async def _edge_from_threads(gateway):
+    adapter = AsyncSerialAdapter(gateway.port)
+    async with AsyncMarilibEdge(adapter, update_interval=0.01) as mari:
+        await adapter.wait_connected()
+        # like the downlink scheduler and the dispatcher workers, off the loop
+        thread = threading.Thread(
+            target=lambda: (
+                adapter.send_data(b"\x01threaded"),
+                mari._on_event(EdgeEvent.NODE_KEEP_ALIVE, None),
+            )
+        )
+        thread.start()
+        await asyncio.to_thread(thread.join)
+        (sent,) = await asyncio.wait_for(_read_frames(gateway, 1), timeout=2)
+        event = await asyncio.wait_for(mari._events.get(), timeout=2)
+    return sent, event
+
+
+def test_async_edge_from_threads(pty_gateway):
+    gateway = pty_gateway()
+    sent, event = asyncio.run(asyncio.wait_for(_edge_from_threads(gateway), timeout=5))
+    assert sent == b"\x01threaded"
+    assert event == (EdgeEvent.NODE_KEEP_ALIVE, None)
+
+
+async def _edge_with_dispatcher(gateway):
+    adapter = AsyncSerialAdapter(gateway.port)
+    # nothing listens on port 1, the connection fails once attempted
+    mqtt_adapter = AsyncMQTTAdapter("127.0.0.1", 1, is_edge=True)
+    dispatcher = EventDispatcher()
+    async with AsyncMarilibEdge(adapter, mqtt_adapter, dispatcher=dispatcher) as mari:
+        await adapter.wait_connected()
+        gateway.send(EdgeEvent.GATEWAY_INFO, GatewayInfo(address=0x10, network_id=1).to_bytes())
+        event_type, _ = await asyncio.wait_for(mari._events.get(), timeout=2)
+        # the worker handed the MQTT initialization over to the loop
+        while mqtt_adapter.client is None:
+            await asyncio.sleep(0.01)
+        await mqtt_adapter._connection_task
+    dispatcher.stop()
+    return event_type, dispatcher.errors
+
+
+def test_async_edge_dispatcher_mqtt(pty_gateway):
+    gateway = pty_gateway()
+    event_type, errors = asyncio.run(asyncio.wait_for(_edge_with_dispatcher(gateway), timeout=5))
+    assert event_type == EdgeEvent.GATEWAY_INFO
+    assert errors == 0
@@ -0,0 +1,20 @@
+"""Test module for the benchmarks runner."""
+
+from benchmarks.runner import compare, run_benchmarks
+
+
+def test_run_benchmarks():
+    results = run_benchmarks("packet_to_bytes[Header]", rounds=2, min_time=0.001)
+    assert list(results["benchmarks"]) == ["packet_to_bytes[Header]"]
+    result = results["benchmarks"]["packet_to_bytes[Header]"]
+    assert result["rounds"] == 2
+    assert 0 < result["min_us"] <= result["median_us"]
+    assert results["machine"]["python"]
+
+
+def test_compare():
+    old = {"benchmarks": {"a": {"median_us": 1.0}, "b": {"median_us": 2.0}}}
+    new = {"benchmarks": {"a": {"median_us": 1.05}, "b": {"median_us": 3.0}, "c": {}}}
+    rows = compare(old, new, threshold=0.1)
+    assert [(name, regression) for name, *_, regression in rows] == [("a", False), ("b", True)]
+    assert rows[1][3] == 1.5
@@ -0,0 +1,130 @@
+"""Test module for the capture of received frames and their replay."""
+
+import time
+
+import pytest
+
+from marilib.capture import (
+    _FILE_HEADER,
+    CAPTURE_MAGIC,
+    CaptureFormatError,
+    CaptureWriter,
+    read_capture,
+)
+from marilib.communication_adapter import ReplaySerialAdapter, SerialAdapter
+from marilib.mari_protocol import Frame, Header
+from marilib.marilib_edge import MarilibEdge
+from marilib.model import EdgeEvent, GatewayInfo, NodeInfoEdge
+from marilib.serial_hdlc import hdlc_encode
+
+
+def test_capture_write_read(tmp_path):
+    path = str(tmp_path / "capture.bin")
+    writer = CaptureWriter(path)
+    writer.close()
+    assert list(read_capture(path)) == []
+    writer = CaptureWriter(path)  # appended to the same file
+    writer.write(b"first", timestamp_ns=10)
+    writer.write(b"", timestamp_ns=20)
+    writer.close()
+    with open(path, "ab") as file:
+        file.write(b"\x00" * 5)  # truncated record
+    assert list(read_capture(path)) == [(10, b"first"), (20, b"")]
+
+    (tmp_path / "other.bin").write_bytes(b"not a capture")
+    with pytest.raises(CaptureFormatError):
+        list(read_capture(str(tmp_path / "other.bin")))
+
+
+def test_capture_flush_and_sessions(tmp_path):
+    path = str(tmp_path / "capture.bin")
+    writer = CaptureWriter(path, flush_interval=0)
+    writer.write(b"first", timestamp_ns=1_000)
+    # readable before the writer is closed
+    assert list(read_capture(path)) == [(1_000, b"first")]
+    writer.close()
+    # the monotonic clocks of two boots are unrelated
+    writer = CaptureWriter(path)
+    writer.write(b"second", timestamp_ns=5_000_000_000)
+    writer.close()
+    records = list(read_capture(path, sessions=True))
+    assert [payload for _, payload in records] == [None, b"first", None, b"second"]
+    assert list(read_capture(path)) == [(1_000, b"first"), (5_000_000_000, b"second")]
+
+    received = []
+    replay = ReplaySerialAdapter(path)
+    start = time.monotonic()
+    replay.init(received.append)
+    assert replay.wait_done(5)
+    assert time.monotonic() - start < 1
+    assert received == [b"first", b"second"]
+
+    (tmp_path / "old.bin").write_bytes(_FILE_HEADER.pack(CAPTURE_MAGIC, 1))
+    assert list(read_capture(str(tmp_path / "old.bin"))) == []
+    with pytest.raises(CaptureFormatError):
+        CaptureWriter(str(tmp_path / "old.bin"))
+
+
+def test_capture_flush_when_idle(tmp_path):
+    path = str(tmp_path / "capture.bin")
+    writer = CaptureWriter(path, flush_interval=0.05)
+    writer.write(b"first", timestamp_ns=1)
+    writer.write(b"last", timestamp_ns=2)  # within the interval, buffered
+    # no other record comes, the timer flushes them
+    deadline = time.monotonic() + 2
+    while len(list(read_capture(path))) < 2:
+        assert time.monotonic() < deadline, "records not flushed"
+        time.sleep(0.01)
+    assert list(read_capture(path)) == [(1, b"first"), (2, b"last")]
+    writer.close()
+
+
+def test_serial_adapter_capture(tmp_path):
+    path = str(tmp_path / "capture.bin")
+    adapter = SerialAdapter("unused", capture_file=path)
+    received = []
+    adapter.on_data_received = received.append
+    adapter._open_capture()
+    adapter.on_chunk_received(hdlc_encode(b"one") + hdlc_encode(b"two"))
+    adapter.close()
+    assert received == [b"one", b"two"]
+    assert [payload for _, payload in read_capture(path)] == received
+
+
+def test_replay_into_edge(tmp_path):
+    path = str(tmp_path / "capture.bin")
+    writer = CaptureWriter(path)
+    info = GatewayInfo(address=0x10, network_id=1)
+    writer.write(EdgeEvent.to_bytes(EdgeEvent.GATEWAY_INFO) + info.to_bytes())
+    writer.write(EdgeEvent.to_bytes(EdgeEvent.NODE_JOINED) + NodeInfoEdge(address=0x42).to_bytes())
+    frame = Frame(Header(destination=0x10, source=0x42), payload=b"data")
+    for _ in range(100):
+        writer.write(EdgeEvent.to_bytes(EdgeEvent.NODE_DATA) + frame.to_bytes())
+    writer.close()
+
+    events = []
+    replay = ReplaySerialAdapter(path, speed=None)
+    mari = MarilibEdge(lambda event, data: events.append(event), replay)
+    assert replay.wait_done(5)
+    assert replay.replayed == 102
+    assert events.count(EdgeEvent.NODE_DATA) == 100
+    assert mari.gateway.get_node(0x42).stats.received_count() == 100
+    mari.send_frame(0x42, b"discarded")
+    assert replay.stats.bytes_written > 0
+    replay.close()
+
+
+def test_replay_speed(tmp_path):
+    path = str(tmp_path / "capture.bin")
+    writer = CaptureWriter(path)
+    writer.write(b"a", timestamp_ns=0)
+    writer.write(b"b", timestamp_ns=200_000_000)
+    writer.close()
+
+    received = []
+    replay = ReplaySerialAdapter(path, speed=2)
+    start = time.monotonic()
+    replay.init(received.append)
+    assert replay.wait_done(5)
+    assert time.monotonic() - start >= 0.1
+    assert received == [b"a", b"b"]
@@ -0,0 +1,69 @@
+"""Test module for the event dispatcher."""
+
+import threading
+
+import pytest
+
+from marilib.dispatcher import EventDispatcher, OverflowPolicy
+
+
+def test_dispatcher_keeps_order_per_key():
+    dispatcher = EventDispatcher(workers=4)
+    received = {key: [] for key in range(8)}
+    for value in range(100):
+        for key in received:
+            dispatcher.submit(key, received[key].append, value)
+    dispatcher.stop()
+    assert all(values == list(range(100)) for values in received.values())
+    assert dispatcher.processed == 800
+    assert dispatcher.depth == 0
+    assert dispatcher.callback_latency_ns().count == 800
+
+
+def _blocked_dispatcher(policy: OverflowPolicy):
+    """Returns a dispatcher whose single worker waits on the returned event."""
+    dispatcher = EventDispatcher(workers=1, queue_size=2, policy=policy)
+    started, release = threading.Event(), threading.Event()
+    dispatcher.submit(0, lambda: (started.set(), release.wait()))
+    started.wait()
+    return dispatcher, release
+
+
+@pytest.mark.parametrize(
+    "policy,expected",
+    [(OverflowPolicy.DROP_NEWEST, [1, 2]), (OverflowPolicy.DROP_OLDEST, [3, 4])],
+)
+def test_dispatcher_drop_policies(policy, expected):
+    dispatcher, release = _blocked_dispatcher(policy)
+    received = []
+    results = [dispatcher.submit(0, received.append, value) for value in range(1, 5)]
+    assert dispatcher.depth == 2
+    assert dispatcher.dropped == 2
+    assert results == ([True, True, False, False] if policy.value == "drop_newest" else [True] * 4)
+    release.set()
+    dispatcher.stop()
+    assert received == expected
+
+
+def test_dispatcher_block_policy():
+    dispatcher, release = _blocked_dispatcher("block")
+    received = []
+    for value in range(1, 3):
+        dispatcher.submit(0, received.append, value)
+    producer = threading.Thread(target=dispatcher.submit, args=(0, received.append, 3))
+    producer.start()
+    producer.join(0.05)
+    assert producer.is_alive()
+    release.set()
+    producer.join()
+    dispatcher.stop()
+    assert received == [1, 2, 3]
+    assert dispatcher.dropped == 0
+
+
+def test_dispatcher_counts_errors():
+    dispatcher = EventDispatcher()
+    dispatcher.submit(0, lambda: 1 / 0)
+    dispatcher.stop()
+    assert dispatcher.errors == 1
+    assert dispatcher.processed == 1
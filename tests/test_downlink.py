@@ -0,0 +1,79 @@
+"""Test module for the downlink scheduler."""
+
+import threading
+import time
+
+import pytest
+
+from marilib.downlink import DownlinkQueueFull, DownlinkScheduler, downlink_capacity
+from marilib.model import SCHEDULES
+
+FAST_SCHEDULE = {"d_down": 1000, "sf_duration": 1}
+
+
+class Recorder:
+    def __init__(self, count: int):
+        self.frames = []
+        self.times = []
+        self.count = count
+        self.done = threading.Event()
+
+    def send(self, dst: int, payload: bytes):
+        self.frames.append((dst, payload))
+        self.times.append(time.monotonic())
+        if len(self.frames) == self.count:
+            self.done.set()
+
+
+def test_downlink_capacity():
+    assert downlink_capacity(None) == (0.0, 0)
+    rate, burst = downlink_capacity(SCHEDULES[6])
+    assert burst == SCHEDULES[6]["d_down"]
+    assert rate == pytest.approx(burst / SCHEDULES[6]["sf_duration"] * 1000)
+
+
+def test_downlink_round_robin_and_priority():
+    scheduler = DownlinkScheduler(queue_size=3)
+    schedule = {}
+    recorder = Recorder(7)
+    scheduler.start(recorder.send, lambda: schedule)
+    # nothing is sent while the schedule is unknown
+    for i in range(3):
+        scheduler.put(1, b"a%d" % i)
+    scheduler.put(2, b"b0")
+    scheduler.put(3, b"c0")
+    scheduler.put(3, b"c1")
+    scheduler.put(9, b"control", priority=True)
+    with pytest.raises(DownlinkQueueFull):
+        scheduler.put(1, b"a3")
+    assert scheduler.depth == 7
+    schedule.update(FAST_SCHEDULE)
+    assert recorder.done.wait(2)
+    scheduler.stop()
+    assert [payload for _, payload in recorder.frames] == [
+        b"control",
+        b"a0",
+        b"b0",
+        b"c0",
+        b"a1",
+        b"c1",
+        b"a2",
+    ]
+    assert scheduler.stats[1].sent == 3
+    assert scheduler.stats[1].dropped == 1
+    assert scheduler.stats[1].delay_us.count == 3
+    assert scheduler.depth == 0
+
+
+def test_downlink_pacing():
+    scheduler = DownlinkScheduler()
+    recorder = Recorder(6)
+    # 100 frames per second, 2 frames per superframe
+    scheduler.start(recorder.send, lambda: {"d_down": 2, "sf_duration": 20})
+    for i in range(6):
+        scheduler.put(1, b"%d" % i)
+    assert recorder.done.wait(2)
+    scheduler.stop()
+    # the first 2 frames go as a burst, the next ones every 10 ms
+    assert recorder.times[-1] - recorder.times[0] >= 0.035
+    assert scheduler.stats[1].delay_p99_ms >= 30
@@ -0,0 +1,89 @@
+"""Test module for the multi-gateway edge host, with pseudo terminals in place of gateways."""
+
+import time
+
+import pytest
+
+from marilib.capture import CaptureWriter
+from marilib.communication_adapter import ReplaySerialAdapter
+from marilib.downlink import DownlinkQueueFull, DownlinkScheduler
+from marilib.mari_protocol import MARI_BROADCAST_ADDRESS, Frame, Header
+from marilib.marilib_edge_host import MarilibEdgeHost
+from marilib.model import EdgeEvent, GatewayInfo, NodeInfoEdge
+from marilib.transport import Transport
+
+
+def _wait_for(condition, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_edge_host_routes_frames(pty_gateway):
+    gateways = [pty_gateway(0x10), pty_gateway(0x20)]
+    events = []
+    host = MarilibEdgeHost.from_ports(
+        lambda event, data: events.append(event), [gateway.port for gateway in gateways]
+    )
+    try:
+        for edge in host.edges:
+            assert edge.serial_interface.wait_connected(10)
+        for gateway in gateways:
+            info = GatewayInfo(address=gateway.address, network_id=1)
+            gateway.send(EdgeEvent.GATEWAY_INFO, info.to_bytes())
+        gateways[1].send(EdgeEvent.NODE_JOINED, NodeInfoEdge(address=0x42).to_bytes())
+        _wait_for(lambda: set(host.gateways) == {0x10, 0x20} and host.nodes)
+        assert host.get_node_edge(0x42).gateway.info.address == 0x20
+        assert events.count(EdgeEvent.GATEWAY_INFO) == 2
+
+        host.send_frame(0x42, b"unicast")
+        host.on_mqtt_data_received(
+            EdgeEvent.to_bytes(EdgeEvent.NODE_DATA)
+            + Frame(Header(destination=0x42), payload=b"from cloud").to_bytes()
+        )
+        host.send_frame(MARI_BROADCAST_ADDRESS, b"broadcast")
+        payloads = [[Frame().from_bytes(f, 1).payload for f in g.received()] for g in gateways]
+        assert payloads == [[b"broadcast"], [b"unicast", b"from cloud", b"broadcast"]]
+
+        # the statistics of the reader processes are forwarded periodically
+        adapter = host.edges[1].serial_interface
+        _wait_for(lambda: adapter.stats.writes == 3)
+        assert adapter.hdlc_handler.decoded == 2
+        assert adapter.stats.bytes_read > 0
+        assert adapter.tx_queue_depth == 0
+
+        host.update()
+        assert host.snapshot.nodes_count == 1
+    finally:
+        host.close()
+
+
+def test_edge_host_send_frame_queue_full(tmp_path):
+    path = str(tmp_path / "empty.bin")
+    CaptureWriter(path).close()
+    adapters = [ReplaySerialAdapter(path, speed=None) for _ in range(2)]
+    host = MarilibEdgeHost(lambda event, data: None, adapters)
+    # not started, the frames stay queued
+    for edge in host.edges:
+        edge.downlink_scheduler = DownlinkScheduler(queue_size=1, priority_queue_size=1)
+    host.edges[1].gateway.add_node(0x42)
+
+    host.send_frame(0x42, b"first", priority=True)
+    host.send_frame(0x42, b"unicast")
+    with pytest.raises(DownlinkQueueFull):
+        host.send_frame(0x42, b"second", priority=True)
+    # the priority lane of the second gateway is full: the broadcast isn't queued anywhere
+    with pytest.raises(DownlinkQueueFull):
+        host.send_frame(MARI_BROADCAST_ADDRESS, b"broadcast", priority=True)
+    host.send_frame(MARI_BROADCAST_ADDRESS, b"broadcast")
+    assert [edge.downlink_scheduler.depth for edge in host.edges] == [1, 3]
+
+    # transports send through a host like through an edge
+    assert host.get_max_downlink_rate() == 0
+    host.edges[0].gateway.set_info(GatewayInfo(address=0x10, schedule_id=6))
+    assert host.get_max_downlink_rate() == host.edges[0].get_max_downlink_rate() > 0
+    transport = Transport.for_edge(host)
+    transport._send_reply(0x42, b"reply")
+    assert transport.control_dropped == 1
+    host.close()
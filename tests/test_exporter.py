@@ -0,0 +1,99 @@
+"""Test module for the OpenMetrics exporter."""
+
+import urllib.error
+import urllib.request
+
+import pytest
+
+from marilib.exporter import (
+    OPENMETRICS_CONTENT_TYPE,
+    MetricsExporter,
+    RuntimeStats,
+    render_openmetrics,
+)
+from marilib.instrumentation import StageStats
+from marilib.mari_protocol import Frame, Header, HeaderStats
+from marilib.model import GatewayInfo, MariGateway
+from marilib.snapshot import NetworkSnapshot
+
+
+def _snapshot() -> NetworkSnapshot:
+    gateway = MariGateway()
+    gateway.set_info(GatewayInfo(address=0x10, network_id=1, schedule_id=6))
+    gateway.add_node(1)
+    gateway.add_node(2)
+    gateway.register_sent_frame(Frame(Header(destination=2)), is_test_packet=False)
+    gateway.register_received_frame(
+        Frame(Header(source=2), stats=HeaderStats(rssi=0xC0)), is_test_packet=False
+    )
+    gateway.node_registry[2].latency_stats.add_latency(0.1)
+    return NetworkSnapshot.from_gateways([gateway])
+
+
+def test_render_openmetrics():
+    runtime = RuntimeStats(
+        dispatcher_depth=3,
+        hdlc_decoded=10,
+        hdlc_invalid_fcs=2,
+        stages={"parse": StageStats(count=4, mean_us=5, p50_us=5, p99_us=8, max_us=9)},
+    )
+    text = render_openmetrics(_snapshot(), runtime)
+    lines = text.splitlines()
+    assert text.endswith("# EOF\n")
+    gateway = 'gateway="0x0000000000000010"'
+    node = f'{gateway},node="0x0000000000000002"'
+    assert (
+        f'marilib_gateway_info{{{gateway},network_id="0001",schedule_id="6",'
+        f'schedule_name="tiny"}} 1'
+    ) in lines
+    assert f"marilib_gateway_nodes{{{gateway}}} 2" in lines
+    assert f"marilib_gateway_schedule_occupancy_ratio{{{gateway}}} 0.2" in lines
+    assert f"marilib_node_tx_frames_total{{{node}}} 1" in lines
+    assert f"marilib_node_rx_frames_total{{{node}}} 1" in lines
+    assert f"marilib_node_rssi_dbm{{{node}}} -63" in lines
+    latency = next(
+        line for line in lines if line.startswith(f"marilib_node_latency_seconds{{{node}")
+    )
+    assert latency.startswith(f'marilib_node_latency_seconds{{{node},quantile="0.5"}} ')
+    assert float(latency.split()[-1]) == pytest.approx(0.1, rel=0.04)
+    assert f"marilib_node_latency_seconds_count{{{node}}} 1" in lines
+    # without probes, a summary has no quantiles rather than a latency of 0
+    idle_node = f'{gateway},node="0x0000000000000001"'
+    assert f"marilib_node_latency_seconds_count{{{idle_node}}} 0" in lines
+    assert not [
+        line for line in lines if line.startswith(f"marilib_node_latency_seconds{{{idle_node}")
+    ]
+    assert not [line for line in lines if line.startswith("marilib_gateway_latency_seconds{")]
+    assert f"marilib_gateway_latency_seconds_count{{{gateway}}} 0" in lines
+    assert "marilib_dispatcher_queue_depth 3" in lines
+    assert "marilib_hdlc_frames_total 10" in lines
+    assert 'marilib_hdlc_errors_total{reason="fcs"} 2' in lines
+    assert 'marilib_pipeline_stage_seconds{stage="parse",quantile="0.99"} 8e-06' in lines
+    assert 'marilib_pipeline_stage_seconds_count{stage="parse"} 4' in lines
+    # a family is described once, before its samples
+    assert lines.count("# TYPE marilib_node_rx_frames counter") == 1
+    assert lines.index("# TYPE marilib_node_rx_frames counter") < lines.index(
+        f"marilib_node_rx_frames_total{{{node}}} 1"
+    )
+
+
+def test_metrics_exporter():
+    exporter = MetricsExporter(port=0)
+    exporter.start()
+    try:
+        url = f"http://{exporter.host}:{exporter.port}"
+        exporter.update(_snapshot())
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            assert response.headers["Content-Type"] == OPENMETRICS_CONTENT_TYPE
+            body = response.read()
+        assert b"marilib_gateway_nodes" in body
+        # scrapes of the same tick get the same text, rendered once
+        assert exporter.render() is exporter.render()
+        assert exporter.scrapes == 3
+        exporter.update(NetworkSnapshot())
+        assert b"marilib_gateway_nodes{" not in exporter.render()
+        with pytest.raises(urllib.error.HTTPError) as exc:
+            urllib.request.urlopen(f"{url}/other")
+        assert exc.value.code == 404
+    finally:
+        exporter.stop()
@@ -2,7 +2,13 @@
 
 import pytest
 
-from marilib.serial_hdlc import HDLCDecodeException, HDLCHandler, HDLCState
+from marilib.serial_hdlc import (
+    HDLCDecodeException,
+    HDLCHandler,
+    HDLCState,
+    hdlc_decode,
+    hdlc_encode,
+)
 
 
 def test_hdlc_handler_states():
@@ -74,3 +80,45 @@ def test_hdlc_handler_payload_too_short():
         handler.handle_byte(int(byte).to_bytes(1, "little"))
     payload = handler.payload
     assert payload == bytearray()
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        b"",
+        b"~",
+        b"}",
+        b"}}~~",
+        b"\x7d\x5e\x7e\x5d",
+        bytes(range(256)),
+    ],
+)
+def test_hdlc_encode_decode_roundtrip(payload):
+    assert hdlc_decode(hdlc_encode(payload)) == payload
+
+
+def test_hdlc_decode_malformed_escape():
+    # an escape byte followed by an unexpected byte is dropped with it
+    assert hdlc_decode(b"~}xtest\x88\x07~") == b"test"
+
+
+def test_hdlc_handler_feed_many_frames():
+    handler = HDLCHandler()
+    stream = b"garbage" + hdlc_encode(b"first") + hdlc_encode(b"~second}") + hdlc_encode(b"3")
+    assert handler.feed(stream) == [b"first", b"~second}", b"3"]
+    assert handler.feed(b"") == []
+
+
+def test_hdlc_handler_feed_partial_frames():
+    handler = HDLCHandler()
+    stream = hdlc_encode(b"first") + hdlc_encode(b"second")
+    payloads = []
+    for i in range(0, len(stream), 3):
+        payloads += handler.feed(stream[i : i + 3])
+    assert payloads == [b"first", b"second"]
+
+
+def test_hdlc_handler_feed_invalid_frames():
+    handler = HDLCHandler()
+    assert handler.feed(b"~test\x42\x42~~a~~~" + hdlc_encode(b"ok")) == [b"ok"]
+    assert (handler.decoded, handler.invalid_fcs, handler.invalid_payload) == (1, 1, 1)
@@ -0,0 +1,87 @@
+"""Test module for streaming histograms."""
+
+import math
+import time
+
+import pytest
+
+from marilib.histogram import Histogram, WindowedHistogram
+from marilib.model import LatencyStats
+
+
+def test_histogram_small_values_are_exact():
+    histogram = Histogram()
+    for value in range(1, 11):
+        histogram.record(value)
+    assert histogram.count == 10
+    assert histogram.mean == 5.5
+    assert histogram.min == 1
+    assert histogram.max == 10
+    assert histogram.percentile(50) == 5
+    assert histogram.percentile(100) == 10
+
+
+@pytest.mark.parametrize("percentile", [50, 90, 95, 99])
+def test_histogram_percentile_precision(percentile):
+    histogram = Histogram()
+    values = list(range(1000, 101000, 10))
+    for value in values:
+        histogram.record(value)
+    expected = values[math.ceil(percentile / 100 * len(values)) - 1]
+    assert histogram.percentile(percentile) == pytest.approx(expected, rel=0.04)
+
+
+def test_histogram_percentiles_single_pass():
+    histogram = Histogram()
+    for value in range(1000, 101000, 10):
+        histogram.record(value)
+    percentiles = [99, 50, 95, 0, 100]
+    assert histogram.percentiles(percentiles) == [histogram.percentile(p) for p in percentiles]
+    assert Histogram().percentiles([50, 99]) == [0, 0]
+
+
+def test_histogram_clamps_large_values():
+    histogram = Histogram(max_bits=10)
+    histogram.record(10_000)
+    assert histogram.max == 1023
+
+
+def test_histogram_merge_subtract():
+    first, second = Histogram(), Histogram()
+    for value in range(100):
+        first.record(value)
+        second.record(value + 1000)
+    merged = Histogram()
+    merged.merge(first)
+    merged.merge(second)
+    assert merged.count == 200
+    assert merged.min == 0
+    assert merged.max == 1099
+    merged.subtract(first)
+    assert merged.count == 100
+    assert merged.min == pytest.approx(1000, rel=0.04)
+    with pytest.raises(ValueError):
+        merged.merge(Histogram(max_bits=20))
+
+
+def test_windowed_histogram():
+    window = WindowedHistogram(window_seconds=4, slots=4)
+    start = math.ceil(time.monotonic()) + 1
+    for second in range(8):
+        window.record(second * 100, now=start + second)
+    histogram = window.current(now=start + 7.5)
+    assert histogram.count == 4
+    assert histogram.min == pytest.approx(400, rel=0.04)
+    assert window.current(now=start + 20).count == 0
+
+
+def test_latency_stats():
+    stats = LatencyStats()
+    for rtt_ms in (10, 20, 30, 40):
+        stats.add_latency(rtt_ms / 1000)
+    assert stats.last_ms == pytest.approx(40)
+    assert stats.avg_ms == pytest.approx(25)
+    assert stats.min_ms == pytest.approx(10)
+    assert stats.max_ms == pytest.approx(40)
+    assert stats.p50_ms == pytest.approx(20, rel=0.04)
+    assert LatencyStats.merged([stats, stats]).count == 8
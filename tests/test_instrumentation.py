@@ -0,0 +1,129 @@
+"""Test module for the instrumentation helpers."""
+
+import json
+import threading
+import time
+
+from marilib.capture import CaptureWriter
+from marilib.communication_adapter import ReplaySerialAdapter
+from marilib.dispatcher import EventDispatcher
+from marilib.instrumentation import InstrumentedLock, PipelineTracer
+from marilib.mari_protocol import Frame, Header
+from marilib.marilib_edge import MarilibEdge
+from marilib.model import EdgeEvent, GatewayInfo
+
+
+def test_instrumented_lock():
+    lock = InstrumentedLock()
+    with lock:
+        assert lock.locked()
+        assert not lock.acquire(blocking=False)
+    assert not lock.locked()
+    assert lock.acquisitions == 1
+    assert lock.contended == 0
+    assert lock.hold_ns.count == 1
+
+
+def test_instrumented_lock_contention():
+    lock = InstrumentedLock()
+    holding = threading.Event()
+
+    def hold():
+        with lock:
+            holding.set()
+            time.sleep(0.05)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    holding.wait()
+    with lock:
+        pass
+    thread.join()
+    assert lock.acquisitions == 2
+    assert lock.contended == 1
+    assert lock.wait_ns.max >= 20_000_000
+    assert lock.hold_ns.max >= 40_000_000
+
+
+def test_instrumented_lock_threads():
+    lock = InstrumentedLock()
+
+    def work():
+        for _ in range(2000):
+            with lock:
+                pass
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    # the histograms can be read while the threads record
+    while any(thread.is_alive() for thread in threads):
+        assert lock.hold_ns.percentile(99) >= 0
+        assert lock.wait_ns.count <= lock.acquisitions
+    assert lock.wait_ns.count == lock.hold_ns.count == lock.acquisitions == 8000
+    lock.reset_stats()
+    assert lock.hold_ns.count == lock.acquisitions == 0
+    lock.reset_stats()
+    assert lock.acquisitions == 0
+    assert lock.wait_ns.count == 0
+
+
+def test_pipeline_tracer(tmp_path):
+    tracer = PipelineTracer(dump_path=str(tmp_path / "pipeline.jsonl"), dump_interval=0)
+    for _ in range(10):
+        tracer.begin()
+        tracer.mark("parse")
+        time.sleep(0.001)
+        tracer.mark("callback")
+        token = tracer.suspend()
+        thread = threading.Thread(target=lambda: (tracer.resume(token), tracer.end()))
+        thread.start()
+        thread.join()
+    stats = tracer.stats()
+    assert set(stats) == {"parse", "callback", "dispatch", "total"}
+    assert all(stage_stats.count == 10 for stage_stats in stats.values())
+    assert stats["callback"].p50_us >= 1000
+    assert stats["total"].mean_us >= stats["callback"].mean_us
+
+    tracer.dump_if_due()
+    line = json.loads((tmp_path / "pipeline.jsonl").read_text())
+    assert line["stages"]["parse"]["count"] == 10
+    tracer.reset()
+    assert tracer.stats()["total"].count == 0
+
+
+def test_pipeline_tracer_in_edge(tmp_path):
+    path = str(tmp_path / "capture.bin")
+    writer = CaptureWriter(path)
+    info = GatewayInfo(address=0x10, network_id=1)
+    writer.write(EdgeEvent.to_bytes(EdgeEvent.GATEWAY_INFO) + info.to_bytes())
+    frame = Frame(Header(destination=0x10, source=0x42), payload=b"data")
+    for _ in range(20):
+        writer.write(EdgeEvent.to_bytes(EdgeEvent.NODE_DATA) + frame.to_bytes())
+    writer.close()
+
+    replay = ReplaySerialAdapter(path, speed=None)
+    dispatcher = EventDispatcher()
+    mari = MarilibEdge(
+        lambda event, data: None, replay, dispatcher=dispatcher, tracer=PipelineTracer()
+    )
+    assert replay.wait_done(5)
+    dispatcher.stop()
+    stats = mari.tracer.stats()
+    stages = ("parse", "model_update", "dispatch", "callback", "cloud_publish", "total")
+    assert all(stats[stage].count == 20 for stage in stages)
+
+
+def test_pipeline_tracer_sampling():
+    tracer = PipelineTracer(sample_every=4)
+    tracer.mark("parse")  # no trace started, ignored
+    for _ in range(20):
+        tracer.begin()
+        tracer.mark("parse")
+        token = tracer.suspend()
+        tracer.resume(token)
+        tracer.end()
+    stats = tracer.stats()
+    assert stats["parse"].count == 5
+    assert stats["dispatch"].count == 5
+    assert stats["total"].count == 5
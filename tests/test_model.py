@@ -0,0 +1,165 @@
+"""Test module for the network model."""
+
+import math
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from marilib.mari_protocol import Frame, Header, HeaderStats
+from marilib.model import (
+    MARI_TIMEOUT_NODE_IS_ALIVE,
+    FrameStats,
+    MariGateway,
+    MariNode,
+    RollingCounter,
+    RssiSamples,
+)
+
+
+def test_rolling_counter():
+    counter = RollingCounter(window_seconds=10, bucket_seconds=1)
+    start = math.ceil(time.monotonic()) + 1
+    # 10 events per second during 5 seconds
+    for event in range(50):
+        counter.add(now=start + 0.05 + event * 0.1)
+    now = start + 5
+    assert counter.total == 50
+    assert counter.count(1, now=now) == 10
+    assert counter.count(3, now=now) == 30
+    # the bucket where the window starts is counted whole
+    assert counter.count(2.5, now=now) == 30
+    assert counter.count(10, now=now) == 50
+    # windows larger than the counter window are clamped
+    assert counter.count(100, now=now) == 50
+    # events get out of the window as time goes by
+    assert counter.count(3, now=now + 2) == 10
+    assert counter.count(3, now=now + 20) == 0
+    counter.add(now=now + 20)
+    assert counter.count(1, now=now + 20.5) == 1
+    assert counter.count(10, now=now + 20.5) == 1
+
+
+def test_rolling_counter_non_integer_offsets():
+    start = math.ceil(time.monotonic()) + 1
+    counter = RollingCounter(window_seconds=10)
+    counter.add(now=start)
+    assert counter.count(1, now=start + 0.6) == 1
+    assert counter.count(1, now=start + 0.99) == 1
+    assert counter.count(1, now=start + 1.2) == 0
+    # one event per second is seen in every 1 second window
+    counter = RollingCounter(window_seconds=10)
+    for second in range(5):
+        counter.add(now=start + second + 0.37)
+    for offset in (0.45, 0.55, 0.8, 0.95, 1.2):
+        assert counter.count(1, now=start + 4 + offset) == 1
+
+
+def test_rssi_samples():
+    samples = RssiSamples(window_seconds=10)
+    assert samples.last() == 0
+    assert samples.mean(5) == 0
+    now = time.monotonic()
+    for i, rssi in enumerate([-10, -20, -30, -40, -50]):
+        samples.append(rssi, now=now + i)
+    assert len(samples) == 5
+    assert samples.last() == -50
+    assert samples.mean(1.5, now=now + 4) == -45
+    # windows are capped to the samples window
+    assert samples.mean(100, now=now + 4) == -30
+    assert samples.mean(5, now=now + 20) == 0
+
+
+def test_rssi_samples_high_rate():
+    # a gateway receiving from many nodes: the window still spans its whole duration
+    samples = RssiSamples()
+    now = time.monotonic()
+    for i in range(50_000):
+        samples.append(-80 if i < 25_000 else -40, now=now + i / 10_000)
+    assert samples.mean(5, now=now + 5) == pytest.approx(-60, abs=0.1)
+    # the bucket where the window starts is counted whole
+    assert -42 < samples.mean(2.5, now=now + 5) <= -40
+
+
+def test_frame_stats_counts():
+    stats = FrameStats()
+    frame = Frame(Header(), HeaderStats(rssi=221))
+    for _ in range(3):
+        stats.add_sent(frame, is_test_packet=False)
+    stats.add_sent(frame, is_test_packet=True)
+    stats.add_received(frame, is_test_packet=False)
+    assert stats.sent_count() == 4
+    assert stats.sent_count(include_test_packets=False) == 3
+    assert stats.sent_count(1) == 3
+    assert stats.received_count(1) == 1
+    assert stats.success_rate(1) == 1 / 3
+    assert stats.received_rssi_dbm() == -34
+    assert stats.received_rssi_dbm(5) == -34
+    assert stats.memory_bytes < 32 * 1024
+
+
+def test_gateway_node_expiry():
+    gateway = MariGateway()
+    node_1 = gateway.add_node(1)
+    node_2 = gateway.add_node(2)
+    gateway.add_node(3)
+    start = node_1.last_seen_ts
+    assert gateway.update(now=start) == []
+
+    # node 2 is seen again, node 3 leaves explicitly
+    node_2.touch(now=start + MARI_TIMEOUT_NODE_IS_ALIVE / 2)
+    gateway.remove_node(3)
+    assert gateway.update(now=start + MARI_TIMEOUT_NODE_IS_ALIVE + 0.1) == [node_1]
+    assert gateway.nodes_addresses == [2]
+
+    # node 1 comes back, its stale deadline does not expire the new node
+    node_1 = gateway.add_node(1)
+    node_1.touch(now=start + MARI_TIMEOUT_NODE_IS_ALIVE)
+    expired = gateway.update(now=start + MARI_TIMEOUT_NODE_IS_ALIVE * 1.5 + 0.1)
+    assert expired == [node_2]
+    assert gateway.update(now=start + MARI_TIMEOUT_NODE_IS_ALIVE * 2 + 0.1) == [node_1]
+    assert gateway.nodes == []
+    assert gateway._expiry_heap == []
+
+
+def test_gateway_broadcast_accounting():
+    gateway = MariGateway()
+    early = gateway.add_node(1)
+    gateway.register_sent_frame(Frame(Header()), is_test_packet=False)
+    gateway.register_sent_frame(Frame(Header(destination=1)), is_test_packet=False)
+    late = gateway.add_node(2)
+    gateway.register_sent_frame(Frame(Header()), is_test_packet=True)
+    gateway.register_sent_frame(Frame(Header()), is_test_packet=False)
+
+    assert gateway.stats.sent_count() == 4
+    assert early.stats.sent_count() == 4
+    assert early.stats.sent_count(include_test_packets=False) == 3
+    assert early.stats.sent_count(10) == 3
+    # broadcasts sent before the node joined are not counted
+    assert late.stats.sent_count() == 2
+    assert late.stats.sent_count(include_test_packets=False) == 1
+    assert late.stats.sent_count(10) == 1
+
+
+def test_gateway_node_registry_copy_on_write():
+    gateway = MariGateway()
+    gateway.add_node(1)
+    registry = gateway.node_registry
+    gateway.add_node(2)
+    assert list(registry) == [1]
+    registry = gateway.node_registry
+    assert gateway.remove_node(1).address == 1
+    assert gateway.remove_node(1) is None
+    assert list(registry) == [1, 2]
+    assert gateway.nodes_addresses == [2]
+
+
+def test_node_last_seen():
+    node = MariNode(1, 0x10)
+    node.last_seen = datetime.now() - timedelta(seconds=MARI_TIMEOUT_NODE_IS_ALIVE + 1)
+    expected_ts = time.monotonic() - MARI_TIMEOUT_NODE_IS_ALIVE - 1
+    assert node.last_seen_ts == pytest.approx(expected_ts, abs=0.1)
+    assert not node.is_alive
+    node.last_seen = datetime.now()
+    assert node.is_alive
+    assert abs(node.last_seen - datetime.now()) < timedelta(seconds=0.1)
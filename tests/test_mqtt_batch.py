@@ -0,0 +1,105 @@
+"""Test module for the batches of edge events published to the cloud."""
+
+import base64
+import threading
+
+import pytest
+
+from marilib.aio import AsyncMQTTAdapter
+from marilib.communication_adapter import MQTTAdapter, MQTTAdapterDummy
+from marilib.mari_protocol import Frame, Header
+from marilib.marilib_cloud import MarilibCloud
+from marilib.model import EdgeEvent, GatewayInfo, NodeInfoCloud
+from marilib.mqtt_batch import MQTTBatchError, MQTTBatcher, is_batch, unpack_batch
+
+
+def test_batcher_flushes_on_size():
+    batches = []
+    batcher = MQTTBatcher(batches.append, max_bytes=17, linger=60)
+    events = [bytes([i]) * 5 for i in range(1, 6)]
+    for event in events:
+        batcher.add(event)
+    # header of 3 bytes, then 7 bytes per event: 2 events per batch
+    assert [list(unpack_batch(batch)) for batch in batches] == [events[:2], events[2:4]]
+    batcher.close()
+    assert list(unpack_batch(batches[-1])) == events[4:]
+    assert (batcher.events, batcher.batches) == (5, 3)
+
+
+def test_batcher_flushes_on_linger():
+    published = threading.Event()
+    batches = []
+    batcher = MQTTBatcher(lambda batch: (batches.append(batch), published.set()), linger=0.01)
+    batcher.add(b"\x04a")
+    batcher.add(b"\x04b")
+    assert published.wait(2)
+    assert list(unpack_batch(batches[0])) == [b"\x04a", b"\x04b"]
+    with pytest.raises(ValueError):
+        batcher.add(bytes(0x10000))
+    batcher.close()
+    assert len(batches) == 1
+    with pytest.raises(ValueError, match="closed"):
+        batcher.add(b"\x04c")
+
+
+def test_unpack_batch_errors():
+    assert not is_batch(b"\x03MB")
+    with pytest.raises(MQTTBatchError, match="version"):
+        list(unpack_batch(b"MB\x02\x01\x00\x04"))
+    with pytest.raises(MQTTBatchError, match="Truncated"):
+        list(unpack_batch(b"MB\x01\x05\x00\x04"))
+
+
+class _Client:
+    def __init__(self):
+        self.messages = []
+
+    def is_connected(self) -> bool:
+        return True
+
+    def publish(self, topic, payload, qos):
+        self.messages.append((topic, base64.b64decode(payload)))
+
+
+def test_cloud_receives_batches():
+    gateway = 0x10
+    events = [EdgeEvent.to_bytes(EdgeEvent.GATEWAY_INFO) + GatewayInfo(address=gateway).to_bytes()]
+    events += [
+        EdgeEvent.to_bytes(EdgeEvent.NODE_JOINED)
+        + NodeInfoCloud(address=address, gateway_address=gateway).to_bytes()
+        for address in (1, 2)
+    ]
+    events += [
+        EdgeEvent.to_bytes(EdgeEvent.NODE_DATA)
+        + Frame(Header(destination=gateway, source=1), payload=b"data").to_bytes()
+    ]
+
+    edge = MQTTAdapter("localhost", 1883, is_edge=True, batch_max_bytes=4096)
+    edge.client = _Client()
+    edge.network_id = "0001"
+    for event in events[:-1]:
+        edge.send_data_to_cloud(event)
+    edge.batcher.flush()
+    received = []
+    cloud = MarilibCloud(
+        lambda event, data: received.append(event), MQTTAdapterDummy(is_edge=False), network_id=1
+    )
+    # old publishers send single events, on the same topic
+    for topic, data in edge.client.messages + [("", events[-1])]:
+        cloud.on_mqtt_data_received(data)
+    assert received == [
+        EdgeEvent.GATEWAY_INFO,
+        EdgeEvent.NODE_JOINED,
+        EdgeEvent.NODE_JOINED,
+        EdgeEvent.NODE_DATA,
+    ]
+    assert len(edge.client.messages) == 1
+    assert edge.client.messages[0][0] == "/mari/0001/to_cloud"
+    assert cloud.gateways[gateway].nodes[0].stats.received_count() == 1
+    edge.batcher.close()
+
+
+def test_async_adapter_refuses_batches():
+    with pytest.raises(ValueError):
+        AsyncMQTTAdapter.from_url("mqtt://localhost:1883", is_edge=True, batch_max_bytes=4096)
+    assert AsyncMQTTAdapter("localhost", 1883, is_edge=True).batcher is None
@@ -1,4 +1,11 @@
-from marilib.mari_protocol import Frame, Header
+import dataclasses
+from dataclasses import dataclass
+
+import pytest
+
+from marilib.mari_protocol import Frame, FrameView, Header, HeaderStats
+from marilib.model import GatewayInfo
+from marilib.protocol import Packet, PacketFieldMetadata, packet_layout
 
 
 def test_header_size():
@@ -33,3 +40,69 @@ def test_frame_from_bytes():
     )
     assert frame.stats.rssi_dbm == -35
     assert frame.payload == bytes.fromhex("f0f0f0f0f0")
+
+
+def test_frame_from_bytes_offset():
+    data = bytes.fromhex("030210170059291ba8fdcecef531eb7f2526ef0399dcf0f0f0f0f0")
+    frame = Frame().from_bytes(data, 1)
+    assert frame == Frame().from_bytes(data[1:])
+    assert frame.to_bytes() == data[1:]
+
+
+def test_header_not_enough_bytes():
+    with pytest.raises(ValueError):
+        Header().from_bytes(bytes(19))
+
+
+def test_gateway_info_wide_field():
+    info = GatewayInfo(address=0x1122, network_id=0xA0, schedule_id=6, schedule_stats=2**255 + 1)
+    assert len(info.to_bytes()) == info.size == 43
+    assert GatewayInfo().from_bytes(info.to_bytes()) == info
+
+
+def test_gateway_info_default():
+    # schedule_stats defaults to raw bytes, packed as zeros
+    data = GatewayInfo(address=0x10).to_bytes()
+    assert len(data) == 43
+    info = GatewayInfo().from_bytes(data)
+    assert (info.address, info.schedule_stats) == (0x10, 0)
+    assert GatewayInfo().to_bytes() == bytes(43)
+
+
+@dataclass
+class ListPacket(Packet):
+    metadata: list[PacketFieldMetadata] = dataclasses.field(
+        default_factory=lambda: [
+            PacketFieldMetadata(name="count", length=1),
+            PacketFieldMetadata(name="items", type_=list),
+        ]
+    )
+    count: int = 0
+    items: list[HeaderStats] = dataclasses.field(default_factory=list)
+
+
+def test_variable_size_packet():
+    assert packet_layout(ListPacket) is None
+    packet = ListPacket().from_bytes(b"\x03\x01\x02\x03", 0)
+    assert [item.rssi for item in packet.items] == [1, 2, 3]
+    assert packet.to_bytes() == b"\x03\x01\x02\x03"
+
+
+def test_frame_view():
+    data = bytes.fromhex("030210170059291ba8fdcecef531eb7f2526ef0399dcf0f0f0f0f0")
+    view = FrameView(data, 1)
+    frame = Frame().from_bytes(data, 1)
+    assert view.source == frame.header.source
+    assert view.destination == frame.header.destination
+    assert view.network_id == 23
+    assert view.rssi_dbm == -35
+    assert isinstance(view.payload, memoryview)
+    assert view.payload == bytes.fromhex("f0f0f0f0f0")
+    assert view.header == frame.header
+    assert view.to_frame() == frame
+    assert view.to_bytes() == data[1:]
+
+
+def test_frame_view_too_short():
+    with pytest.raises(ValueError):
+        FrameView(bytes(20), 1)
@@ -0,0 +1,53 @@
+"""Test module for the pacing of the serial writes."""
+
+import time
+
+import pytest
+
+from marilib.serial_uart import (
+    SERIAL_GATEWAY_RX_BUFFER_SIZE,
+    SERIAL_GATEWAY_RX_DRAIN_TIME,
+    SerialStats,
+    SerialWriter,
+    gateway_tx_bucket,
+)
+
+
+class _Serial:
+    def __init__(self):
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append((time.monotonic(), bytes(data)))
+
+
+def test_gateway_tx_bucket():
+    bucket = gateway_tx_bucket(1_000_000)
+    bucket._last_refill = 0
+    # a full buffer goes right away, the next chunk waits for the gateway to drain it
+    assert bucket.reserve(SERIAL_GATEWAY_RX_BUFFER_SIZE, now=0) == 0
+    assert bucket.reserve(SERIAL_GATEWAY_RX_BUFFER_SIZE, now=0) == pytest.approx(
+        SERIAL_GATEWAY_RX_DRAIN_TIME
+    )
+    # slow lines are paced by the baudrate
+    bucket = gateway_tx_bucket(9600)
+    bucket._last_refill = 0
+    bucket.reserve(SERIAL_GATEWAY_RX_BUFFER_SIZE, now=0)
+    assert bucket.reserve(96, now=0) == pytest.approx(0.1)
+
+
+def test_serial_writer_chunk_gap():
+    serial_ = _Serial()
+    stats = SerialStats()
+    writer = SerialWriter(serial_, 1_000_000, stats)
+    data = bytes(range(256)) + bytes(44)
+    writer.put(data)
+    writer.stop()
+    assert b"".join(chunk for _, chunk in serial_.writes) == data
+    assert [len(chunk) for _, chunk in serial_.writes] == [64, 64, 64, 64, 44]
+    timestamps = [ts for ts, _ in serial_.writes]
+    # the bucket keeps the average rate, a chunk written late shortens the next gap
+    for index in range(1, 4):
+        elapsed = timestamps[index] - timestamps[0]
+        assert elapsed >= index * SERIAL_GATEWAY_RX_DRAIN_TIME * 0.95
+    assert (stats.writes, stats.bytes_written) == (1, 300)
@@ -0,0 +1,69 @@
+"""Test module for the gateway simulator, with MarilibEdge connected to it."""
+
+import time
+
+import pytest
+
+from marilib.communication_adapter import SerialAdapter
+from marilib.latency import LATENCY_PACKET_MAGIC
+from marilib.mari_protocol import Frame, Header, rssi_to_dbm
+from marilib.marilib_edge import MarilibEdge
+from marilib.model import EdgeEvent
+from marilib.simulator import SIMULATOR_NODE_ADDRESS_BASE, GatewaySimulator, dbm_to_rssi
+
+
+def _wait_for(condition, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_dbm_to_rssi():
+    for dbm in (-127, -60, -1, 0):
+        assert rssi_to_dbm(dbm_to_rssi(dbm)) == dbm
+
+
+def test_simulator_with_edge():
+    pytest.importorskip("pty")
+    simulator = GatewaySimulator(nodes=5, schedule_id=6, rate=50, rssi_dbm=-40, seed=1)
+    frames = []
+
+    def on_event(event, data):
+        if event == EdgeEvent.NODE_DATA:
+            frames.append(data)
+
+    mari = MarilibEdge(on_event, SerialAdapter(simulator.port))
+    simulator.start()
+    try:
+        _wait_for(lambda: mari.gateway.info.address == simulator.address)
+        assert mari.gateway.info.schedule_id == 6
+        _wait_for(lambda: len(mari.nodes) == 5 and len(frames) > 50)
+        assert all(-70 < frame.rssi_dbm < -10 for frame in frames)
+
+        probe = LATENCY_PACKET_MAGIC + b"12345678"
+        mari.send_frame(mari.nodes[0].address, probe)
+        _wait_for(lambda: any(frame.payload == probe for frame in frames))
+        assert simulator.stats.probes_echoed == 1
+
+        left = mari.nodes[0].address
+        simulator.remove_node(left)
+        _wait_for(lambda: mari.gateway.get_node(left) is None)
+    finally:
+        simulator.close()
+        mari.serial_interface.close()
+
+
+def test_simulator_invalid_downlink():
+    pytest.importorskip("pty")
+    simulator = GatewaySimulator(nodes=1, rate=0)
+    try:
+        simulator._run_due_events(time.monotonic())  # the node joins
+        simulator._handle_downlink(b"\x01\x00\x01")  # truncated
+        probe = Frame(Header(destination=SIMULATOR_NODE_ADDRESS_BASE), payload=LATENCY_PACKET_MAGIC)
+        simulator._handle_downlink(b"\x01" + probe.to_bytes())
+        assert simulator.stats.frames_received == 2
+        assert simulator.stats.frames_invalid == 1
+        assert simulator.stats.probes_echoed == 1
+    finally:
+        simulator.close()
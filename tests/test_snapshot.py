@@ -0,0 +1,67 @@
+"""Test module for the network snapshots."""
+
+import csv
+import dataclasses
+
+import pytest
+
+from marilib.logger import MetricsLogger
+from marilib.mari_protocol import Frame, Header, HeaderStats
+from marilib.model import MariGateway
+from marilib.snapshot import GatewaySnapshot, NetworkSnapshot
+
+
+def test_network_snapshot():
+    gateway = MariGateway()
+    gateway.add_node(1)
+    gateway.add_node(2)
+    gateway.register_sent_frame(Frame(Header(destination=2)), is_test_packet=False)
+    gateway.register_received_frame(
+        Frame(Header(source=2), stats=HeaderStats(rssi=0xC0)), is_test_packet=False
+    )
+    gateway.node_registry[2].latency_stats.add_latency(0.1)
+
+    snapshot = NetworkSnapshot.from_gateways([gateway])
+    assert snapshot.nodes_count == 2
+    gateway_snapshot = snapshot.gateway(gateway.info.address)
+    assert gateway_snapshot.tx_total == 1
+    assert gateway_snapshot.rx_total == 1
+    assert gateway_snapshot.latency.last_ms == 0
+
+    nodes = gateway_snapshot.nodes
+    assert nodes.address == (1, 2)
+    i = nodes.index(2)
+    assert nodes.tx_total[i] == 1
+    assert nodes.rx_rate[i] == 1
+    assert nodes.rssi_dbm[i] == gateway.node_registry[2].stats.received_rssi_dbm(5)
+    assert nodes.latency_p50_ms[i] == pytest.approx(100, rel=0.04)
+    assert nodes.latency_last_ms[nodes.index(1)] == 0
+
+    # later changes don't affect the snapshot, which can't be modified
+    gateway.register_sent_frame(Frame(Header(destination=2)), is_test_packet=False)
+    assert nodes.tx_total[i] == 1
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        gateway_snapshot.tx_total = 0
+
+
+def test_empty_network_snapshot():
+    snapshot = NetworkSnapshot.from_gateways([])
+    assert snapshot.nodes_count == 0
+    assert snapshot.gateway(0) is None
+    assert len(NetworkSnapshot.from_gateways([MariGateway()]).gateways[0].nodes) == 0
+
+
+def test_logger_from_gateway(tmp_path):
+    gateway = MariGateway()
+    for address in (1, 2, 3):
+        gateway.add_node(address)
+    logger = MetricsLogger(log_dir_base=str(tmp_path), log_interval_seconds=0)
+    logger.log_periodic_metrics(GatewaySnapshot.from_gateway(gateway))
+    # the former signature, with the nodes to log
+    logger.log_periodic_metrics(gateway, gateway.nodes[:1])
+    logger.log_periodic_metrics(gateway)
+    logger.close()
+    (path,) = tmp_path.glob("run_*/node_metrics_*.csv")
+    with open(path) as f:
+        rows = list(csv.reader(f))[1:]
+    assert [row[2] for row in rows] == [f"0x{address:016X}" for address in (1, 2, 3, 1, 1, 2, 3)]
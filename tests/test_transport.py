@@ -0,0 +1,152 @@
+"""Test module for the fragmentation and reassembly of large payloads."""
+
+import time
+
+import pytest
+
+from marilib.downlink import DownlinkQueueFull
+from marilib.mari_protocol import MARI_BROADCAST_ADDRESS, Frame, Header
+from marilib.transport import (
+    _HEADER,
+    TRANSPORT_MAGIC,
+    TRANSPORT_MAX_FRAGMENTS,
+    FragmentKind,
+    Transport,
+)
+
+ADDRESS_A = 0xA
+ADDRESS_B = 0xB
+
+
+class Link:
+    """Two transports connected to each other, the frames listed in `drop` are lost once."""
+
+    def __init__(self, **kwargs):
+        self.drop: set[int] = set()
+        self.sent = 0
+        self.received = []
+        self.a = Transport(self._to_b, **kwargs)
+        self.b = Transport(self._to_a, on_transfer=self._on_transfer, **kwargs)
+
+    def _to_b(self, dst: int, payload: bytes):
+        self.sent += 1
+        if self.sent in self.drop:
+            return
+        assert dst == ADDRESS_B or dst == MARI_BROADCAST_ADDRESS
+        self.b.handle_frame(Frame(Header(destination=dst, source=ADDRESS_A), payload=payload))
+
+    def _to_a(self, dst: int, payload: bytes):
+        assert dst == ADDRESS_A
+        self.a.handle_frame(Frame(Header(destination=dst, source=ADDRESS_B), payload=payload))
+
+    def _on_transfer(self, source, data, stats):
+        self.received.append((source, data, stats))
+
+
+def test_transport_transfer():
+    link = Link(fragment_size=10)
+    data = bytes(range(95))
+    stats = link.a.send(ADDRESS_B, data)
+    assert not stats.failed
+    assert stats.fragments == 10
+    assert stats.retransmitted == 0
+    assert stats.goodput > 0
+    assert link.received[0][:2] == (ADDRESS_A, data)
+    assert link.received[0][2].size == len(data)
+    assert link.a.send(ADDRESS_B, b"").fragments == 1
+    assert link.received[1][1] == b""
+
+
+def test_transport_selective_repeat():
+    link = Link(fragment_size=10, ack_timeout=0.05)
+    data = bytes(range(100))
+    link.drop = {3, 5, 10}  # the last fragment is lost too
+    stats = link.a.send(ADDRESS_B, data)
+    assert not stats.failed
+    # the last fragment after the ACK timeout, then the two missing ones
+    assert stats.retransmitted == 3
+    assert link.sent == 13
+    assert link.received[0][1] == data
+
+
+def test_transport_failure():
+    link = Link(fragment_size=10, ack_timeout=0.01, max_retries=2)
+    link.drop = set(range(1, 100))
+    stats = link.a.send(ADDRESS_B, bytes(30))
+    assert stats.failed
+    assert stats.retransmitted == 2
+    assert stats.goodput == 0
+    with pytest.raises(ValueError):
+        link.a.send(ADDRESS_B, bytes(10 * TRANSPORT_MAX_FRAGMENTS + 1))
+
+
+def test_transport_broadcast_and_pacing():
+    link = Link(fragment_size=10, max_rate=200)
+    start = time.monotonic()
+    stats = link.a.send(MARI_BROADCAST_ADDRESS, bytes(50))
+    assert time.monotonic() - start >= 4 / 200
+    assert stats.completed_ts is not None
+    assert link.received[0][1] == bytes(50)
+
+
+def test_transport_reassembly_timeout():
+    link = Link(fragment_size=10, selective_repeat=False, reassembly_timeout=1)
+    link.drop = {2}
+    link.a.send(ADDRESS_B, bytes(30))
+    assert not link.received
+    link.b.update()
+    assert link.b.expired == 0
+    link.b.update(now=time.monotonic() + 2)
+    assert link.b.expired == 1
+    assert link.b.history[-1].failed
+    assert link.b.handle_frame(Frame(Header(), payload=b"not a fragment")) is False
+
+
+def test_transport_control_reply_dropped():
+    link = Link(fragment_size=10, ack_timeout=0.05)
+
+    def send_control(dst, payload):
+        # the downlink queue is full when the first ACK is sent
+        if not link.b.control_dropped:
+            raise DownlinkQueueFull()
+        link._to_a(dst, payload)
+
+    link.b.send_control = send_control
+    stats = link.a.send(ADDRESS_B, bytes(30))
+    assert link.b.control_dropped == 1
+    assert not stats.failed
+    # the sender probed with the last fragment, which was ACKed again
+    assert stats.retransmitted == 1
+    assert len(link.received) == 1
+
+
+def test_transport_for_edge():
+    class Edge:
+        def __init__(self):
+            self.sent = []
+
+        def send_frame(self, dst, payload, priority=False):
+            self.sent.append((dst, FragmentKind(payload[2]), priority))
+
+        def get_max_downlink_rate(self):
+            return 0
+
+    edge = Edge()
+    transport = Transport.for_edge(edge, ack_timeout=0.01, max_retries=0)
+    assert transport.send(ADDRESS_B, bytes(5)).failed
+    fragment = _HEADER.pack(TRANSPORT_MAGIC, FragmentKind.DATA, 0, 0, 1) + b"uplink"
+    assert transport.handle_frame(Frame(Header(source=ADDRESS_B), payload=fragment))
+    # fragments wait in the per node queues, ACKs and NACKs take the priority lane
+    assert edge.sent == [(ADDRESS_B, FragmentKind.DATA, False), (ADDRESS_B, FragmentKind.ACK, True)]
+
+
+def test_transport_sender_restarts_ids():
+    link = Link(fragment_size=10, ack_timeout=0.05)
+    assert link.a.send(ADDRESS_B, bytes(30)).transfer_id == 0
+    # a rebooted sender, whose transfer ids start at 0 again
+    time.sleep(0.1)
+    link.a = Transport(link._to_b, fragment_size=10, ack_timeout=0.05)
+    stats = link.a.send(ADDRESS_B, bytes(range(30)))
+    assert stats.transfer_id == 0
+    assert not stats.failed
+    assert [data for _, data, _ in link.received] == [bytes(30), bytes(range(30))]